@@ -0,0 +1,404 @@
+"""Online database backups with the SQLite backup API, kept as compressed backup sets
+
+The copy is made a few pages at a time from a live connection, pausing
+between steps so other clients can keep writing. It goes to a temporary file
+that is verified with PRAGMA integrity_check and only then renamed into
+place, so a backup file either is complete and consistent or does not exist.
+
+Backup sets build on that snapshot. A full backup stores the whole database,
+compressed, along with a hash of every page. Until the next full backup is
+due, later backups are incremental: only the pages whose hash differs from
+the last full backup are stored. Restoring needs at most the full backup
+plus one incremental. Each backup has a JSON manifest next to its data; a
+retention policy keeps the newest backup of each recent day and week.
+"""
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import time
+from datetime import datetime
+
+import database
+
+# Pages copied per backup step (with 4 KiB pages, 1 MiB per step)
+PAGES_PER_STEP = 256
+
+# Seconds to pause between steps, leaving the database free for writers
+STEP_PAUSE = 0.005
+
+# A write from another connection restarts a stepwise backup from the first
+# page. After this many restarts the copy is redone in a single step, which
+# under WAL is one read transaction that writers do not wait for.
+MAX_RESTARTS = 3
+
+
+class BackupError(Exception):
+    """A backup could not be made or failed verification"""
+
+
+class _Restarting(Exception):
+    """Raised from the progress callback to abandon a backup that keeps restarting"""
+
+
+def integrity_errors(conn):
+    """Return the problems PRAGMA integrity_check reports, [] if the database is sound"""
+    rows = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+    return [] if rows == ["ok"] else rows
+
+
+def backup_to(conn, target_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None):
+    """Copy the database behind conn to target_path while it stays in use
+    
+    progress(copied_pages, total_pages) is called after every step. Raises
+    BackupError if the copy fails verification.
+    """
+    partial_path = target_path + ".part"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    
+    restarts = 0
+    last_remaining = None
+    
+    def step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarting()
+        last_remaining = remaining
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+    
+    dest = sqlite3.connect(partial_path)
+    try:
+        try:
+            conn.backup(dest, pages=pages, progress=step)
+        except _Restarting:
+            conn.backup(dest, pages=-1)
+            if progress is not None:
+                progress(1, 1)
+        errors = integrity_errors(dest)
+        if errors:
+            raise BackupError("Backup failed integrity check: " + "; ".join(errors[:5]))
+        dest.close()
+        os.replace(partial_path, target_path)
+    except BaseException:
+        dest.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return target_path
+
+
+DEFAULT_BACKUP_SETTINGS = {
+    "directory": "backups",
+    "compression": "gzip",      # gzip, zstd (needs the zstandard package) or none
+    "full_interval_days": 7,    # days before an incremental gives way to a new full backup
+    "keep_daily": 7,            # newest backup of each of the last N days with backups
+    "keep_weekly": 4,           # newest backup of each of the last N weeks with backups
+}
+
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+# Bytes of each page hash stored for full backups
+PAGE_HASH_SIZE = 16
+
+# Incremental data is a sequence of (page number, page bytes) records
+_PAGE_NUMBER = struct.Struct(">I")
+
+COPY_BUFFER = 1024 * 1024
+
+
+def load_backup_settings(path=database.CONFIG_PATH):
+    """Return the backup settings from the config file merged over the defaults"""
+    settings = dict(DEFAULT_BACKUP_SETTINGS)
+    settings.update(database.load_config(path).get("backup", {}))
+    
+    unknown = set(settings) - set(DEFAULT_BACKUP_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown backup settings: {', '.join(sorted(unknown))}")
+    settings["compression"] = str(settings["compression"]).lower()
+    if settings["compression"] not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {', '.join(COMPRESSIONS)}")
+    for key in ("full_interval_days", "keep_daily", "keep_weekly"):
+        settings[key] = int(settings[key])
+        if settings[key] < 1:
+            raise ValueError(f"{key} must be at least 1")
+    return settings
+
+
+def _open_compressed(path, mode, compression):
+    """Open a backup data file for streaming reads or writes"""
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise BackupError("zstd compression requires the zstandard package (pip install zstandard)")
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def _page_hash(page):
+    return hashlib.blake2b(page, digest_size=PAGE_HASH_SIZE).digest()
+
+
+def _iter_pages(path, page_size):
+    with open(path, "rb") as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                return
+            yield page
+
+
+def _manifest_path(directory, name):
+    return os.path.join(directory, name + ".json")
+
+
+def read_manifest(directory, name):
+    """Return the manifest of a backup"""
+    with open(_manifest_path(directory, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_backups(directory):
+    """Return the manifests of every backup in directory, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for filename in os.listdir(directory):
+        if filename.endswith(".json"):
+            try:
+                manifests.append(read_manifest(directory, filename[:-len(".json")]))
+            except (OSError, ValueError):
+                continue    # half-written or foreign file
+    return sorted(manifests, key=lambda m: m["created"], reverse=True)
+
+
+def _backup_files(directory, manifest):
+    files = [manifest["data"]]
+    if manifest["kind"] == "full":
+        files.append(manifest["hashes"])
+    return [os.path.join(directory, filename) for filename in files]
+
+
+def _write_full(snapshot, directory, name, page_size, compression):
+    data = name + ".db" + COMPRESSIONS[compression]
+    hashes = name + ".hashes"
+    digest = hashlib.sha256()
+    pages = 0
+    with _open_compressed(os.path.join(directory, data), "wb", compression) as out, \
+            open(os.path.join(directory, hashes), "wb") as hash_file:
+        for page in _iter_pages(snapshot, page_size):
+            out.write(page)
+            hash_file.write(_page_hash(page))
+            digest.update(page)
+            pages += 1
+    return {"data": data, "hashes": hashes, "page_count": pages,
+            "changed_pages": pages, "sha256": digest.hexdigest()}
+
+
+def _write_incremental(snapshot, directory, name, page_size, compression, base):
+    data = name + ".pages" + COMPRESSIONS[compression]
+    with open(os.path.join(directory, base["hashes"]), "rb") as f:
+        base_hashes = f.read()
+    digest = hashlib.sha256()
+    pages = changed = 0
+    with _open_compressed(os.path.join(directory, data), "wb", compression) as out:
+        for page in _iter_pages(snapshot, page_size):
+            offset = pages * PAGE_HASH_SIZE
+            pages += 1
+            digest.update(page)
+            if _page_hash(page) != base_hashes[offset:offset + PAGE_HASH_SIZE]:
+                out.write(_PAGE_NUMBER.pack(pages))
+                out.write(page)
+                changed += 1
+    return {"data": data, "page_count": pages, "changed_pages": changed,
+            "sha256": digest.hexdigest()}
+
+
+def _claim_name(directory, stamp):
+    """Return (name stem, lock path) for a new backup, unique even within one second
+    
+    The lock file is created exclusively before the directory is checked, so
+    a stem is never handed out while another backup still writes under it or
+    after one has finished with it. The caller removes the lock.
+    """
+    for number in itertools.count(1):
+        stem = stamp if number == 1 else f"{stamp}_{number}"
+        lock = os.path.join(directory, f".{stem}.lock")
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        used = (f"{stem}_full.", f"{stem}_incremental.")
+        if any(filename.startswith(used) for filename in os.listdir(directory)):
+            os.remove(lock)
+            continue
+        return stem, lock
+
+
+def create_backup(conn, settings, progress=None, now=None):
+    """Add a backup of the live database to the backup set and apply retention
+    
+    Makes a full backup when none exists or the last one is older than
+    full_interval_days, an incremental one otherwise. Returns (manifest of
+    the new backup, names of the backups removed by retention).
+    """
+    directory = settings["directory"]
+    compression = settings["compression"]
+    os.makedirs(directory, exist_ok=True)
+    now = now or datetime.now()
+    stem, lock = _claim_name(directory, f"massar_{now.strftime('%Y%m%d_%H%M%S')}")
+    
+    # Consistent, verified copy of the live database to work from
+    snapshot = os.path.join(directory, f".{stem}.snapshot.db")
+    try:
+        backup_to(conn, snapshot, progress=progress)
+        snapshot_conn = sqlite3.connect(snapshot)
+        try:
+            page_size = snapshot_conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            snapshot_conn.close()
+        
+        fulls = [m for m in list_backups(directory) if m["kind"] == "full"]
+        base = fulls[0] if fulls else None
+        if (base is None or base["page_size"] != page_size or
+                (now - datetime.fromisoformat(base["created"])).days >= settings["full_interval_days"]):
+            kind, base = "full", None
+        else:
+            kind = "incremental"
+        
+        name = f"{stem}_{kind}"
+        try:
+            if kind == "full":
+                manifest = _write_full(snapshot, directory, name, page_size, compression)
+            else:
+                manifest = _write_incremental(snapshot, directory, name, page_size, compression, base)
+        except BaseException:
+            for filename in os.listdir(directory):
+                if filename.startswith(name + "."):
+                    os.remove(os.path.join(directory, filename))
+            raise
+        
+        manifest.update({
+            "name": name,
+            "kind": kind,
+            # Microseconds order backups made within the same second
+            "created": now.isoformat(),
+            "base": base["name"] if base else None,
+            "compression": compression,
+            "page_size": page_size,
+        })
+        # The manifest is written last: a backup without one is never listed
+        with open(_manifest_path(directory, name), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+    finally:
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+        os.remove(lock)
+    
+    return manifest, apply_retention(directory, settings["keep_daily"], settings["keep_weekly"])
+
+
+def apply_retention(directory, keep_daily, keep_weekly):
+    """Delete backups outside the retention policy and return their names
+    
+    Keeps the newest backup of each of the last keep_daily days and of each
+    of the last keep_weekly ISO weeks that have backups, plus the full
+    backups those depend on.
+    """
+    backups = list_backups(directory)
+    keep = set()
+    days, weeks = [], []
+    for manifest in backups:
+        created = datetime.fromisoformat(manifest["created"])
+        day, week = created.date(), created.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            keep.add(manifest["name"])
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(manifest["name"])
+    keep |= {m["base"] for m in backups if m["name"] in keep and m["base"]}
+    
+    removed = []
+    for manifest in backups:
+        if manifest["name"] in keep:
+            continue
+        # Manifest first, so an interrupted cleanup never lists a partial backup
+        os.remove(_manifest_path(directory, manifest["name"]))
+        for path in _backup_files(directory, manifest):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(manifest["name"])
+    return removed
+
+
+def prepare_restore(directory, name, target_path=database.DB_PATH):
+    """Rebuild a backup next to target_path, verify it and return its path
+    
+    The live database is not touched; swap_in() puts the result in place.
+    """
+    manifest = read_manifest(directory, name)
+    base = manifest if manifest["kind"] == "full" else read_manifest(directory, manifest["base"])
+    page_size = manifest["page_size"]
+    restored = target_path + ".restore"
+    
+    try:
+        with open(restored, "wb") as out:
+            with _open_compressed(os.path.join(directory, base["data"]), "rb", base["compression"]) as f:
+                shutil.copyfileobj(f, out, COPY_BUFFER)
+            if manifest["kind"] == "incremental":
+                with _open_compressed(os.path.join(directory, manifest["data"]), "rb",
+                                      manifest["compression"]) as f:
+                    while True:
+                        header = f.read(_PAGE_NUMBER.size)
+                        if not header:
+                            break
+                        page_number, = _PAGE_NUMBER.unpack(header)
+                        out.seek((page_number - 1) * page_size)
+                        out.write(f.read(page_size))
+            out.truncate(manifest["page_count"] * page_size)
+        
+        digest = hashlib.sha256()
+        for page in _iter_pages(restored, page_size):
+            digest.update(page)
+        if digest.hexdigest() != manifest["sha256"]:
+            raise BackupError(f"Backup {name} is damaged: checksum mismatch")
+        
+        restored_conn = sqlite3.connect(restored)
+        try:
+            errors = integrity_errors(restored_conn)
+        finally:
+            restored_conn.close()
+        if errors:
+            raise BackupError(f"Backup {name} failed integrity check: " + "; ".join(errors[:5]))
+    except BaseException:
+        for path in database.database_files(restored):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return restored
+
+
+def swap_in(restored, db_path=database.DB_PATH):
+    """Atomically replace the database file with a prepared restore
+    
+    Every connection to db_path must be closed first. Leftover WAL and
+    journal files belong to the old database and are removed before the
+    swap so they can never be replayed into the restored one.
+    """
+    for path in database.database_files(db_path)[1:]:
+        if os.path.exists(path):
+            os.remove(path)
+    os.replace(restored, db_path)
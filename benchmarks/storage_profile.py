@@ -0,0 +1,212 @@
+"""Compare SQLite defaults with the configured storage profile on a synthetic database
+
+Usage:
+    python benchmarks/storage_profile.py [--students N] [--results N] [--attendance N]
+
+The database is generated once (default: benchmarks/bench_massar.db) and reused
+on later runs. Each profile is measured on:
+
+  * student results page  - the query behind load_student_results
+  * attendance commit     - one single-row write + commit, as in mark_attendance
+  * commit under reader   - the same write while another connection is in the
+                            middle of a long read (two clients on one database)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import database
+
+# SQLite's out-of-the-box behaviour, as used before storage profiles existed
+SQLITE_DEFAULTS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "cache_size": -2000,
+    "mmap_size": 0,
+    "temp_store": "DEFAULT",
+    "busy_timeout": 0,
+}
+
+STATUSES = ("Present", "Absent", "Late")
+
+
+def build_database(path, students, results, attendance):
+    """Create and fill the synthetic database"""
+    conn = sqlite3.connect(path)
+    database.migrate(conn)
+    rng = random.Random(42)
+    
+    with conn:
+        conn.executemany(
+            "INSERT INTO teachers (teacher_id, name, email, password, subject) VALUES (?, ?, ?, ?, ?)",
+            ((f"T{i:05d}", f"Teacher {i}", f"t{i}@school.ma", "x", "Math") for i in range(1, 201))
+        )
+        conn.executemany(
+            "INSERT INTO subjects (subject_code, subject_name, teacher_id, class, credits) VALUES (?, ?, ?, ?, ?)",
+            ((f"S{i:04d}", f"Subject {i}", rng.randint(1, 200), f"Class {i % 100}", 3) for i in range(1, 401))
+        )
+        conn.executemany(
+            "INSERT INTO classes (class_name, level, capacity, year) VALUES (?, 'Test', 40, '2023-2024')",
+            ((f"Class {i}",) for i in range(100))
+        )
+        conn.executemany(
+            "INSERT INTO students (student_id, cne, name, email, password, class_id) VALUES (?, ?, ?, ?, ?, ?)",
+            ((f"S{i:07d}", f"CNE{i:07d}", f"Student {i}", f"s{i}@school.ma", "x", i % 100 + 1)
+             for i in range(1, students + 1))
+        )
+        conn.executemany(
+            "INSERT INTO results (student_id, subject_id, teacher_id, grade, exam_type, date) "
+            "VALUES (?, ?, ?, ?, 'Normal', ?)",
+            ((rng.randint(1, students), rng.randint(1, 400), rng.randint(1, 200),
+              round(rng.uniform(0, 20), 2), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+             for _ in range(results))
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO attendance (student_id, date, status, subject_id) VALUES (?, ?, ?, ?)",
+            ((rng.randint(1, students), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+              rng.choice(STATUSES), rng.randint(1, 400))
+             for _ in range(attendance))
+        )
+    conn.close()
+
+
+def percentiles(samples):
+    """Return (p50, p95) in milliseconds"""
+    ordered = sorted(samples)
+    return (statistics.median(ordered) * 1000,
+            ordered[int(len(ordered) * 0.95) - 1] * 1000)
+
+
+def bench_reads(conn, students, iterations):
+    """Time the student results page query"""
+    rng = random.Random(1)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        conn.execute('''
+            SELECT sub.subject_name, r.grade, r.exam_type, r.semester,
+                   r.academic_year, r.date, t.name
+            FROM results r
+            LEFT JOIN subjects sub ON r.subject_id = sub.id
+            LEFT JOIN teachers t ON r.teacher_id = t.id
+            WHERE r.student_id = ?
+            ORDER BY r.date DESC
+        ''', (rng.randint(1, students),)).fetchall()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def write_once(conn, rng, students):
+    """Write one attendance row and commit"""
+    conn.execute('''
+        INSERT INTO attendance (student_id, date, status, subject_id)
+        VALUES (?, '2099-01-01', ?, ?)
+        ON CONFLICT (student_id, date, IFNULL(subject_id, 0)) DO UPDATE SET status = excluded.status
+    ''', (rng.randint(1, students), rng.choice(STATUSES), rng.randint(1, 400)))
+    conn.commit()
+
+
+def bench_writes(conn, students, iterations):
+    """Time single-row attendance commits"""
+    rng = random.Random(2)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        write_once(conn, rng, students)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_writes_under_reader(path, profile, conn, students, iterations):
+    """Time commits while a second connection holds a long read transaction"""
+    reading = threading.Event()
+    done = threading.Event()
+    
+    def reader():
+        reader_conn = database.connect(path, profile)
+        cursor = reader_conn.execute("SELECT id FROM results")
+        cursor.fetchone()           # read transaction (and SHARED lock) now open
+        reading.set()
+        done.wait()
+        cursor.close()
+        reader_conn.close()
+    
+    thread = threading.Thread(target=reader)
+    thread.start()
+    reading.wait()
+    
+    rng = random.Random(3)
+    samples, failures = [], 0
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            try:
+                write_once(conn, rng, students)
+                samples.append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                conn.rollback()
+                failures += 1
+    finally:
+        done.set()
+        thread.join()
+    return samples, failures
+
+
+def run_profile(name, profile, path, students, iterations):
+    """Measure one storage profile and print its row of the report"""
+    conn = database.connect(path, profile)
+    # Warm the page cache so both profiles start from the same state
+    conn.execute("SELECT COUNT(*) FROM results").fetchone()
+    
+    reads = bench_reads(conn, students, iterations)
+    writes = bench_writes(conn, students, iterations)
+    blocked, failures = bench_writes_under_reader(path, profile, conn, students, min(iterations, 20))
+    conn.execute("DELETE FROM attendance WHERE date = '2099-01-01'")
+    conn.commit()
+    # Leave the file in rollback-journal mode so the next profile starts clean
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    
+    print(f"\n{name}: " + ", ".join(f"{k}={v}" for k, v in profile.items()))
+    print("  %-24s p50 %8.2f ms   p95 %8.2f ms" % (("student results page",) + percentiles(reads)))
+    print("  %-24s p50 %8.2f ms   p95 %8.2f ms" % (("attendance commit",) + percentiles(writes)))
+    if blocked:
+        print("  %-24s p50 %8.2f ms   p95 %8.2f ms   (%d failed: database is locked)"
+              % (("commit under reader",) + percentiles(blocked) + (failures,)))
+    else:
+        print("  %-24s all %d commits failed: database is locked" % ("commit under reader", failures))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_massar.db"))
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--results", type=int, default=500000)
+    parser.add_argument("--attendance", type=int, default=1000000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the synthetic database")
+    args = parser.parse_args()
+    
+    if args.rebuild:
+        for path in database.database_files(args.db):
+            if os.path.exists(path):
+                os.remove(path)
+    if not os.path.exists(args.db):
+        print(f"Building synthetic database {args.db} ...")
+        start = time.perf_counter()
+        build_database(args.db, args.students, args.results, args.attendance)
+        print(f"  done in {time.perf_counter() - start:.1f} s")
+    
+    students = sqlite3.connect(args.db).execute("SELECT COUNT(*) FROM students").fetchone()[0]
+    run_profile("SQLite defaults", SQLITE_DEFAULTS, args.db, students, args.iterations)
+    run_profile("Configured profile", database.load_storage_profile(), args.db, students, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Headless command line for scheduled jobs: no Tk display is needed
+
+Usage:
+    python main.py cli [--db PATH] <command> [options]
+
+Commands:
+    backup          add a backup to the backup set (full or incremental)
+    export [PATH]   export every table to an .xlsx file
+    import FILE     import students from a CSV or XLSX file
+    stats           print the row counts (--recount rebuilds them first)
+    check           run PRAGMA integrity_check and look for missing indexes
+    vacuum          rebuild the database file to give free pages back
+    serve           share the database with GUI clients over HTTP (see server.py)
+
+Commands share the repositories and the backup, import and export modules
+with the GUI, and never import tkinter. Progress goes to stdout and errors to
+stderr. The exit status is 0 on success, 1 when the command failed, 2 for bad
+arguments and 3 when it finished but found problems (rejected import rows,
+integrity errors or missing indexes).
+"""
+import argparse
+import ipaddress
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import backup
+import database
+import exporter
+import importer
+import server
+from repository import Repositories
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_PROBLEMS = 3
+
+
+def _out(message):
+    # Flushed line by line so progress shows up in cron mails and pipes
+    print(message, flush=True)
+
+
+def _error(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def storage_profile():
+    """Return the configured storage profile, or the defaults if it is invalid"""
+    try:
+        return database.load_storage_profile()
+    except (ValueError, OSError) as e:
+        _error(f"Invalid storage settings in {database.CONFIG_PATH}: {e}; using the defaults")
+        return dict(database.DEFAULT_STORAGE_PROFILE)
+
+
+def open_database(path):
+    """Connect with the configured storage profile and bring the schema up to date"""
+    conn = database.connect(path, storage_profile())
+    try:
+        database.migrate(conn)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def run_backup(conn, args):
+    """Add a backup to the backup set configured in massar_config.json"""
+    settings = backup.load_backup_settings()
+    shown = None
+    
+    def progress(copied, total):
+        # One line per 10% instead of one per step
+        nonlocal shown
+        percent = 100 * copied // total if total else 100
+        if percent // 10 != shown:
+            shown = percent // 10
+            _out(f"Copying pages: {copied} / {total} ({percent}%)")
+    
+    manifest, removed = backup.create_backup(conn, settings, progress=progress)
+    _out(f"{manifest['kind'].capitalize()} backup {manifest['name']} saved to {settings['directory']}")
+    for name in removed:
+        _out(f"Removed by retention: {name}")
+    return EXIT_OK
+
+
+def run_export(conn, args):
+    """Export tables to an .xlsx file"""
+    path = args.path or f"massar_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    
+    def progress(table, rows):
+        _out(f"{table}: {rows} rows")
+    
+    sheets = exporter.export_tables(conn, path, tables=args.tables or exporter.EXPORT_TABLES,
+                                    progress=progress)
+    split = [sheet for table, sheet, _ in sheets if sheet != table]
+    if split:
+        _out("Large tables were continued on extra sheets: " + ", ".join(split))
+    _out(f"Exported to {path}")
+    return EXIT_OK
+
+
+def run_import(conn, args):
+    """Import students, writing rejected rows next to the imported file"""
+    batch_size, workers = importer.import_settings()
+    report = importer.import_students(conn, args.file, batch_size=batch_size, dry_run=args.dry_run,
+                                      workers=workers,
+                                      progress=lambda rows: _out(f"{rows} rows read"))
+    _out(report.summary())
+    if not report.errors:
+        return EXIT_OK
+    errors_file = os.path.splitext(args.file)[0] + "_errors.csv"
+    report.write_errors(errors_file)
+    _out(f"Rejected rows are listed in {errors_file}")
+    return EXIT_PROBLEMS
+
+
+def run_stats(conn, args):
+    """Print the row count of every counted table"""
+    stats = Repositories(conn).stats
+    if args.recount:
+        _out("Recounting statistics...")
+        counts = stats.rebuild()
+    else:
+        counts = stats.counts()
+    for table, count in counts.items():
+        _out(f"{table}: {count}")
+    return EXIT_OK
+
+
+def run_check(conn, args):
+    """Report integrity problems and missing managed indexes"""
+    _out("Running integrity check...")
+    problems = backup.integrity_errors(conn)
+    for problem in problems:
+        _out(f"Integrity: {problem}")
+    missing = database.check_indexes(conn)
+    for index in missing:
+        _out(f"Missing index: {index}")
+    if problems or missing:
+        return EXIT_PROBLEMS
+    _out("Database is sound")
+    return EXIT_OK
+
+
+def run_vacuum(conn, args):
+    """Rebuild the database file and report how much space it gave back"""
+    def size():
+        return sum(os.path.getsize(path) for path in database.database_files(args.db)
+                   if os.path.exists(path))
+    
+    before = size()
+    _out("Vacuuming...")
+    conn.execute("VACUUM")
+    # In WAL mode the rebuilt pages sit in the WAL until a checkpoint
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    after = size()
+    _out(f"Database files: {before} -> {after} bytes ({before - after} freed)")
+    return EXIT_OK
+
+
+def run_serve(conn, args):
+    """Serve the database to GUI clients until interrupted"""
+    api = server.MassarServer((args.host, args.port), args.db, readers=args.readers,
+                              profile=storage_profile(), session_timeout=args.idle_timeout * 60)
+    _out(f"Serving {args.db} on http://{args.host}:{api.server_address[1]} "
+         f"with {args.readers} readers (Ctrl+C to stop)")
+    if not ipaddress.ip_address(api.server_address[0]).is_loopback:
+        _error("Warning: requests, passwords included, are plain HTTP; "
+               "only serve on a trusted network")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        _out("Stopped")
+    finally:
+        api.server_close()
+    return EXIT_OK
+
+
+def build_parser():
+    """Return the argument parser for the cli commands"""
+    parser = argparse.ArgumentParser(prog="main.py cli", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=database.DB_PATH, help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+    
+    command = commands.add_parser("backup", help="add a backup to the backup set")
+    command.set_defaults(run=run_backup)
+    
+    command = commands.add_parser("export", help="export tables to an .xlsx file")
+    command.add_argument("path", nargs="?", help="output file (default: massar_export_<time>.xlsx)")
+    command.add_argument("--tables", nargs="+", choices=exporter.EXPORT_TABLES, metavar="TABLE",
+                         help="tables to export (default: all)")
+    command.set_defaults(run=run_export)
+    
+    command = commands.add_parser("import", help="import students from a CSV or XLSX file")
+    command.add_argument("file")
+    command.add_argument("--dry-run", action="store_true", help="validate every row without importing")
+    command.set_defaults(run=run_import)
+    
+    command = commands.add_parser("stats", help="print the row counts")
+    command.add_argument("--recount", action="store_true",
+                         help="recompute the counters and summaries from the raw tables first")
+    command.set_defaults(run=run_stats)
+    
+    command = commands.add_parser("check", help="check database integrity and indexes")
+    command.set_defaults(run=run_check)
+    
+    command = commands.add_parser("vacuum", help="rebuild the database file to reclaim space")
+    command.set_defaults(run=run_vacuum)
+    
+    command = commands.add_parser("serve", help="share the database with GUI clients over HTTP")
+    command.add_argument("--host", default=server.HOST,
+                         help="address to listen on (default: %(default)s, this PC only; "
+                              "0.0.0.0 for every network interface, on a trusted LAN only)")
+    command.add_argument("--port", type=int, default=server.PORT, help="default: %(default)s")
+    command.add_argument("--readers", type=int, default=server.READERS,
+                         help="read connections (default: %(default)s)")
+    command.add_argument("--idle-timeout", type=int, default=server.SESSION_TIMEOUT // 60,
+                         metavar="MINUTES", help="log out sessions idle this long (default: %(default)s)")
+    command.set_defaults(run=run_serve)
+    return parser
+
+
+def main(argv=None):
+    """Run one command and return the process exit status"""
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.db):
+        # Connecting would create an empty database where a typo was meant
+        _error(f"Database {args.db} does not exist")
+        return EXIT_FAILED
+    try:
+        conn = open_database(args.db)
+    except (sqlite3.Error, OSError) as e:
+        _error(f"Error opening database {args.db}: {e}")
+        return EXIT_FAILED
+    try:
+        return args.run(conn, args)
+    except (sqlite3.Error, OSError, ValueError, backup.BackupError) as e:
+        _error(f"{args.command} failed: {e}")
+        return EXIT_FAILED
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,772 @@
+import sqlite3
+import hashlib
+import json
+import os
+
+DB_PATH = 'massar_system.db'
+CONFIG_PATH = 'massar_config.json'
+
+# SQLite storage settings applied to every connection. Values in the "storage"
+# section of massar_config.json override these.
+DEFAULT_STORAGE_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,       # negative = KiB, i.e. 64 MiB page cache
+    "mmap_size": 268435456,     # 256 MiB memory-mapped I/O
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,       # ms to wait on a locked database before failing
+}
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+# Compiled statements sqlite3 keeps per connection (sqlite3.connect's
+# cached_statements), also the bound of repository.StatementCache
+STATEMENT_CACHE_SIZE = 128
+
+# Rows per transaction when a migration backfills or rewrites a large table
+CHUNK_SIZE = 5000
+
+# Secondary indexes backing the hot query paths: (name, table, columns, unique).
+# check_indexes verifies these; migrations spell out the indexes they create.
+INDEXES = [
+    ("idx_results_student_date", "results", ("student_id", "date"), False),
+    ("idx_results_teacher_date", "results", ("teacher_id", "date"), False),
+    ("idx_results_subject", "results", ("subject_id",), False),
+    ("idx_subjects_teacher", "subjects", ("teacher_id",), False),
+    ("idx_students_class", "students", ("class_id", "name"), False),
+    ("idx_attendance_key", "attendance", ("student_id", "date", "IFNULL(subject_id, 0)"), True),
+    ("idx_subjects_name", "subjects", ("subject_name",), False),
+    ("idx_subjects_class", "subjects", ("class",), False),
+]
+
+# The indexes migration 2 shipped with, frozen; indexes added or replaced
+# later are created by the migrations that introduced them
+_V2_INDEXES = [
+    ("idx_results_student_date", "results", ("student_id", "date"), False),
+    ("idx_results_teacher_date", "results", ("teacher_id", "date"), False),
+    ("idx_results_subject", "results", ("subject_id",), False),
+    ("idx_subjects_teacher", "subjects", ("teacher_id",), False),
+    ("idx_students_class_name", "students", ("class", "name"), False),
+    ("idx_attendance_student_date_subject", "attendance", ("student_id", "date", "subject_id"), True),
+]
+
+# FTS5 search indexes kept in sync by triggers:
+# (fts table, source table, columns, bm25 column weights, row filter)
+# The filter is written against {row}, which stands for NEW or the source table.
+SEARCH_INDEXES = [
+    ("students_fts", "students", ("name", "cne", "email", "student_id", "phone"),
+     (10.0, 5.0, 2.0, 5.0, 1.0), None),
+    ("teachers_fts", "teachers", ("name", "teacher_id", "email"), (10.0, 5.0, 2.0), None),
+    ("results_fts", "results", ("remarks",), (1.0,), "COALESCE({row}.remarks, '') != ''"),
+]
+
+# Tables whose row counts are kept in stats_counters by triggers
+COUNTED_TABLES = ("students", "teachers", "results", "subjects", "classes", "attendance")
+
+# Columns repository.ReferenceCache keeps in memory; changing them bumps
+# reference_version through triggers
+REFERENCE_COLUMNS = {
+    "subjects": ("subject_name", "class", "teacher_id"),
+    "teachers": ("name",),
+    "classes": ("class_name",),
+}
+
+
+def load_config(path=CONFIG_PATH):
+    """Load the JSON configuration file, or {} if there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_storage_profile(path=CONFIG_PATH):
+    """Return the storage profile from the config file merged over the defaults"""
+    profile = dict(DEFAULT_STORAGE_PROFILE)
+    profile.update(load_config(path).get("storage", {}))
+    
+    unknown = set(profile) - set(DEFAULT_STORAGE_PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown storage settings: {', '.join(sorted(unknown))}")
+    for key, allowed in (("journal_mode", JOURNAL_MODES),
+                         ("synchronous", SYNCHRONOUS_MODES),
+                         ("temp_store", TEMP_STORES)):
+        profile[key] = str(profile[key]).upper()
+        if profile[key] not in allowed:
+            raise ValueError(f"{key} must be one of {', '.join(allowed)}")
+    for key in ("cache_size", "mmap_size", "busy_timeout"):
+        profile[key] = int(profile[key])
+    return profile
+
+
+def apply_storage_profile(conn, profile):
+    """Apply a storage profile's PRAGMAs to an open connection"""
+    # busy_timeout first so switching the journal mode can wait for other clients
+    conn.execute(f"PRAGMA busy_timeout = {profile['busy_timeout']}")
+    conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {profile['cache_size']}")
+    conn.execute(f"PRAGMA mmap_size = {profile['mmap_size']}")
+    conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+
+
+def connect(path=DB_PATH, profile=None, check_same_thread=True):
+    """Open a connection to the database with the storage profile applied"""
+    if profile is None:
+        profile = load_storage_profile()
+    conn = sqlite3.connect(path, timeout=profile["busy_timeout"] / 1000,
+                           cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread)
+    apply_storage_profile(conn, profile)
+    return conn
+
+
+def database_files(path=DB_PATH):
+    """Return the database file and its WAL/journal side files"""
+    return [path + suffix for suffix in ("", "-wal", "-shm", "-journal")]
+
+
+def hash_password(password):
+    """Hash password using SHA-256"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+class Migration:
+    """A numbered schema change
+    
+    Transactional migrations run inside a single transaction together with the
+    version bump. Chunked migrations manage their own commits (see
+    run_in_chunks) so they never hold the write lock for long; they must be
+    safe to re-run if interrupted half way.
+    """
+    
+    def __init__(self, version, description, apply, chunked=False, sqlite_version=None):
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.chunked = chunked
+        # Oldest SQLite library the step works with, e.g. (3, 35, 0)
+        self.sqlite_version = sqlite_version
+
+
+def run_in_chunks(conn, table, sql, params=None, chunk_size=CHUNK_SIZE):
+    """Run `sql` over consecutive id ranges of `table`, committing after each range
+    
+    The statement receives the range bounds as the named parameters :lo
+    (inclusive) and :hi (exclusive), in addition to `params`.
+    """
+    max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    for lo in range(0, max_id + 1, chunk_size):
+        with conn:
+            conn.execute(sql, dict(params or {}, lo=lo, hi=lo + chunk_size))
+
+
+def _create_base_schema(conn):
+    """Version 1: the original tables and the default admin account"""
+    # IF NOT EXISTS lets databases created before versioning adopt this step
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT UNIQUE NOT NULL,
+            cne TEXT UNIQUE,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE,
+            password TEXT NOT NULL,
+            class TEXT,
+            birth_date TEXT,
+            address TEXT,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS teachers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teacher_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE,
+            password TEXT NOT NULL,
+            subject TEXT,
+            qualification TEXT,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_code TEXT UNIQUE NOT NULL,
+            subject_name TEXT NOT NULL,
+            teacher_id INTEGER,
+            class TEXT,
+            credits INTEGER,
+            FOREIGN KEY (teacher_id) REFERENCES teachers (id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            subject_id INTEGER NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            grade REAL NOT NULL,
+            exam_type TEXT,
+            semester TEXT,
+            academic_year TEXT,
+            remarks TEXT,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students (id),
+            FOREIGN KEY (subject_id) REFERENCES subjects (id),
+            FOREIGN KEY (teacher_id) REFERENCES teachers (id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS classes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_name TEXT UNIQUE NOT NULL,
+            level TEXT,
+            capacity INTEGER,
+            year TEXT
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            status TEXT NOT NULL,
+            subject_id INTEGER,
+            remarks TEXT,
+            FOREIGN KEY (student_id) REFERENCES students (id),
+            FOREIGN KEY (subject_id) REFERENCES subjects (id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS admin (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Insert default admin if not exists
+    if conn.execute("SELECT COUNT(*) FROM admin").fetchone()[0] == 0:
+        conn.execute(
+            "INSERT INTO admin (username, password, email) VALUES (?, ?, ?)",
+            ("admin", hash_password("admin123"), "admin@school.ma")
+        )
+
+
+def _create_indexes(conn):
+    """Version 2: secondary indexes and the unique attendance key"""
+    # Collapse duplicate attendance rows (keeping the latest) so the unique
+    # index can be built. A temporary index keeps each chunk an indexed lookup.
+    with conn:
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS tmp_attendance_dedupe
+            ON attendance (student_id, date, subject_id, id)
+        ''')
+    run_in_chunks(conn, "attendance", '''
+        DELETE FROM attendance
+        WHERE id >= :lo AND id < :hi
+          AND EXISTS (SELECT 1 FROM attendance later
+                      WHERE later.student_id = attendance.student_id
+                        AND later.date = attendance.date
+                        AND later.subject_id IS attendance.subject_id
+                        AND later.id > attendance.id)
+    ''')
+    with conn:
+        conn.execute("DROP INDEX IF EXISTS tmp_attendance_dedupe")
+    
+    for name, table, columns, unique in _V2_INDEXES:
+        with conn:
+            _create_index(conn, name, table, columns, unique)
+
+
+def _create_index(conn, name, table, columns, unique):
+    conn.execute(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+        f"ON {table} ({', '.join(columns)})"
+    )
+
+
+def _key_attendance_without_subject(conn):
+    """Version 3: at most one attendance row per student and date without a subject
+    
+    The unique index from version 2 treats NULL subjects as distinct, so
+    re-marking them added rows. Duplicates collapse to the latest row and the
+    key indexes IFNULL(subject_id, 0) instead.
+    """
+    run_in_chunks(conn, "attendance", '''
+        DELETE FROM attendance
+        WHERE id >= :lo AND id < :hi AND subject_id IS NULL
+          AND EXISTS (SELECT 1 FROM attendance later
+                      WHERE later.student_id = attendance.student_id
+                        AND later.date = attendance.date
+                        AND later.subject_id IS NULL
+                        AND later.id > attendance.id)
+    ''')
+    with conn:
+        conn.execute("DROP INDEX IF EXISTS idx_attendance_student_date_subject")
+        _create_index(conn, "idx_attendance_key", "attendance",
+                      ("student_id", "date", "IFNULL(subject_id, 0)"), True)
+
+
+def _create_list_indexes(conn):
+    """Version 4: index serving the keyset-paged admin subject list"""
+    _create_index(conn, "idx_subjects_name", "subjects", ("subject_name",), False)
+
+
+def _create_search_index(conn, fts, table, columns, weights, condition):
+    column_list = ", ".join(columns)
+    
+    def select(row):
+        values = ", ".join(f"{row}.{column}" for column in columns)
+        where = f" WHERE {condition.format(row=row)}" if condition else ""
+        return f"SELECT {row}.id, {values}{where}"
+    
+    with conn:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{column_list}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        # Matches in names count more than matches in emails or phone numbers
+        conn.execute(
+            f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', ?)",
+            (f"bm25({', '.join(map(str, weights))})",)
+        )
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts} (rowid, {column_list}) {select("NEW")};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                DELETE FROM {fts} WHERE rowid = OLD.id;
+                INSERT INTO {fts} (rowid, {column_list}) {select("NEW")};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM {fts} WHERE rowid = OLD.id;
+            END
+        ''')
+    
+    # The triggers cover every write from here on. The backfill skips rows
+    # already indexed, so it can be re-run and can race with other clients.
+    where = f"{condition.format(row=table)} AND " if condition else ""
+    run_in_chunks(conn, table, f'''
+        INSERT INTO {fts} (rowid, {column_list})
+        SELECT id, {column_list} FROM {table}
+        WHERE {where}id >= :lo AND id < :hi
+          AND id NOT IN (SELECT rowid FROM {fts} WHERE rowid >= :lo AND rowid < :hi)
+    ''')
+
+
+def _create_search_indexes(conn):
+    """Version 5: full-text search over students, teachers and result remarks"""
+    for search_index in SEARCH_INDEXES:
+        _create_search_index(conn, *search_index)
+
+
+def _create_stats_counters(conn):
+    """Version 6: row counts maintained by triggers for the dashboard statistics"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    for table in COUNTED_TABLES:
+        # Same transaction as the triggers, so no write slips in between
+        conn.execute(
+            f"INSERT OR REPLACE INTO stats_counters (table_name, row_count) "
+            f"SELECT ?, COUNT(*) FROM {table}",
+            (table,)
+        )
+        for event, change in (("INSERT", "+ 1"), ("DELETE", "- 1")):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_count_{event.lower()} AFTER {event} ON {table} BEGIN
+                    UPDATE stats_counters SET row_count = row_count {change} WHERE table_name = '{table}';
+                END
+            ''')
+
+
+
+# Recomputes one (student, subject, teacher) group of student_grade_summary from
+# results; {row} is OLD or NEW. GROUP BY yields no row once the group is empty.
+_REFRESH_GRADE_GROUP = '''
+    DELETE FROM student_grade_summary
+    WHERE student_id = {row}.student_id AND subject_id = {row}.subject_id
+      AND teacher_id = {row}.teacher_id;
+    INSERT INTO student_grade_summary
+    SELECT student_id, subject_id, teacher_id,
+           COUNT(*), SUM(grade), MIN(grade), MAX(grade), MAX(date)
+    FROM results
+    WHERE student_id = {row}.student_id AND subject_id = {row}.subject_id
+      AND teacher_id = {row}.teacher_id
+    GROUP BY student_id, subject_id, teacher_id;
+'''
+
+
+def _create_grade_summary(conn):
+    """Version 7: grade count/sum/min/max per student, subject and teacher
+    
+    Inserts update their group arithmetically; deletes and updates recompute
+    just the groups they touch, which hold a handful of rows each.
+    """
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS student_grade_summary (
+                student_id INTEGER NOT NULL,
+                subject_id INTEGER NOT NULL,
+                teacher_id INTEGER NOT NULL,
+                result_count INTEGER NOT NULL,
+                grade_sum REAL NOT NULL,
+                grade_min REAL NOT NULL,
+                grade_max REAL NOT NULL,
+                last_date TIMESTAMP,
+                PRIMARY KEY (student_id, subject_id, teacher_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_grade_summary_teacher
+            ON student_grade_summary (teacher_id, student_id)
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS results_summary_insert AFTER INSERT ON results BEGIN
+                INSERT INTO student_grade_summary
+                VALUES (NEW.student_id, NEW.subject_id, NEW.teacher_id,
+                        1, NEW.grade, NEW.grade, NEW.grade, NEW.date)
+                ON CONFLICT (student_id, subject_id, teacher_id) DO UPDATE SET
+                    result_count = result_count + 1,
+                    grade_sum = grade_sum + excluded.grade_sum,
+                    grade_min = MIN(grade_min, excluded.grade_min),
+                    grade_max = MAX(grade_max, excluded.grade_max),
+                    last_date = COALESCE(MAX(last_date, excluded.last_date), last_date, excluded.last_date);
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS results_summary_delete AFTER DELETE ON results BEGIN
+                {_REFRESH_GRADE_GROUP.format(row="OLD")}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS results_summary_update
+            AFTER UPDATE OF student_id, subject_id, teacher_id, grade, date ON results BEGIN
+                {_REFRESH_GRADE_GROUP.format(row="OLD")}
+                {_REFRESH_GRADE_GROUP.format(row="NEW")}
+            END
+        ''')
+    
+    # Backfill by student id range. Each chunk recomputes its groups from
+    # scratch, overwriting rows the triggers may have started meanwhile.
+    run_in_chunks(conn, "students", '''
+        INSERT OR REPLACE INTO student_grade_summary
+        SELECT student_id, subject_id, teacher_id,
+               COUNT(*), SUM(grade), MIN(grade), MAX(grade), MAX(date)
+        FROM results
+        WHERE student_id >= :lo AND student_id < :hi
+        GROUP BY student_id, subject_id, teacher_id
+    ''')
+
+
+
+def _week_start_sql(row):
+    """SQL for the Monday starting the ISO week of {row}.date (dates that do not parse stay as they are)"""
+    return f"COALESCE(date({row}.date, 'weekday 0', '-6 days'), {row}.date)"
+
+
+def _term_sql(row):
+    """SQL for the term of {row}.date, e.g. '2023-2024 Semester 1'
+    
+    Terms follow the Moroccan school year: Semester 1 runs from September to
+    January, Semester 2 from February to August.
+    """
+    year = f"CAST(substr({row}.date, 1, 4) AS INTEGER)"
+    month = f"CAST(substr({row}.date, 6, 2) AS INTEGER)"
+    return f'''
+        CASE WHEN {month} >= 9 THEN {year} || '-' || ({year} + 1) || ' Semester 1'
+             WHEN {month} = 1 THEN ({year} - 1) || '-' || {year} || ' Semester 1'
+             ELSE ({year} - 1) || '-' || {year} || ' Semester 2'
+        END
+    '''
+
+
+# Rollup tables and the key expressions of an attendance row ({row}) in each
+ATTENDANCE_ROLLUPS = {
+    "attendance_weekly": (("student_id", "subject_id", "week_start"),
+                          lambda row: (f"{row}.student_id", f"COALESCE({row}.subject_id, 0)",
+                                       _week_start_sql(row))),
+    "attendance_term": (("student_id", "term"),
+                        lambda row: (f"{row}.student_id", _term_sql(row))),
+}
+
+
+def _rollup_add(table, row):
+    columns, key = ATTENDANCE_ROLLUPS[table]
+    return f'''
+        INSERT INTO {table} ({", ".join(columns)}, present, absent, late, total)
+        VALUES ({", ".join(key(row))}, {row}.status = 'Present', {row}.status = 'Absent',
+                {row}.status = 'Late', 1)
+        ON CONFLICT ({", ".join(columns)}) DO UPDATE SET
+            present = present + excluded.present,
+            absent = absent + excluded.absent,
+            late = late + excluded.late,
+            total = total + 1;
+    '''
+
+
+def _rollup_remove(table, row):
+    columns, key = ATTENDANCE_ROLLUPS[table]
+    match = " AND ".join(f"{column} = {value}" for column, value in zip(columns, key(row)))
+    return f'''
+        UPDATE {table} SET
+            present = present - ({row}.status = 'Present'),
+            absent = absent - ({row}.status = 'Absent'),
+            late = late - ({row}.status = 'Late'),
+            total = total - 1
+        WHERE {match};
+        DELETE FROM {table} WHERE {match} AND total <= 0;
+    '''
+
+
+def rollup_recount_sql(table, where="1"):
+    """SQL recounting an attendance rollup table from the attendance rows matching where"""
+    columns, key = ATTENDANCE_ROLLUPS[table]
+    return f'''
+        INSERT OR REPLACE INTO {table} ({", ".join(columns)}, present, absent, late, total)
+        SELECT {", ".join(key("attendance"))},
+               SUM(status = 'Present'), SUM(status = 'Absent'), SUM(status = 'Late'), COUNT(*)
+        FROM attendance
+        WHERE {where}
+        GROUP BY {", ".join(str(i + 1) for i in range(len(columns)))}
+    '''
+
+
+def _create_attendance_rollups(conn):
+    """Version 8: attendance counts per student, subject and week, and per student and term
+    
+    Triggers add and subtract each attendance row's status, so every write
+    costs a couple of single-row updates and the rollups never need a scan.
+    """
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_weekly (
+                student_id INTEGER NOT NULL,
+                subject_id INTEGER NOT NULL,        -- 0 for attendance without a subject
+                week_start TEXT NOT NULL,           -- Monday of the ISO week
+                present INTEGER NOT NULL,
+                absent INTEGER NOT NULL,
+                late INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (student_id, subject_id, week_start)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_term (
+                student_id INTEGER NOT NULL,
+                term TEXT NOT NULL,
+                present INTEGER NOT NULL,
+                absent INTEGER NOT NULL,
+                late INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (student_id, term)
+            ) WITHOUT ROWID
+        ''')
+        tables = list(ATTENDANCE_ROLLUPS)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS attendance_rollup_insert AFTER INSERT ON attendance BEGIN
+                {"".join(_rollup_add(table, "NEW") for table in tables)}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS attendance_rollup_delete AFTER DELETE ON attendance BEGIN
+                {"".join(_rollup_remove(table, "OLD") for table in tables)}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS attendance_rollup_update
+            AFTER UPDATE OF student_id, date, subject_id, status ON attendance BEGIN
+                {"".join(_rollup_remove(table, "OLD") for table in tables)}
+                {"".join(_rollup_add(table, "NEW") for table in tables)}
+            END
+        ''')
+    
+    # Backfill by student id range; each chunk recounts its students from
+    # scratch, replacing whatever the triggers added meanwhile
+    for table in ATTENDANCE_ROLLUPS:
+        run_in_chunks(conn, "students", rollup_recount_sql(table, "student_id >= :lo AND student_id < :hi"))
+
+
+def _create_enrollments(conn):
+    """Version 9: which students take which subjects
+    
+    Filled from the class each subject is taught to and from existing results,
+    so teacher rosters are an indexed lookup instead of a scan of results.
+    """
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS enrollments (
+                student_id INTEGER NOT NULL,
+                subject_id INTEGER NOT NULL,
+                PRIMARY KEY (student_id, subject_id),
+                FOREIGN KEY (student_id) REFERENCES students (id),
+                FOREIGN KEY (subject_id) REFERENCES subjects (id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_enrollments_subject
+            ON enrollments (subject_id, student_id)
+        ''')
+        _create_index(conn, "idx_subjects_class", "subjects", ("class",), False)
+    
+    # INSERT OR IGNORE makes every chunk safe to run again
+    run_in_chunks(conn, "students", '''
+        INSERT OR IGNORE INTO enrollments (student_id, subject_id)
+        SELECT s.id, sub.id FROM students s JOIN subjects sub ON sub.class = s.class
+        WHERE s.id >= :lo AND s.id < :hi
+    ''')
+    run_in_chunks(conn, "students", '''
+        INSERT OR IGNORE INTO enrollments (student_id, subject_id)
+        SELECT DISTINCT student_id, subject_id FROM results
+        WHERE student_id >= :lo AND student_id < :hi
+    ''')
+
+
+def _normalize_student_classes(conn):
+    """Version 10: students reference their class by id instead of by name
+    
+    Classes only ever typed on students get a classes row first. The old
+    text column and its index are dropped once every student is linked.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(students)")}
+    if "class" in columns:
+        if "class_id" not in columns:
+            with conn:
+                conn.execute("ALTER TABLE students ADD COLUMN class_id INTEGER REFERENCES classes (id)")
+        run_in_chunks(conn, "students", '''
+            INSERT OR IGNORE INTO classes (class_name)
+            SELECT DISTINCT class FROM students
+            WHERE id >= :lo AND id < :hi AND class IS NOT NULL AND class != ''
+        ''')
+        run_in_chunks(conn, "students", '''
+            UPDATE students
+            SET class_id = (SELECT c.id FROM classes c WHERE c.class_name = students.class)
+            WHERE id >= :lo AND id < :hi
+        ''')
+        with conn:
+            conn.execute("DROP INDEX IF EXISTS idx_students_class_name")
+            conn.execute("ALTER TABLE students DROP COLUMN class")
+    
+    with conn:
+        _create_index(conn, "idx_students_class", "students", ("class_id", "name"), False)
+
+
+def _create_reference_version(conn):
+    """Version 11: a counter bumped whenever the cached reference data changes"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reference_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO reference_version (id, version) VALUES (1, 0)")
+    for table, columns in REFERENCE_COLUMNS.items():
+        for event in ("INSERT", "DELETE", f"UPDATE OF {', '.join(columns)}"):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_reference_{event.split()[0].lower()}
+                AFTER {event} ON {table} BEGIN
+                    UPDATE reference_version SET version = version + 1;
+                END
+            ''')
+
+
+# Ordered schema history. Append new steps; never edit or renumber old ones.
+MIGRATIONS = [
+    Migration(1, "Base schema", _create_base_schema),
+    Migration(2, "Secondary indexes for hot query paths", _create_indexes, chunked=True),
+    Migration(3, "Unique attendance key for records without a subject",
+              _key_attendance_without_subject, chunked=True),
+    Migration(4, "Index for the paged subject list", _create_list_indexes),
+    Migration(5, "Full-text search indexes", _create_search_indexes, chunked=True),
+    Migration(6, "Trigger-maintained row counters", _create_stats_counters),
+    Migration(7, "Per-student grade summaries", _create_grade_summary, chunked=True),
+    Migration(8, "Weekly and per-term attendance rollups", _create_attendance_rollups, chunked=True),
+    Migration(9, "Student enrollments per subject", _create_enrollments, chunked=True),
+    Migration(10, "Students reference classes by id", _normalize_student_classes, chunked=True,
+              sqlite_version=(3, 35, 0)),
+    Migration(11, "Change counter for subjects, teachers and classes", _create_reference_version),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations in order and return the ones that ran"""
+    current = schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        # Fast path: schema is current, no DDL at all
+        return []
+    
+    pending = [migration for migration in MIGRATIONS if migration.version > current]
+    # Refuse up front rather than stop half way through the upgrade
+    for migration in pending:
+        if migration.sqlite_version and sqlite3.sqlite_version_info < migration.sqlite_version:
+            raise sqlite3.NotSupportedError(
+                f"Schema version {migration.version} ({migration.description}) needs SQLite "
+                f"{'.'.join(map(str, migration.sqlite_version))} or newer; "
+                f"this Python has SQLite {sqlite3.sqlite_version}"
+            )
+    
+    applied = []
+    for migration in pending:
+        if migration.chunked:
+            # Chunked steps commit as they go; only the version bump is atomic
+            migration.apply(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not migration.chunked:
+                migration.apply(conn)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(migration)
+    return applied
+
+
+def existing_indexes(conn, table):
+    """Return {index name: (columns, unique)} for a table; expression columns are None"""
+    indexes = {}
+    for row in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        index_name, unique = row[1], bool(row[2])
+        columns = tuple(info[2] for info in conn.execute(f"PRAGMA index_info({index_name})"))
+        indexes[index_name] = (columns, unique)
+    return indexes
+
+
+def check_indexes(conn):
+    """Return the managed indexes that are missing or differ from their definition"""
+    missing = []
+    for name, table, columns, unique in INDEXES:
+        expected = tuple(None if "(" in column else column for column in columns)
+        if existing_indexes(conn, table).get(name) != (expected, unique):
+            missing.append(f"{name} ON {table} ({', '.join(columns)})")
+    return missing
@@ -0,0 +1,219 @@
+"""Background query executor: keeps SQLite work off the Tk mainloop
+
+A single worker thread owns its own connection (and its own Repositories).
+UI code submits a function that receives those repositories; the return
+value is handed back on the Tk thread through root.after, so callbacks may
+touch widgets freely. Submitting with a key supersedes any earlier job with
+the same key: a queued job is dropped, a running one is interrupted, and in
+both cases its callback never fires.
+"""
+import queue
+import sqlite3
+import threading
+from tkinter import messagebox
+
+from repository import Repositories
+
+# How often the Tk thread checks for finished jobs while any are outstanding
+POLL_INTERVAL_MS = 50
+
+_STOP = object()
+
+
+class Job:
+    """A unit of work submitted to the executor"""
+    
+    def __init__(self, func, on_done, on_error, key):
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+        self.cancelled = False
+
+
+class QueryExecutor:
+    """Run repository calls on a worker thread and deliver results via root.after"""
+    
+    def __init__(self, root, connect, on_busy=None, poll_interval=POLL_INTERVAL_MS,
+                 repositories=Repositories):
+        self.root = root
+        self.connect = connect
+        self.repositories = repositories    # builds the repositories over connect()'s result
+        self.on_busy = on_busy
+        self.poll_interval = poll_interval
+        
+        self._jobs = queue.Queue()
+        self._done = queue.Queue()
+        self._calls = queue.Queue()     # callbacks forwarded from the worker
+        self._latest = {}           # key -> most recent job submitted under it
+        self._outstanding = 0       # submitted jobs not yet delivered or dropped
+        self._polling = False
+        self._closed = False
+        
+        # Guards _running and the connection the worker is using, so an
+        # interrupt can only ever hit the job it was meant for
+        self._lock = threading.Lock()
+        self._running = None
+        self._conn = None
+        
+        self._thread = threading.Thread(target=self._work, name="massar-db-worker", daemon=True)
+        self._thread.start()
+    
+    # Tk thread
+    
+    def submit(self, func, on_done=None, on_error=None, key=None):
+        """Queue func(repos) for the worker; on_done(result) runs on the Tk thread
+        
+        Errors raised by func are passed to on_error(exc), or shown in an error
+        dialog when no on_error is given.
+        """
+        if key is not None:
+            self.cancel(key)
+        job = Job(func, on_done, on_error, key)
+        if key is not None:
+            self._latest[key] = job
+        
+        self._outstanding += 1
+        if self._outstanding == 1:
+            self._set_busy(True)
+        self._jobs.put(job)
+        self._schedule_poll()
+        return job
+    
+    def cancel(self, key):
+        """Cancel the queued or running job submitted under key, if any"""
+        job = self._latest.pop(key, None)
+        if job is None:
+            return
+        job.cancelled = True
+        with self._lock:
+            if self._running is job and self._conn is not None:
+                # Abort the statement in progress; the worker drops the result
+                self._conn.interrupt()
+    
+    def cancel_all(self):
+        """Cancel every keyed job, e.g. before the widgets they fill are destroyed"""
+        for key in list(self._latest):
+            self.cancel(key)
+    
+    def in_tk_thread(self, callback):
+        """Wrap callback so calling it from a job runs it on the Tk thread
+        
+        Meant for progress reports: the call is queued and made at the next
+        poll, while the job itself carries on.
+        """
+        def forward(*args):
+            self._calls.put((callback, args))
+        return forward
+    
+    def busy(self):
+        """Return True while any submitted job has not been delivered yet"""
+        return self._outstanding > 0
+    
+    def shutdown(self, timeout=5):
+        """Stop the worker thread and close its connection"""
+        self.cancel_all()
+        self._closed = True
+        self._set_busy(False)
+        self._jobs.put(_STOP)
+        self._thread.join(timeout)
+    
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+    
+    def _poll(self):
+        """Deliver finished jobs on the Tk thread"""
+        self._polling = False
+        if self._closed:
+            return
+        while True:
+            try:
+                callback, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                self._report(None, e)
+        
+        while True:
+            try:
+                job, result, error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            
+            self._outstanding -= 1
+            if job.key is not None and self._latest.get(job.key) is job:
+                del self._latest[job.key]
+            if job.cancelled:
+                continue
+            
+            try:
+                if error is not None:
+                    self._report(job, error)
+                elif job.on_done is not None:
+                    job.on_done(result)
+            except Exception as e:
+                # A failing callback must not stop delivery of the others
+                self._report(None, e)
+        
+        if self._outstanding == 0:
+            self._set_busy(False)
+        else:
+            self._schedule_poll()
+    
+    def _report(self, job, error):
+        if job is not None and job.on_error is not None:
+            job.on_error(error)
+        else:
+            messagebox.showerror("Error", f"Database error: {error}")
+    
+    def _set_busy(self, busy):
+        if self.on_busy is not None:
+            self.on_busy(busy)
+    
+    # Worker thread
+    
+    def _work(self):
+        try:
+            conn = self.connect()
+        except sqlite3.Error as e:
+            # No connection: fail every job instead of leaving the UI waiting
+            for job in iter(self._jobs.get, _STOP):
+                self._done.put((job, None, e))
+            return
+        repos = self.repositories(conn)
+        with self._lock:
+            self._conn = conn
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is _STOP:
+                    break
+                if job.cancelled:
+                    self._done.put((job, None, None))
+                    continue
+                
+                with self._lock:
+                    self._running = job
+                result, error = None, None
+                try:
+                    result = job.func(repos)
+                except Exception as e:
+                    error = e
+                    if conn.in_transaction:
+                        conn.rollback()
+                finally:
+                    with self._lock:
+                        self._running = None
+                
+                if isinstance(error, sqlite3.OperationalError) and job.cancelled:
+                    # "interrupted" from cancel(); nobody is waiting for it
+                    error = None
+                self._done.put((job, result, error))
+        finally:
+            with self._lock:
+                self._conn = None
+            conn.close()
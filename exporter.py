@@ -0,0 +1,131 @@
+"""Streaming Excel export
+
+Tables are read in fetchmany() chunks and written through an openpyxl
+write-only workbook, so memory use stays flat however large a table is.
+Column widths are estimated from the first rows of each table, which are
+buffered just long enough to size the columns before they are written.
+Tables longer than an Excel sheet continue on "<table>_2", "<table>_3", ...
+
+openpyxl is imported on the first export rather than at startup, since
+loading it takes longer than opening the login window.
+"""
+EXPORT_TABLES = ("students", "teachers", "subjects", "results", "classes", "attendance")
+
+# Tables exported through a query instead of SELECT *. Password hashes stay
+# out of the file, and students show their class by name so an exported
+# sheet can be imported again.
+EXPORT_QUERIES = {
+    "students": "SELECT s.id, s.student_id, s.cne, s.name, s.email, c.class_name AS class, "
+                "s.birth_date, s.phone, s.address, s.created_at "
+                "FROM students s LEFT JOIN classes c ON c.id = s.class_id",
+    "teachers": "SELECT id, teacher_id, name, email, subject, qualification, phone, created_at "
+                "FROM teachers",
+}
+
+# Rows fetched from SQLite per round trip
+FETCH_SIZE = 5000
+
+# Excel's hard limit, header row included
+MAX_SHEET_ROWS = 1048576
+
+# Rows sampled per table to estimate column widths
+WIDTH_SAMPLE_ROWS = 1000
+MAX_COLUMN_WIDTH = 50
+
+
+def column_widths(headers, rows):
+    """Return a width per column fitting the header and the sampled rows"""
+    widths = [len(str(header)) for header in headers]
+    for row in rows:
+        for i, value in enumerate(row):
+            if value is not None:
+                widths[i] = max(widths[i], len(str(value)))
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def _fetch(cursor, fetch_size):
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+class _SheetWriter:
+    """Appends rows to a table's sheet, opening a new sheet when one is full"""
+    
+    def __init__(self, workbook, table, headers, widths, max_rows):
+        self.workbook = workbook
+        self.table = table
+        self.headers = headers
+        self.widths = widths
+        self.max_rows = max_rows
+        self.sheets = []            # [sheet name, data rows]
+        self.sheet = None
+    
+    def _new_sheet(self):
+        name = self.table if not self.sheets else f"{self.table}_{len(self.sheets) + 1}"
+        self.sheet = self.workbook.create_sheet(title=name)
+        # Write-only sheets take their column widths before the first row
+        from openpyxl.utils import get_column_letter
+        for i, width in enumerate(self.widths, start=1):
+            self.sheet.column_dimensions[get_column_letter(i)].width = width
+        self.sheet.append(self.headers)
+        self.sheets.append([name, 0])
+    
+    def append(self, row):
+        if self.sheet is None or self.sheets[-1][1] >= self.max_rows - 1:
+            self._new_sheet()
+        self.sheet.append(row)
+        self.sheets[-1][1] += 1
+
+
+def export_tables(conn, path, tables=EXPORT_TABLES, fetch_size=FETCH_SIZE,
+                  max_rows=MAX_SHEET_ROWS, progress=None):
+    """Export tables to an .xlsx file and return [(table, sheet name, data rows)]
+    
+    Empty tables get no sheet. progress(table, rows_written) is called after
+    every fetched chunk.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError("Exporting to Excel requires openpyxl (pip install openpyxl)")
+    
+    workbook = Workbook(write_only=True)
+    written = []
+    for table in tables:
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        cursor = conn.execute(EXPORT_QUERIES.get(table, f"SELECT * FROM {table}"))
+        headers = [column[0] for column in cursor.description]
+        rows = _fetch(cursor, fetch_size)
+        
+        # Size the columns from the first rows, then write those rows too
+        sample = []
+        for row in rows:
+            sample.append(row)
+            if len(sample) >= WIDTH_SAMPLE_ROWS:
+                break
+        if not sample:
+            continue
+        
+        writer = _SheetWriter(workbook, table, headers, column_widths(headers, sample), max_rows)
+        count = 0
+        for row in sample:
+            writer.append(row)
+            count += 1
+        for row in rows:
+            writer.append(row)
+            count += 1
+            if progress is not None and count % fetch_size == 0:
+                progress(table, count)
+        if progress is not None:
+            progress(table, count)
+        written.extend((table, name, sheet_rows) for name, sheet_rows in writer.sheets)
+    
+    if not written:
+        # A workbook needs at least one sheet
+        workbook.create_sheet(title="Empty")
+    workbook.save(path)
+    return written
@@ -0,0 +1,254 @@
+"""Bulk student import from CSV or XLSX files
+
+Rows are streamed from the file (csv module, or openpyxl in read-only mode),
+validated against the uniqueness sets loaded once from the database, and
+inserted in batches: passwords of a batch are hashed (in a process pool for
+large files) and the batch goes in through one executemany transaction. Rows that fail
+validation are collected in an ImportReport instead of stopping the import.
+"""
+import csv
+import os
+import sqlite3
+
+import database
+from repository import Repositories
+
+# Rows per insert transaction; overridden by "batch_size" in the "import"
+# section of massar_config.json
+BATCH_SIZE = 500
+
+# Rows read before hashing moves to a process pool, unless "workers" is set:
+# below this, starting the worker processes costs more than it saves
+POOL_MIN_ROWS = 20000
+
+DEFAULT_PASSWORD = "1234"
+MIN_PASSWORD_LENGTH = 4
+
+# Columns in insert order; a header row naming them is required
+COLUMNS = ("student_id", "cne", "name", "email", "password", "class",
+           "birth_date", "phone", "address")
+REQUIRED_COLUMNS = ("student_id", "cne", "name")
+
+# Alternative header spellings accepted in files exported from other tools
+HEADER_ALIASES = {
+    "class_name": "class",
+    "full_name": "name",
+    "birthdate": "birth_date",
+}
+
+
+class ImportReport:
+    """Outcome of an import: counts plus one error entry per rejected row"""
+    
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.total = 0
+        self.imported = 0
+        self.errors = []            # (line, student_id, message)
+    
+    def add_error(self, line, student_id, message):
+        self.errors.append((line, student_id, message))
+    
+    def summary(self):
+        verb = "would be imported" if self.dry_run else "imported"
+        return (f"{self.total} rows read, {self.imported} students {verb}, "
+                f"{len(self.errors)} rows rejected")
+    
+    def write_errors(self, path):
+        """Write the per-row error report as CSV"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("line", "student_id", "error"))
+            writer.writerows(self.errors)
+
+
+def import_settings(path=database.CONFIG_PATH):
+    """Return (batch size, hashing workers) configured for imports
+    
+    workers is None when not configured.
+    """
+    settings = database.load_config(path).get("import", {})
+    batch_size = int(settings.get("batch_size", BATCH_SIZE))
+    if batch_size < 1:
+        raise ValueError("import batch_size must be at least 1")
+    workers = settings.get("workers")
+    if workers is not None:
+        workers = int(workers)
+        if workers < 0:
+            raise ValueError("import workers must be 0 or more")
+    return batch_size, workers
+
+
+def _normalize_header(header):
+    names = []
+    for cell in header:
+        name = str(cell or "").strip().lower().replace(" ", "_")
+        names.append(HEADER_ALIASES.get(name, name))
+    missing = [column for column in REQUIRED_COLUMNS if column not in names]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return names
+
+
+def _read_csv(path):
+    # utf-8-sig drops the BOM Excel writes in front of CSV files
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Reading .xlsx files requires openpyxl (pip install openpyxl)")
+    
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    """Yield (line, {column: value}) for every data row of a CSV or XLSX file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        rows = _read_csv(path)
+    elif extension in (".xlsx", ".xlsm"):
+        rows = _read_xlsx(path)
+    else:
+        raise ValueError(f"Unsupported file type: {extension or path}")
+    
+    header = _normalize_header(next(rows, []))
+    for line, row in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in row):
+            continue        # skip blank lines
+        values = {}
+        for name, value in zip(header, row):
+            if name in COLUMNS:
+                # Spreadsheets hand back numbers and dates; store them as text
+                if hasattr(value, "date"):
+                    value = value.date().isoformat()
+                elif isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                values[name] = str(value).strip()
+        yield line, values
+
+
+def validate_row(values, taken, class_names):
+    """Return the error message for a row, or None if it can be imported
+    
+    taken holds the values already in use for each unique column; it is
+    updated with the row's values when the row is accepted.
+    """
+    for column in REQUIRED_COLUMNS:
+        if not values.get(column):
+            return f"{column} is required"
+    
+    password = values.get("password", "")
+    if password and len(password) < MIN_PASSWORD_LENGTH:
+        return f"Password must be at least {MIN_PASSWORD_LENGTH} characters"
+    
+    class_name = values.get("class", "")
+    if class_name and class_name not in class_names:
+        return f"Unknown class: {class_name}"
+    
+    for column in taken:
+        value = values.get(column)
+        if value and value in taken[column]:
+            return f"{column} already exists: {value}"
+    
+    for column in taken:
+        if values.get(column):
+            taken[column].add(values[column])
+    return None
+
+
+def _record(values, hashed_password):
+    return (
+        values["student_id"],
+        values["cne"],
+        values["name"],
+        values.get("email") or None,    # NULL, not '', so many rows may omit it
+        hashed_password,
+        values.get("class", ""),
+        values.get("birth_date", ""),
+        values.get("phone", ""),
+        values.get("address", ""),
+    )
+
+
+def _insert_batch(repos, report, batch, pool, chunksize):
+    """Hash the passwords of a batch of validated rows and insert them"""
+    if not batch:
+        return
+    passwords = [values.get("password") or DEFAULT_PASSWORD for _, values in batch]
+    if pool is not None:
+        hashed = list(pool.map(database.hash_password, passwords, chunksize=chunksize))
+    else:
+        hashed = [database.hash_password(password) for password in passwords]
+    records = [_record(values, password) for (_, values), password in zip(batch, hashed)]
+    
+    try:
+        report.imported += repos.students.add_many(records)
+    except sqlite3.IntegrityError:
+        # Another client inserted a clashing row since the sets were loaded:
+        # redo this batch row by row so only the offending rows are rejected
+        for (line, values), record in zip(batch, records):
+            try:
+                repos.students.add(*record)
+                report.imported += 1
+            except sqlite3.IntegrityError as e:
+                report.add_error(line, values["student_id"], str(e))
+
+
+def import_students(conn, path, batch_size=BATCH_SIZE, dry_run=False, workers=None,
+                    progress=None):
+    """Import students from a CSV or XLSX file and return an ImportReport
+    
+    With dry_run the file is fully validated (including uniqueness within the
+    file) but nothing is hashed or written. workers sets the hashing process
+    pool size; 0 hashes in this process. With None, a pool of one worker per
+    CPU takes over once POOL_MIN_ROWS rows have been read. progress(rows_read)
+    is called after every batch.
+    """
+    repos = Repositories(conn)
+    report = ImportReport(dry_run)
+    taken = repos.students.unique_values()
+    class_names = set(repos.classes.names())
+    
+    pool = None
+    pool_size = (os.cpu_count() or 1) if workers is None else workers
+    pool_rows = 0 if workers is not None else POOL_MIN_ROWS
+    chunksize = max(1, batch_size // (4 * max(pool_size, 1)))
+    try:
+        batch = []
+        for line, values in read_rows(path):
+            report.total += 1
+            error = validate_row(values, taken, class_names)
+            if error:
+                report.add_error(line, values.get("student_id", ""), error)
+                continue
+            
+            if dry_run:
+                report.imported += 1
+            else:
+                batch.append((line, values))
+                if len(batch) >= batch_size:
+                    if pool is None and pool_size > 0 and report.total >= pool_rows:
+                        # Imported here: multiprocessing is slow to load and only large imports need it
+                        from concurrent.futures import ProcessPoolExecutor
+                        pool = ProcessPoolExecutor(max_workers=pool_size)
+                    _insert_batch(repos, report, batch, pool, chunksize)
+                    batch = []
+            if progress is not None and report.total % batch_size == 0:
+                progress(report.total)
+        _insert_batch(repos, report, batch, pool, chunksize)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    
+    if progress is not None:
+        progress(report.total)
+    return report
@@ -1,21 +1,51 @@
+import time
+# Taken before the other imports so --profile-startup can report their cost
+_started = time.perf_counter()
+
+import sys
+
+# Headless commands dispatch before tkinter is imported: no display needed
+if __name__ == "__main__" and sys.argv[1:2] == ["cli"]:
+    import cli
+    sys.exit(cli.main(sys.argv[2:]))
+
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-import pandas as pd
 import sqlite3
-import hashlib
 import os
-from datetime import datetime
+import argparse
+import logging
+from datetime import datetime, timedelta
+import backup
+import database
+import exporter
+import importer
+import remote
+from repository import Repositories, date_range, term_range
+from executor import QueryExecutor
+from widgets import Debouncer, LazyNotebook, ScreenManager, TreeRows, VirtualTreeview
+
+IMPORT_MS = (time.perf_counter() - _started) * 1000
+
+log = logging.getLogger("massar")
 
 class StudentManagementSystem:
-    def __init__(self, root):
+    def __init__(self, root, server=None):
         self.root = root
+        self.server = server        # remote.RemoteClient, or None to open the database file
         self.root.title("Student Management System - Massar")
         self.root.geometry("1200x700")
         
+        # Login screen and dashboards stay alive as hidden frames between logins
+        self.screens = ScreenManager(self.root, on_discard=self.forget_screen)
+        self.screen_state = {}      # role -> (dashboard_tabs, busy_indicator, welcome label)
+        
         # Initialize database
+        init_started = time.perf_counter()
         self.init_database()
+        self.db_init_ms = (time.perf_counter() - init_started) * 1000
         
         # Current user
         self.current_user = None
@@ -26,130 +56,109 @@ class StudentManagementSystem:
         self.show_login()
     
     def init_database(self):
-        """Initialize SQLite database and create tables"""
-        self.conn = sqlite3.connect('massar_system.db')
-        self.cursor = self.conn.cursor()
-        
-        # Create tables
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id TEXT UNIQUE NOT NULL,
-                cne TEXT UNIQUE,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE,
-                password TEXT NOT NULL,
-                class TEXT,
-                birth_date TEXT,
-                address TEXT,
-                phone TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS teachers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                teacher_id TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE,
-                password TEXT NOT NULL,
-                subject TEXT,
-                qualification TEXT,
-                phone TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS subjects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                subject_code TEXT UNIQUE NOT NULL,
-                subject_name TEXT NOT NULL,
-                teacher_id INTEGER,
-                class TEXT,
-                credits INTEGER,
-                FOREIGN KEY (teacher_id) REFERENCES teachers (id)
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                subject_id INTEGER NOT NULL,
-                teacher_id INTEGER NOT NULL,
-                grade REAL NOT NULL,
-                exam_type TEXT,
-                semester TEXT,
-                academic_year TEXT,
-                remarks TEXT,
-                date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (student_id) REFERENCES students (id),
-                FOREIGN KEY (subject_id) REFERENCES subjects (id),
-                FOREIGN KEY (teacher_id) REFERENCES teachers (id)
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS classes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                class_name TEXT UNIQUE NOT NULL,
-                level TEXT,
-                capacity INTEGER,
-                year TEXT
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                date DATE NOT NULL,
-                status TEXT NOT NULL,
-                subject_id INTEGER,
-                remarks TEXT,
-                FOREIGN KEY (student_id) REFERENCES students (id),
-                FOREIGN KEY (subject_id) REFERENCES subjects (id)
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admin (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                email TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Insert default admin if not exists
-        self.cursor.execute("SELECT COUNT(*) FROM admin")
-        if self.cursor.fetchone()[0] == 0:
-            default_password = hashlib.sha256("admin123".encode()).hexdigest()
-            self.cursor.execute(
-                "INSERT INTO admin (username, password, email) VALUES (?, ?, ?)",
-                ("admin", default_password, "admin@school.ma")
-            )
+        """Open the SQLite database and bring its schema up to date"""
+        if self.server is not None:
+            # The server owns the database; every query goes to it over HTTP
+            self.conn = self.server
+            self.db = remote.RemoteRepositories(self.server)
+            self.screens.clear()
+            self.executor = QueryExecutor(self.root, lambda: self.server, on_busy=self.set_busy,
+                                          repositories=remote.RemoteRepositories)
+            return
+        
+        try:
+            self.storage_profile = database.load_storage_profile()
+        except (ValueError, OSError) as e:
+            messagebox.showwarning("Configuration",
+                                 f"Invalid storage settings in {database.CONFIG_PATH}: {e}\n"
+                                 "Using default storage settings.")
+            self.storage_profile = dict(database.DEFAULT_STORAGE_PROFILE)
         
-        self.conn.commit()
+        self.conn = database.connect(database.DB_PATH, self.storage_profile)
+        
+        # Apply pending schema migrations (skipped entirely when current)
+        try:
+            database.migrate(self.conn)
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Error upgrading database schema: {e}")
+        
+        # Report any managed index that could not be built
+        missing = database.check_indexes(self.conn)
+        if missing:
+            messagebox.showwarning("Database Indexes",
+                                 "The following database indexes are missing:\n" +
+                                 "\n".join(missing) +
+                                 "\n\nQueries on large tables will be slow.")
+        
+        # Data-access layer: all queries go through the repositories
+        self.db = Repositories(self.conn)
+        # A restore or reset replaced the file behind the shared reference cache
+        self.db.reference.invalidate()
+        
+        # Kept screens hold widgets filled from the previous connection
+        self.screens.clear()
+        
+        # Worker thread with its own connection for queries that can take a while
+        profile = self.storage_profile
+        self.executor = QueryExecutor(self.root,
+                                      lambda: database.connect(database.DB_PATH, profile),
+                                      on_busy=self.set_busy)
+    
+    def runs_on_server(self, feature, command=None):
+        """Explain that feature needs the database file when connected to a server
+        
+        Returns True (after telling the user) if the app uses a server.
+        """
+        if self.server is None:
+            return False
+        message = f"{feature} works on the database file, which the server at {self.server.url} owns."
+        if command:
+            message += f"\n\nRun it on the server PC with:\npython main.py cli {command}"
+        messagebox.showinfo(feature, message)
+        return True
     
     def hash_password(self, password):
         """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
-    
-    def clear_window(self):
-        """Clear all widgets from window"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
+        return database.hash_password(password)
+    
+    def show_screen(self, key, build, refresh=None):
+        """Switch the window to a kept screen, building it the first time"""
+        # Results of pending queries belong to the screen being left
+        self.executor.cancel_all()
+        self.busy_indicator = None
+        self.screens.show(key, build, refresh)
+    
+    def forget_screen(self, key):
+        """Drop the widget references of a screen the screen manager destroyed"""
+        self.screen_state.pop(key, None)
+    
+    def create_busy_indicator(self, parent):
+        """Create the progress bar shown while background queries run"""
+        self.busy_indicator = ttk.Progressbar(parent, mode="indeterminate", length=120,
+                                              bootstyle="info-striped")
+        self.set_busy(self.executor.busy())
+    
+    def set_busy(self, busy):
+        """Show or hide the busy indicator"""
+        self.root.config(cursor="watch" if busy else "")
+        indicator = getattr(self, 'busy_indicator', None)
+        if indicator is None or not indicator.winfo_exists():
+            return
+        if busy:
+            indicator.pack(side=RIGHT, padx=10)
+            indicator.start(10)
+        else:
+            indicator.stop()
+            indicator.pack_forget()
     
     def show_login(self):
         """Show login screen"""
-        self.clear_window()
-        
+        self.show_screen("login", self.build_login, self.refresh_login)
+    
+    def build_login(self, screen):
+        """Create the login screen widgets"""
         # Main frame with ttkbootstrap style
-        main_frame = ttk.Frame(self.root, bootstyle="light")
+        main_frame = ttk.Frame(screen, bootstyle="light")
         main_frame.place(relx=0.5, rely=0.5, anchor=CENTER)
         
         # Title with Moroccan flag colors
@@ -198,8 +207,14 @@ class StudentManagementSystem:
         ttk.Label(footer_frame, text="Student Management System v1.0", 
                  font=("Helvetica", 10), bootstyle="secondary").pack()
     
+    def refresh_login(self, screen):
+        """Clear the credentials typed for the previous login"""
+        self.username_entry.delete(0, END)
+        self.password_entry.delete(0, END)
+    
     def login(self):
         """Handle login"""
+        self.login_started = time.perf_counter()
         username = self.username_entry.get().strip()
         password = self.password_entry.get().strip()
         role = self.role_var.get()
@@ -208,28 +223,21 @@ class StudentManagementSystem:
             messagebox.showerror("Error", "Please enter username and password")
             return
         
-        hashed_password = self.hash_password(password)
+        # A server hashes the password itself, so a leaked hash cannot log in there
+        secret = password if self.server is not None else self.hash_password(password)
         
         if role == "admin":
-            self.cursor.execute(
-                "SELECT id FROM admin WHERE username = ? AND password = ?",
-                (username, hashed_password)
-            )
-            admin = self.cursor.fetchone()
-            if admin:
+            admin_id = self.db.admins.authenticate(username, secret)
+            if admin_id:
                 self.current_user = username
                 self.current_role = "admin"
-                self.current_user_id = admin[0]
+                self.current_user_id = admin_id
                 self.show_admin_dashboard()
             else:
                 messagebox.showerror("Error", "Invalid admin credentials")
         
         elif role == "student":
-            self.cursor.execute(
-                "SELECT id, name FROM students WHERE student_id = ? AND password = ?",
-                (username, hashed_password)
-            )
-            student = self.cursor.fetchone()
+            student = self.db.students.authenticate(username, secret)
             if student:
                 self.current_user = student[1]
                 self.current_role = "student"
@@ -239,11 +247,7 @@ class StudentManagementSystem:
                 messagebox.showerror("Error", "Invalid student credentials")
         
         elif role == "teacher":
-            self.cursor.execute(
-                "SELECT id, name FROM teachers WHERE teacher_id = ? AND password = ?",
-                (username, hashed_password)
-            )
-            teacher = self.cursor.fetchone()
+            teacher = self.db.teachers.authenticate(username, secret)
             if teacher:
                 self.current_user = teacher[1]
                 self.current_role = "teacher"
@@ -252,49 +256,91 @@ class StudentManagementSystem:
             else:
                 messagebox.showerror("Error", "Invalid teacher credentials")
     
+    def report_first_paint(self, dashboard):
+        """Log how long after the login click the dashboard's first tab was drawn"""
+        started = getattr(self, 'login_started', None)
+        if started is None:
+            return
+        self.login_started = None
+        
+        def painted():
+            # Idle callbacks run in order, so Tk has drawn the new widgets by now
+            self.first_paint_ms = (time.perf_counter() - started) * 1000
+            log.info("%s dashboard first paint: %.0f ms after login", dashboard, self.first_paint_ms)
+        self.root.after_idle(painted)
+    
+    def report_startup(self):
+        """Log import, database and first frame times once the login screen is drawn"""
+        def painted():
+            # Counted from the start of main's imports, like IMPORT_MS
+            first_frame_ms = (time.perf_counter() - _started) * 1000
+            log.info("Startup: imports %.0f ms, database init %.0f ms, first frame %.0f ms",
+                     IMPORT_MS, self.db_init_ms, first_frame_ms)
+        self.root.after_idle(painted)
+    
     def logout(self):
         """Logout current user"""
+        if self.server is not None:
+            self.server.logout()
         self.current_user = None
         self.current_role = None
         self.current_user_id = None
         self.show_login()
     
+    def welcome_text(self):
+        """Return the dashboard header greeting for the logged-in user"""
+        if self.current_role == "student":
+            student_info = self.db.students.header(self.current_user_id)
+            return f"🎓 Welcome, {student_info[0]} | ID: {student_info[1]} | Class: {student_info[2]}"
+        if self.current_role == "teacher":
+            teacher_info = self.db.teachers.header(self.current_user_id)
+            return f"👨‍🏫 Welcome, Prof. {teacher_info[0]} | ID: {teacher_info[1]} | Subject: {teacher_info[2]}"
+        return f"👑 Admin Dashboard | Welcome, {self.current_user}"
+    
+    def refresh_dashboard(self, screen):
+        """Reuse a kept dashboard for the user now logged in
+        
+        Tabs are marked stale instead of rebuilt: the first tab is refreshed
+        now, the others when they are next opened.
+        """
+        self.dashboard_tabs, self.busy_indicator, welcome_label = self.screen_state[self.current_role]
+        welcome_label.config(text=self.welcome_text())
+        self.set_busy(self.executor.busy())
+        if self.current_role == "admin":
+            self.admin_counts = self.db.stats.counts()
+            self.show_admin_stats(self.admin_counts)
+        self.dashboard_tabs.select(0)
+        self.dashboard_tabs.invalidate()
+    
     def show_student_dashboard(self):
         """Show student dashboard"""
-        self.clear_window()
-        
+        self.show_screen("student", self.build_student_dashboard, self.refresh_dashboard)
+        self.report_first_paint("Student")
+    
+    def build_student_dashboard(self, screen):
+        """Create the student dashboard widgets"""
         # Header
-        header = ttk.Frame(self.root, bootstyle="primary")
+        header = ttk.Frame(screen, bootstyle="primary")
         header.pack(fill=X, padx=10, pady=10)
         
-        # Get student info
-        self.cursor.execute(
-            "SELECT name, student_id, class FROM students WHERE id = ?",
-            (self.current_user_id,)
-        )
-        student_info = self.cursor.fetchone()
-        
         # Welcome message
-        welcome_text = f"🎓 Welcome, {student_info[0]} | ID: {student_info[1]} | Class: {student_info[2]}"
-        ttk.Label(header, text=welcome_text, 
-                 font=("Helvetica", 14, "bold"), bootstyle="inverse-primary").pack(side=LEFT, padx=10)
+        welcome_label = ttk.Label(header, text=self.welcome_text(), 
+                                 font=("Helvetica", 14, "bold"), bootstyle="inverse-primary")
+        welcome_label.pack(side=LEFT, padx=10)
         
         ttk.Button(header, text="🚪 Logout", command=self.logout, 
                   bootstyle="danger-outline").pack(side=RIGHT, padx=5)
         
-        # Main content with Notebook
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill=BOTH, expand=True, padx=10, pady=10)
-        
-        # Results Tab
-        results_tab = ttk.Frame(notebook)
-        notebook.add(results_tab, text="📊 My Results")
-        self.create_student_results_tab(results_tab)
-        
-        # Profile Tab
-        profile_tab = ttk.Frame(notebook)
-        notebook.add(profile_tab, text="👤 My Profile")
-        self.create_student_profile_tab(profile_tab)
+        # Main content with Notebook; each tab is built when first opened
+        self.dashboard_tabs = LazyNotebook(screen)
+        self.dashboard_tabs.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        self.dashboard_tabs.add_tab("results", "📊 My Results", self.create_student_results_tab,
+                                    lambda tab: self.load_student_results())
+        self.dashboard_tabs.add_tab("attendance", "📅 My Attendance", self.create_student_attendance_tab,
+                                    self.refresh_student_attendance_tab)
+        self.dashboard_tabs.add_tab("profile", "👤 My Profile", self.create_student_profile_tab)
+        self.dashboard_tabs.show()
+        self.screen_state["student"] = (self.dashboard_tabs, None, welcome_label)
     
     def create_student_results_tab(self, parent):
         """Create student results tab"""
@@ -349,12 +395,7 @@ class StudentManagementSystem:
             self.results_tree.delete(item)
         
         # Calculate statistics
-        self.cursor.execute('''
-            SELECT COUNT(*), AVG(grade), MIN(grade), MAX(grade)
-            FROM results
-            WHERE student_id = ?
-        ''', (self.current_user_id,))
-        stats = self.cursor.fetchone()
+        stats = self.db.results.student_stats(self.current_user_id)
         
         # Update stats labels
         self.total_exams_label.config(text=f"📈 Total Exams: {stats[0] or 0}")
@@ -364,23 +405,7 @@ class StudentManagementSystem:
             self.average_label.config(text="⭐ Average: N/A")
         
         # Load results
-        self.cursor.execute('''
-            SELECT 
-                sub.subject_name, 
-                r.grade, 
-                r.exam_type, 
-                r.semester, 
-                r.academic_year, 
-                r.date,
-                t.name
-            FROM results r
-            LEFT JOIN subjects sub ON r.subject_id = sub.id
-            LEFT JOIN teachers t ON r.teacher_id = t.id
-            WHERE r.student_id = ?
-            ORDER BY r.date DESC
-        ''', (self.current_user_id,))
-        
-        results = self.cursor.fetchall()
+        results = self.db.results.for_student(self.current_user_id)
         
         if not results:
             # Insert a placeholder if no results
@@ -389,19 +414,7 @@ class StudentManagementSystem:
         
         for result in results:
             # Color code based on grade
-            tags = ()
-            grade = result[1] if result[1] is not None else 0
-            if grade >= 16:
-                tags = ('excellent',)
-            elif grade >= 14:
-                tags = ('very_good',)
-            elif grade >= 12:
-                tags = ('good',)
-            elif grade >= 10:
-                tags = ('pass',)
-            else:
-                tags = ('fail',)
-            
+            tags = self.grade_tags(result[1])
             self.results_tree.insert("", END, values=result, tags=tags)
         
         # Configure tag colors
@@ -411,14 +424,23 @@ class StudentManagementSystem:
         self.results_tree.tag_configure('pass', background='#f8d7da')
         self.results_tree.tag_configure('fail', background='#f5c6cb')
     
+    def grade_tags(self, grade):
+        """Return the row tag coloring a grade"""
+        grade = grade if grade is not None else 0
+        if grade >= 16:
+            return ('excellent',)
+        elif grade >= 14:
+            return ('very_good',)
+        elif grade >= 12:
+            return ('good',)
+        elif grade >= 10:
+            return ('pass',)
+        return ('fail',)
+    
     def create_student_profile_tab(self, parent):
         """Create student profile tab"""
         # Get student details
-        self.cursor.execute(
-            "SELECT * FROM students WHERE id = ?", (self.current_user_id,)
-        )
-        student = self.cursor.fetchone()
-        columns = [description[0] for description in self.cursor.description]
+        student = self.db.students.get(self.current_user_id)
         
         # Profile frame
         profile_frame = ttk.Labelframe(parent, text="Personal Information", padding=20)
@@ -430,14 +452,14 @@ class StudentManagementSystem:
         
         # Create labels for each field
         fields = [
-            ("Student ID", student[columns.index('student_id')]),
-            ("CNE", student[columns.index('cne')] or "N/A"),
-            ("Full Name", student[columns.index('name')]),
-            ("Email", student[columns.index('email')] or "N/A"),
-            ("Class", student[columns.index('class')] or "N/A"),
-            ("Birth Date", student[columns.index('birth_date')] or "N/A"),
-            ("Phone", student[columns.index('phone')] or "N/A"),
-            ("Registration Date", student[columns.index('created_at')])
+            ("Student ID", student['student_id']),
+            ("CNE", student['cne'] or "N/A"),
+            ("Full Name", student['name']),
+            ("Email", student['email'] or "N/A"),
+            ("Class", student['class'] or "N/A"),
+            ("Birth Date", student['birth_date'] or "N/A"),
+            ("Phone", student['phone'] or "N/A"),
+            ("Registration Date", student['created_at'])
         ]
         
         for i, (label, value) in enumerate(fields):
@@ -453,38 +475,24 @@ class StudentManagementSystem:
         stats_frame = ttk.Frame(parent)
         stats_frame.pack(fill=X, padx=10, pady=10)
         
-        # Calculate attendance statistics
-        self.cursor.execute('''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END) as present,
-                SUM(CASE WHEN status = 'Absent' THEN 1 ELSE 0 END) as absent,
-                SUM(CASE WHEN status = 'Late' THEN 1 ELSE 0 END) as late
-            FROM attendance 
-            WHERE student_id = ?
-        ''', (self.current_user_id,))
-        
-        stats = self.cursor.fetchone()
-        total = stats[0] or 0
-        present = stats[1] or 0
-        absent = stats[2] or 0
-        late = stats[3] or 0
-        
-        if total > 0:
-            attendance_rate = (present / total) * 100
-        else:
-            attendance_rate = 0
-        
-        ttk.Label(stats_frame, text=f"✅ Present: {present}", 
-                 bootstyle="success").pack(side=LEFT, padx=20)
-        ttk.Label(stats_frame, text=f"❌ Absent: {absent}", 
-                 bootstyle="danger").pack(side=LEFT, padx=20)
-        ttk.Label(stats_frame, text=f"⏰ Late: {late}", 
-                 bootstyle="warning").pack(side=LEFT, padx=20)
-        ttk.Label(stats_frame, text=f"📊 Attendance Rate: {attendance_rate:.1f}%", 
-                 bootstyle="info").pack(side=LEFT, padx=20)
-        
-        # Attendance table
+        # Term selection; totals and weeks come from the attendance rollups
+        ttk.Label(stats_frame, text="Term:").pack(side=LEFT, padx=5)
+        self.attendance_term_combo = ttk.Combobox(stats_frame, width=22, state="readonly")
+        self.attendance_term_combo['values'] = ["All Terms"] + self.db.attendance.terms(self.current_user_id)
+        self.attendance_term_combo.set("All Terms")
+        self.attendance_term_combo.pack(side=LEFT, padx=5)
+        self.attendance_term_combo.bind('<<ComboboxSelected>>', self.load_student_attendance)
+        
+        self.attendance_present_label = ttk.Label(stats_frame, bootstyle="success")
+        self.attendance_present_label.pack(side=LEFT, padx=20)
+        self.attendance_absent_label = ttk.Label(stats_frame, bootstyle="danger")
+        self.attendance_absent_label.pack(side=LEFT, padx=20)
+        self.attendance_late_label = ttk.Label(stats_frame, bootstyle="warning")
+        self.attendance_late_label.pack(side=LEFT, padx=20)
+        self.attendance_rate_label = ttk.Label(stats_frame, bootstyle="info")
+        self.attendance_rate_label.pack(side=LEFT, padx=20)
+        
+        # Weekly summary table
         table_frame = ttk.Frame(parent)
         table_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
         
@@ -494,11 +502,32 @@ class StudentManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame)
         scrollbar.pack(side=RIGHT, fill=Y)
         
+        columns = ("Week", "Subject", "Present", "Absent", "Late", "Rate")
+        self.attendance_weeks_tree = ttk.Treeview(tree_frame, columns=columns,
+                                                 show="headings", yscrollcommand=scrollbar.set,
+                                                 height=8)
+        scrollbar.config(command=self.attendance_weeks_tree.yview)
+        
+        for col in columns:
+            self.attendance_weeks_tree.heading(col, text=col)
+            self.attendance_weeks_tree.column(col, width=150, anchor=CENTER)
+        
+        self.attendance_weeks_tree.pack(fill=BOTH, expand=True)
+        self.attendance_weeks_tree.bind('<<TreeviewSelect>>', self.on_attendance_week_select)
+        self.attendance_weeks_rows = TreeRows(
+            self.attendance_weeks_tree,
+            key=lambda week: f"{week[0]}:{week[1]}",
+            values=lambda week: (self.iso_week_label(week[0]), week[2], week[3], week[4], week[5],
+                                 f"{week[3] / week[6] * 100:.0f}%")
+        )
+        
+        # Records of the selected week, fetched only when a week is selected
+        detail_frame = ttk.Labelframe(parent, text="Records for the selected week", padding=10)
+        detail_frame.pack(fill=BOTH, expand=True, padx=10, pady=(0, 10))
+        
         columns = ("Date", "Subject", "Status", "Remarks")
-        self.attendance_tree = ttk.Treeview(tree_frame, columns=columns, 
-                                           show="headings", yscrollcommand=scrollbar.set,
-                                           height=15)
-        scrollbar.config(command=self.attendance_tree.yview)
+        self.attendance_tree = ttk.Treeview(detail_frame, columns=columns,
+                                           show="headings", height=6)
         
         for col in columns:
             self.attendance_tree.heading(col, text=col)
@@ -506,24 +535,61 @@ class StudentManagementSystem:
         
         self.attendance_tree.pack(fill=BOTH, expand=True)
         
+        # Configure tag colors
+        self.attendance_tree.tag_configure('present', background='#d4edda')
+        self.attendance_tree.tag_configure('absent', background='#f8d7da')
+        self.attendance_tree.tag_configure('late', background='#fff3cd')
+        
         # Load attendance
         self.load_student_attendance()
     
-    def load_student_attendance(self):
-        """Load student attendance"""
+    def refresh_student_attendance_tab(self, tab):
+        """Reload the term choices and attendance of the logged-in student"""
+        self.attendance_term_combo['values'] = ["All Terms"] + self.db.attendance.terms(self.current_user_id)
+        self.attendance_term_combo.set("All Terms")
+        self.load_student_attendance()
+    
+    def iso_week_label(self, week_start):
+        """Return e.g. '2024-W05 (from 2024-01-29)' for the Monday starting a week"""
+        try:
+            year, week, _ = datetime.strptime(week_start, "%Y-%m-%d").isocalendar()
+        except ValueError:
+            return week_start
+        return f"{year}-W{week:02d} (from {week_start})"
+    
+    def load_student_attendance(self, event=None):
+        """Show attendance totals and weekly rollups for the selected term"""
+        term = self.attendance_term_combo.get()
+        term = None if term == "All Terms" else term
+        
+        total, present, absent, late = self.db.attendance.student_stats(self.current_user_id, term)
+        attendance_rate = (present / total) * 100 if total > 0 else 0
+        self.attendance_present_label.config(text=f"✅ Present: {present}")
+        self.attendance_absent_label.config(text=f"❌ Absent: {absent}")
+        self.attendance_late_label.config(text=f"⏰ Late: {late}")
+        self.attendance_rate_label.config(text=f"📊 Attendance Rate: {attendance_rate:.1f}%")
+        
+        first, last = term_range(term) if term else (None, None)
+        self.attendance_weeks_rows.sync(self.db.attendance.weekly(self.current_user_id, first, last))
         for item in self.attendance_tree.get_children():
             self.attendance_tree.delete(item)
+    
+    def on_attendance_week_select(self, event):
+        """Show the raw attendance records behind the selected week"""
+        selected = self.attendance_weeks_tree.selection()
+        if not selected:
+            return
+        week = self.attendance_weeks_rows[selected[0]]
+        week_start, subject_db_id = week[0], week[1]
+        try:
+            last = (datetime.strptime(week_start, "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
+        except ValueError:
+            last = week_start
         
-        self.cursor.execute('''
-            SELECT a.date, s.subject_name, a.status, a.remarks
-            FROM attendance a
-            LEFT JOIN subjects s ON a.subject_id = s.id
-            WHERE a.student_id = ?
-            ORDER BY a.date DESC
-        ''', (self.current_user_id,))
-        
-        records = self.cursor.fetchall()
+        for item in self.attendance_tree.get_children():
+            self.attendance_tree.delete(item)
         
+        records = self.db.attendance.for_student(self.current_user_id, week_start, last, subject_db_id)
         for record in records:
             tags = ()
             if record[2] == 'Present':
@@ -534,57 +600,40 @@ class StudentManagementSystem:
                 tags = ('late',)
             
             self.attendance_tree.insert("", END, values=record, tags=tags)
-        
-        # Configure tag colors
-        self.attendance_tree.tag_configure('present', background='#d4edda')
-        self.attendance_tree.tag_configure('absent', background='#f8d7da')
-        self.attendance_tree.tag_configure('late', background='#fff3cd')
     
     def show_teacher_dashboard(self):
         """Show teacher dashboard"""
-        self.clear_window()
-        
+        self.show_screen("teacher", self.build_teacher_dashboard, self.refresh_dashboard)
+        self.report_first_paint("Teacher")
+    
+    def build_teacher_dashboard(self, screen):
+        """Create the teacher dashboard widgets"""
         # Header
-        header = ttk.Frame(self.root, bootstyle="success")
+        header = ttk.Frame(screen, bootstyle="success")
         header.pack(fill=X, padx=10, pady=10)
         
-        # Get teacher info
-        self.cursor.execute(
-            "SELECT name, teacher_id, subject FROM teachers WHERE id = ?",
-            (self.current_user_id,)
-        )
-        teacher_info = self.cursor.fetchone()
-        
-        welcome_text = f"👨‍🏫 Welcome, Prof. {teacher_info[0]} | ID: {teacher_info[1]} | Subject: {teacher_info[2]}"
-        ttk.Label(header, text=welcome_text, 
-                 font=("Helvetica", 14, "bold"), bootstyle="inverse-success").pack(side=LEFT, padx=10)
+        welcome_label = ttk.Label(header, text=self.welcome_text(), 
+                                 font=("Helvetica", 14, "bold"), bootstyle="inverse-success")
+        welcome_label.pack(side=LEFT, padx=10)
         
         ttk.Button(header, text="🚪 Logout", command=self.logout, 
                   bootstyle="danger-outline").pack(side=RIGHT, padx=5)
-        
-        # Main content with Notebook
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill=BOTH, expand=True, padx=10, pady=10)
-        
-        # Add Results Tab
-        add_results_tab = ttk.Frame(notebook)
-        notebook.add(add_results_tab, text="➕ Add Results")
-        self.create_add_results_tab(add_results_tab)
-        
-        # View Results Tab
-        view_results_tab = ttk.Frame(notebook)
-        notebook.add(view_results_tab, text="📋 View Results")
-        self.create_view_results_tab(view_results_tab)
-        
-        # Students Tab
-        students_tab = ttk.Frame(notebook)
-        notebook.add(students_tab, text="🎓 My Students")
-        self.create_teacher_students_tab(students_tab)
-        
-        # Attendance Tab
-        attendance_tab = ttk.Frame(notebook)
-        notebook.add(attendance_tab, text="📅 Mark Attendance")
-        self.create_teacher_attendance_tab(attendance_tab)
+        self.create_busy_indicator(header)
+        
+        # Main content with Notebook; each tab is built when first opened.
+        # The gradebook and My Students are rebuilt for a new login instead
+        self.dashboard_tabs = LazyNotebook(screen)
+        self.dashboard_tabs.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        self.dashboard_tabs.add_tab("add_results", "➕ Add Results", self.create_add_results_tab,
+                                    self.refresh_add_results_tab)
+        self.dashboard_tabs.add_tab("gradebook", "📝 Gradebook", self.create_gradebook_tab)
+        self.dashboard_tabs.add_tab("view_results", "📋 View Results", self.create_view_results_tab,
+                                    self.refresh_view_results_tab)
+        self.dashboard_tabs.add_tab("students", "🎓 My Students", self.create_teacher_students_tab)
+        self.dashboard_tabs.add_tab("attendance", "📅 Mark Attendance", self.create_teacher_attendance_tab,
+                                    self.refresh_teacher_attendance_tab)
+        self.dashboard_tabs.show()
+        self.screen_state["teacher"] = (self.dashboard_tabs, self.busy_indicator, welcome_label)
     
     def create_add_results_tab(self, parent):
         """Create add results tab for teachers"""
@@ -642,34 +691,30 @@ class StudentManagementSystem:
         self.load_students_for_teacher()
         self.load_subjects_for_teacher()
     
+    def refresh_add_results_tab(self, tab):
+        """Reload the student and subject choices and clear the form"""
+        self.student_combo.set("")
+        self.subject_combo.set("")
+        self.load_students_for_teacher()
+        self.load_subjects_for_teacher()
+        self.clear_result_form()
+    
     def load_students_for_teacher(self):
         """Load students for the current teacher's subjects"""
-        self.cursor.execute('''
-            SELECT DISTINCT s.id, s.name, s.student_id
-            FROM students s
-            JOIN results r ON s.id = r.student_id
-            WHERE r.teacher_id = ?
-            UNION
-            SELECT s.id, s.name, s.student_id
-            FROM students s
-            JOIN subjects sub ON s.class = sub.class
-            WHERE sub.teacher_id = ?
-        ''', (self.current_user_id, self.current_user_id))
-        
-        students = self.cursor.fetchall()
-        student_list = [f"{s[2]} - {s[1]}" for s in students]
+        students = self.db.students.for_teacher(self.current_user_id)
+        # Combo text -> database id, so adding a result needs no lookup query
+        self.teacher_student_ids = {f"{s[2]} - {s[1]}": s[0] for s in students}
+        student_list = list(self.teacher_student_ids)
         self.student_combo['values'] = student_list
         if student_list:
             self.student_combo.set(student_list[0])
     
     def load_subjects_for_teacher(self):
         """Load subjects taught by the current teacher"""
-        self.cursor.execute(
-            "SELECT subject_name FROM subjects WHERE teacher_id = ?",
-            (self.current_user_id,)
-        )
-        subjects = self.cursor.fetchall()
-        subject_list = [s[0] for s in subjects]
+        self.teacher_subject_ids = {}
+        for subject_db_id, subject_name, _ in self.db.subjects.for_teacher(self.current_user_id):
+            self.teacher_subject_ids.setdefault(subject_name, subject_db_id)
+        subject_list = list(self.teacher_subject_ids)
         self.subject_combo['values'] = subject_list
         if subject_list:
             self.subject_combo.set(subject_list[0])
@@ -697,26 +742,14 @@ class StudentManagementSystem:
             messagebox.showerror("Error", "Grade must be a number")
             return
         
-        # Extract student ID from combo text
-        student_id = student_text.split(" - ")[0]
-        
-        # Get student ID from database
-        self.cursor.execute(
-            "SELECT id FROM students WHERE student_id = ?",
-            (student_id,)
-        )
-        student_db_id = self.cursor.fetchone()
+        # Resolve database ids from the maps built when the form was loaded
+        student_db_id = self.teacher_student_ids.get(student_text)
         
         if not student_db_id:
             messagebox.showerror("Error", "Student not found")
             return
         
-        # Get subject ID
-        self.cursor.execute(
-            "SELECT id FROM subjects WHERE subject_name = ? AND teacher_id = ?",
-            (subject_name, self.current_user_id)
-        )
-        subject_db_id = self.cursor.fetchone()
+        subject_db_id = self.teacher_subject_ids.get(subject_name)
         
         if not subject_db_id:
             messagebox.showerror("Error", "Subject not found")
@@ -724,18 +757,179 @@ class StudentManagementSystem:
         
         # Insert result
         try:
-            self.cursor.execute('''
-                INSERT INTO results (student_id, subject_id, teacher_id, grade, 
-                                   exam_type, semester, academic_year, remarks)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (student_db_id[0], subject_db_id[0], self.current_user_id, grade_float,
-                 exam_type, semester, academic_year, remarks))
-            self.conn.commit()
+            self.db.results.add(student_db_id, subject_db_id, self.current_user_id, grade_float,
+                              exam_type, semester, academic_year, remarks)
             
             messagebox.showinfo("Success", "Result added successfully!")
             self.clear_result_form()
+            if self.dashboard_tabs.built("view_results"):
+                self.filter_results()
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Database error: {e}")
+    
+    def create_gradebook_tab(self, parent):
+        """Create gradebook grid for entering a whole class's grades at once"""
+        # Exam settings
+        settings_frame = ttk.Labelframe(parent, text="Exam", padding=15)
+        settings_frame.pack(fill=X, padx=10, pady=10)
+        
+        ttk.Label(settings_frame, text="Subject:").grid(row=0, column=0, padx=5, pady=5, sticky=W)
+        self.gradebook_subject_combo = ttk.Combobox(settings_frame, width=25, state="readonly")
+        self.gradebook_subject_combo.grid(row=0, column=1, padx=5, pady=5)
+        self.gradebook_subject_combo.bind('<<ComboboxSelected>>', self.on_gradebook_subject_selected)
+        
+        ttk.Label(settings_frame, text="Class:").grid(row=0, column=2, padx=5, pady=5, sticky=W)
+        self.gradebook_class_combo = ttk.Combobox(settings_frame, width=20, state="readonly")
+        self.gradebook_class_combo.grid(row=0, column=3, padx=5, pady=5)
+        self.gradebook_class_combo.bind('<<ComboboxSelected>>', self.load_gradebook_roster)
+        
+        ttk.Label(settings_frame, text="Exam Type:").grid(row=1, column=0, padx=5, pady=5, sticky=W)
+        self.gradebook_exam_combo = ttk.Combobox(settings_frame, width=25,
+                                                 values=["Normal", "Quiz", "Mid-term", "Final"])
+        self.gradebook_exam_combo.set("Normal")
+        self.gradebook_exam_combo.grid(row=1, column=1, padx=5, pady=5)
+        
+        ttk.Label(settings_frame, text="Semester:").grid(row=1, column=2, padx=5, pady=5, sticky=W)
+        self.gradebook_semester_combo = ttk.Combobox(settings_frame, width=20,
+                                                     values=["Semester 1", "Semester 2"])
+        self.gradebook_semester_combo.set("Semester 1")
+        self.gradebook_semester_combo.grid(row=1, column=3, padx=5, pady=5)
+        
+        ttk.Label(settings_frame, text="Academic Year:").grid(row=1, column=4, padx=5, pady=5, sticky=W)
+        self.gradebook_year_entry = ttk.Entry(settings_frame, width=15)
+        self.gradebook_year_entry.insert(0, "2023-2024")
+        self.gradebook_year_entry.grid(row=1, column=5, padx=5, pady=5)
+        
+        # Buttons
+        button_frame = ttk.Frame(settings_frame)
+        button_frame.grid(row=2, column=0, columnspan=6, pady=10)
+        
+        ttk.Button(button_frame, text="🔄 Load Roster", command=self.load_gradebook_roster,
+                  bootstyle="info").pack(side=LEFT, padx=10)
+        ttk.Button(button_frame, text="💾 Save All Grades", command=self.save_gradebook,
+                  bootstyle="success").pack(side=LEFT, padx=10)
+        
+        # Scrollable roster grid
+        grid_frame = ttk.Frame(parent)
+        grid_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        
+        canvas = tk.Canvas(grid_frame, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(grid_frame, orient=VERTICAL, command=canvas.yview)
+        scrollbar.pack(side=RIGHT, fill=Y)
+        canvas.pack(side=LEFT, fill=BOTH, expand=True)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        
+        self.gradebook_rows_frame = ttk.Frame(canvas)
+        self.gradebook_rows_frame.bind(
+            '<Configure>', lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        )
+        canvas.create_window((0, 0), window=self.gradebook_rows_frame, anchor=NW)
+        
+        self.gradebook_rows = []
+        self.load_gradebook_options()
+    
+    def load_gradebook_options(self):
+        """Load subjects and classes for the gradebook"""
+        # Label -> (subject id, class), resolved once instead of per saved grade
+        self.gradebook_subjects = {}
+        for subject_db_id, subject_name, class_name in self.db.subjects.for_teacher(self.current_user_id):
+            label = f"{subject_name} - {class_name}" if class_name else subject_name
+            self.gradebook_subjects[label] = (subject_db_id, class_name)
+        subjects = list(self.gradebook_subjects)
+        self.gradebook_subject_combo['values'] = subjects
+        
+        self.gradebook_class_combo['values'] = self.db.students.class_names_for_teacher(self.current_user_id)
+        if subjects:
+            self.gradebook_subject_combo.set(subjects[0])
+            self.on_gradebook_subject_selected()
+    
+    def on_gradebook_subject_selected(self, event=None):
+        """Switch to the class the selected subject is taught to"""
+        subject = self.gradebook_subjects.get(self.gradebook_subject_combo.get())
+        if subject and subject[1]:
+            self.gradebook_class_combo.set(subject[1])
+        self.load_gradebook_roster()
+    
+    def load_gradebook_roster(self, event=None):
+        """Load the class roster into the grid, one row per student"""
+        for widget in self.gradebook_rows_frame.winfo_children():
+            widget.destroy()
+        self.gradebook_rows = []
+        
+        class_name = self.gradebook_class_combo.get()
+        if not class_name:
+            return
+        
+        for col, heading in enumerate(("Student ID", "Name", "Grade (0-20)", "Remarks")):
+            ttk.Label(self.gradebook_rows_frame, text=heading,
+                     font=("Helvetica", 10, "bold")).grid(row=0, column=col, padx=5, pady=5, sticky=W)
+        
+        students = self.db.students.in_class(class_name)
+        for i, (student_db_id, name, student_id) in enumerate(students, start=1):
+            ttk.Label(self.gradebook_rows_frame, text=student_id).grid(row=i, column=0, padx=5, pady=2, sticky=W)
+            ttk.Label(self.gradebook_rows_frame, text=name).grid(row=i, column=1, padx=5, pady=2, sticky=W)
+            
+            grade_entry = ttk.Entry(self.gradebook_rows_frame, width=10)
+            grade_entry.grid(row=i, column=2, padx=5, pady=2)
+            remarks_entry = ttk.Entry(self.gradebook_rows_frame, width=30)
+            remarks_entry.grid(row=i, column=3, padx=5, pady=2)
+            
+            # Enter moves down the grade column
+            grade_entry.bind('<Return>', lambda e, row=i: self.focus_gradebook_row(row))
+            self.gradebook_rows.append((student_db_id, student_id, grade_entry, remarks_entry))
+    
+    def focus_gradebook_row(self, row):
+        """Move the cursor to the grade cell of a roster row"""
+        if row < len(self.gradebook_rows):
+            self.gradebook_rows[row][2].focus_set()
+    
+    def save_gradebook(self):
+        """Save every grade typed in the gradebook in one transaction"""
+        subject = self.gradebook_subjects.get(self.gradebook_subject_combo.get())
+        if not subject or not self.gradebook_rows:
+            messagebox.showerror("Error", "Please select a subject and load a class roster")
+            return
+        
+        subject_db_id = subject[0]
+        exam_type = self.gradebook_exam_combo.get()
+        semester = self.gradebook_semester_combo.get()
+        academic_year = self.gradebook_year_entry.get().strip()
+        
+        records = []
+        invalid = []
+        for student_db_id, student_id, grade_entry, remarks_entry in self.gradebook_rows:
+            grade = grade_entry.get().strip()
+            if not grade:
+                continue  # Not graded for this exam
+            try:
+                grade_float = float(grade)
+            except ValueError:
+                grade_float = -1
+            if grade_float < 0 or grade_float > 20:
+                invalid.append(student_id)
+                continue
+            records.append((student_db_id, subject_db_id, self.current_user_id, grade_float,
+                            exam_type, semester, academic_year, remarks_entry.get().strip()))
+        
+        if invalid:
+            messagebox.showerror("Error", "Grades must be numbers between 0 and 20:\n" + ", ".join(invalid))
+            return
+        if not records:
+            messagebox.showerror("Error", "Please enter at least one grade")
+            return
+        
+        try:
+            count = self.db.results.add_many(records)
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
+            return
+        
+        messagebox.showinfo("Success", f"{count} grades saved for {self.gradebook_class_combo.get()}")
+        if self.dashboard_tabs.built("view_results"):
+            self.filter_results()
+        for _, _, grade_entry, remarks_entry in self.gradebook_rows:
+            grade_entry.delete(0, END)
+            remarks_entry.delete(0, END)
     
     def clear_result_form(self):
         """Clear the result form"""
@@ -762,6 +956,12 @@ class StudentManagementSystem:
         self.filter_class_combo.pack(side=LEFT, padx=5)
         self.filter_class_combo.bind('<<ComboboxSelected>>', self.filter_results)
         
+        ttk.Label(filter_frame, text="🔍 Search:").pack(side=LEFT, padx=5)
+        self.results_search_entry = ttk.Entry(filter_frame, width=25)
+        self.results_search_entry.pack(side=LEFT, padx=5)
+        self.results_search_entry.bind('<KeyRelease>',
+                                       Debouncer(self.results_search_entry, self.filter_results))
+        
         ttk.Button(filter_frame, text="🔄 Refresh", command=self.load_teacher_results,
                   bootstyle="info").pack(side=LEFT, padx=10)
         
@@ -787,71 +987,46 @@ class StudentManagementSystem:
         
         self.teacher_results_tree.pack(fill=BOTH, expand=True)
         
+        # Rows lead with the result id, which keys the tree items
+        self.teacher_results_rows = TreeRows(self.teacher_results_tree,
+                                             values=lambda result: result[1:],
+                                             tags=lambda result: self.grade_tags(result[4]))
+        self.teacher_results_tree.tag_configure('excellent', background='#d4edda')
+        self.teacher_results_tree.tag_configure('very_good', background='#fff3cd')
+        self.teacher_results_tree.tag_configure('good', background='#d1ecf1')
+        self.teacher_results_tree.tag_configure('pass', background='#f8d7da')
+        self.teacher_results_tree.tag_configure('fail', background='#f5c6cb')
+        
         # Load initial data
         self.load_teacher_results()
         self.load_filter_options()
     
+    def refresh_view_results_tab(self, tab):
+        """Reset the filters and update the results table in place"""
+        self.results_search_entry.delete(0, END)
+        self.load_filter_options()
+        self.load_teacher_results()
+    
     def load_teacher_results(self):
         """Load teacher's results"""
-        for item in self.teacher_results_tree.get_children():
-            self.teacher_results_tree.delete(item)
-        
-        self.cursor.execute('''
-            SELECT stu.name, stu.student_id, sub.subject_name, r.grade, 
-                   r.exam_type, r.date, r.remarks
-            FROM results r
-            JOIN students stu ON r.student_id = stu.id
-            JOIN subjects sub ON r.subject_id = sub.id
-            WHERE r.teacher_id = ?
-            ORDER BY r.date DESC
-        ''', (self.current_user_id,))
-        
-        results = self.cursor.fetchall()
-        
-        for result in results:
-            # Color code based on grade
-            tags = ()
-            grade = result[3]
-            if grade >= 16:
-                tags = ('excellent',)
-            elif grade >= 14:
-                tags = ('very_good',)
-            elif grade >= 12:
-                tags = ('good',)
-            elif grade >= 10:
-                tags = ('pass',)
-            else:
-                tags = ('fail',)
-            
-            self.teacher_results_tree.insert("", END, values=result, tags=tags)
-        
-        # Configure tag colors
-        self.teacher_results_tree.tag_configure('excellent', background='#d4edda')
-        self.teacher_results_tree.tag_configure('very_good', background='#fff3cd')
-        self.teacher_results_tree.tag_configure('good', background='#d1ecf1')
-        self.teacher_results_tree.tag_configure('pass', background='#f8d7da')
-        self.teacher_results_tree.tag_configure('fail', background='#f5c6cb')
+        teacher_id = self.current_user_id
+        # Shares its key with filter_results: whichever ran last wins
+        self.executor.submit(lambda db: db.results.for_teacher(teacher_id),
+                             self.show_teacher_results, key="teacher_results")
+    
+    def show_teacher_results(self, results):
+        """Update the teacher results table, touching only the rows that changed"""
+        self.teacher_results_rows.sync(results)
     
     def load_filter_options(self):
         """Load filter options for teacher results"""
         # Load subjects
-        self.cursor.execute(
-            "SELECT DISTINCT subject_name FROM subjects WHERE teacher_id = ?",
-            (self.current_user_id,)
-        )
-        subjects = ['All'] + [s[0] for s in self.cursor.fetchall()]
+        subjects = ['All'] + self.db.subjects.names_for_teacher(self.current_user_id)
         self.filter_subject_combo['values'] = subjects
         self.filter_subject_combo.set('All')
         
         # Load classes
-        self.cursor.execute('''
-            SELECT DISTINCT stu.class
-            FROM results r
-            JOIN students stu ON r.student_id = stu.id
-            WHERE r.teacher_id = ?
-            ORDER BY stu.class
-        ''', (self.current_user_id,))
-        classes = ['All'] + [c[0] for c in self.cursor.fetchall() if c[0]]
+        classes = ['All'] + self.db.results.classes_for_teacher(self.current_user_id)
         self.filter_class_combo['values'] = classes
         self.filter_class_combo.set('All')
     
@@ -859,50 +1034,20 @@ class StudentManagementSystem:
         """Filter results based on selected options"""
         subject = self.filter_subject_combo.get()
         class_filter = self.filter_class_combo.get()
-        
-        query = '''
-            SELECT stu.name, stu.student_id, sub.subject_name, r.grade, 
-                   r.exam_type, r.date, r.remarks
-            FROM results r
-            JOIN students stu ON r.student_id = stu.id
-            JOIN subjects sub ON r.subject_id = sub.id
-            WHERE r.teacher_id = ?
-        '''
-        params = [self.current_user_id]
-        
-        if subject != 'All':
-            query += " AND sub.subject_name = ?"
-            params.append(subject)
-        
-        if class_filter != 'All':
-            query += " AND stu.class = ?"
-            params.append(class_filter)
-        
-        query += " ORDER BY r.date DESC"
-        
-        # Clear tree
-        for item in self.teacher_results_tree.get_children():
-            self.teacher_results_tree.delete(item)
-        
-        # Execute filtered query
-        self.cursor.execute(query, params)
-        results = self.cursor.fetchall()
-        
-        for result in results:
-            tags = ()
-            grade = result[3]
-            if grade >= 16:
-                tags = ('excellent',)
-            elif grade >= 14:
-                tags = ('very_good',)
-            elif grade >= 12:
-                tags = ('good',)
-            elif grade >= 10:
-                tags = ('pass',)
-            else:
-                tags = ('fail',)
-            
-            self.teacher_results_tree.insert("", END, values=result, tags=tags)
+        search = self.results_search_entry.get().strip()
+        
+        teacher_id = self.current_user_id
+        
+        # Execute filtered query; a newer filter supersedes one still running
+        self.executor.submit(
+            lambda db: db.results.for_teacher(
+                teacher_id,
+                subject_name=subject if subject != 'All' else None,
+                class_name=class_filter if class_filter != 'All' else None,
+                search=search or None
+            ),
+            self.show_teacher_results, key="teacher_results"
+        )
     
     def create_teacher_students_tab(self, parent):
         """Create teacher's students tab"""
@@ -911,19 +1056,11 @@ class StudentManagementSystem:
         stats_frame.pack(fill=X, padx=10, pady=10)
         
         # Calculate statistics
-        self.cursor.execute('''
-            SELECT COUNT(DISTINCT r.student_id), 
-                   AVG(r.grade),
-                   COUNT(*)
-            FROM results r
-            WHERE r.teacher_id = ?
-        ''', (self.current_user_id,))
-        
-        stats = self.cursor.fetchone()
+        stats = self.db.results.teacher_stats(self.current_user_id)
         
         ttk.Label(stats_frame, text=f"👥 Total Students: {stats[0] or 0}", 
                  bootstyle="info").pack(side=LEFT, padx=20)
-        ttk.Label(stats_frame, text=f"⭐ Average Grade: {stats[1]:.2f if stats[1] else 'N/A'}", 
+        ttk.Label(stats_frame, text=f"⭐ Average Grade: {f'{stats[1]:.2f}' if stats[1] else 'N/A'}", 
                  bootstyle="success").pack(side=LEFT, padx=20)
         ttk.Label(stats_frame, text=f"📊 Total Results: {stats[2] or 0}", 
                  bootstyle="warning").pack(side=LEFT, padx=20)
@@ -958,19 +1095,7 @@ class StudentManagementSystem:
         for item in self.teacher_students_tree.get_children():
             self.teacher_students_tree.delete(item)
         
-        self.cursor.execute('''
-            SELECT DISTINCT 
-                stu.student_id, stu.name, stu.class, stu.email, stu.phone,
-                MAX(r.date) as last_date,
-                AVG(r.grade) as avg_grade
-            FROM students stu
-            JOIN results r ON stu.id = r.student_id
-            WHERE r.teacher_id = ?
-            GROUP BY stu.id
-            ORDER BY stu.name
-        ''', (self.current_user_id,))
-        
-        students = self.cursor.fetchall()
+        students = self.db.results.student_averages(self.current_user_id)
         
         for student in students:
             self.teacher_students_tree.insert("", END, values=student)
@@ -986,6 +1111,11 @@ class StudentManagementSystem:
         self.attendance_date.insert(0, datetime.now().strftime("%Y-%m-%d"))
         self.attendance_date.grid(row=0, column=1, padx=5, pady=5)
         
+        # Optional end date to mark a whole range (e.g. an exam week) at once
+        ttk.Label(form_frame, text="To (optional):").grid(row=0, column=2, padx=5, pady=5, sticky=W)
+        self.attendance_end_date = ttk.Entry(form_frame, width=15)
+        self.attendance_end_date.grid(row=0, column=3, padx=5, pady=5)
+        
         # Subject selection
         ttk.Label(form_frame, text="Subject:").grid(row=1, column=0, padx=5, pady=5, sticky=W)
         self.attendance_subject_combo = ttk.Combobox(form_frame, width=30, state="readonly")
@@ -997,6 +1127,12 @@ class StudentManagementSystem:
         self.attendance_class_combo.grid(row=2, column=1, padx=5, pady=5)
         self.attendance_class_combo.bind('<<ComboboxSelected>>', self.load_class_students_attendance)
         
+        # Exam days: every student of every class listed, ignoring the selection below
+        self.attendance_all_classes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(form_frame, text="All my classes",
+                       variable=self.attendance_all_classes_var).grid(row=2, column=2, columnspan=2,
+                                                                      padx=5, pady=5, sticky=W)
+        
         # Student list with checkboxes
         ttk.Label(form_frame, text="Select Students:").grid(row=3, column=0, padx=5, pady=5, sticky=NW)
         
@@ -1031,33 +1167,64 @@ class StudentManagementSystem:
                   command=lambda: self.load_class_students_attendance(),
                   bootstyle="info").pack(side=LEFT, padx=10)
         
+        # Week summary for the class, read from the weekly attendance rollup
+        week_frame = ttk.Labelframe(parent, text="This Week", padding=10)
+        week_frame.pack(fill=BOTH, expand=True, padx=20, pady=(0, 20))
+        
+        columns = ("Student ID", "Name", "Present", "Absent", "Late", "Marked")
+        self.attendance_week_tree = ttk.Treeview(week_frame, columns=columns,
+                                                show="headings", height=6)
+        
+        for col in columns:
+            self.attendance_week_tree.heading(col, text=col)
+            self.attendance_week_tree.column(col, width=120, anchor=CENTER)
+        
+        self.attendance_week_tree.pack(fill=BOTH, expand=True)
+        self.attendance_week_tree.tag_configure('absent', background='#f8d7da')
+        self.attendance_week_rows = TreeRows(
+            self.attendance_week_tree,
+            values=lambda row: row[1:],
+            tags=lambda row: ('absent',) if row[4] else ()
+        )
+        self.attendance_subject_combo.bind('<<ComboboxSelected>>', self.load_attendance_week)
+        self.attendance_date.bind('<FocusOut>', self.load_attendance_week)
+        
         # Load initial data
         self.load_attendance_options()
     
+    def refresh_teacher_attendance_tab(self, tab):
+        """Reload the subject and class choices of the logged-in teacher"""
+        self.attendance_subject_combo.set("")
+        self.attendance_all_classes_var.set(False)
+        self.clear_attendance_students()
+        self.load_attendance_options()
+    
+    def clear_attendance_students(self):
+        """Empty the class choice, its student checkboxes and the week summary"""
+        self.attendance_class_combo.set("")
+        for widget in self.attendance_students_frame.winfo_children():
+            widget.destroy()
+        self.attendance_checkboxes = {}
+        self.attendance_student_ids = {}
+        self.attendance_week_rows.clear()
+    
     def load_attendance_options(self):
         """Load options for attendance form"""
         # Load subjects
-        self.cursor.execute(
-            "SELECT DISTINCT subject_name FROM subjects WHERE teacher_id = ?",
-            (self.current_user_id,)
-        )
-        subjects = [s[0] for s in self.cursor.fetchall()]
+        subjects = self.db.subjects.names_for_teacher(self.current_user_id)
         self.attendance_subject_combo['values'] = subjects
         if subjects:
             self.attendance_subject_combo.set(subjects[0])
         
         # Load classes
-        self.cursor.execute('''
-            SELECT DISTINCT class 
-            FROM students 
-            WHERE class IS NOT NULL AND class != ''
-            ORDER BY class
-        ''')
-        classes = [c[0] for c in self.cursor.fetchall()]
+        classes = self.db.students.class_names_for_teacher(self.current_user_id)
         self.attendance_class_combo['values'] = classes
         if classes:
             self.attendance_class_combo.set(classes[0])
             self.load_class_students_attendance()
+        else:
+            # Nothing of another teacher's (or an edited class's) may stay markable
+            self.clear_attendance_students()
     
     def load_class_students_attendance(self, event=None):
         """Load students for selected class"""
@@ -1068,11 +1235,7 @@ class StudentManagementSystem:
             widget.destroy()
         
         # Get students from selected class
-        self.cursor.execute(
-            "SELECT id, name, student_id FROM students WHERE class = ? ORDER BY name",
-            (selected_class,)
-        )
-        students = self.cursor.fetchall()
+        students = self.db.students.in_class(selected_class)
         
         self.attendance_checkboxes = {}
         self.attendance_student_ids = {}
@@ -1084,10 +1247,25 @@ class StudentManagementSystem:
             cb.grid(row=i, column=0, sticky=W, pady=2)
             self.attendance_checkboxes[stu_id] = var
             self.attendance_student_ids[stu_id] = student_id
+        
+        self.load_attendance_week()
+    
+    def load_attendance_week(self, event=None):
+        """Show the class's attendance counts for the week of the selected date"""
+        subject_name = self.attendance_subject_combo.get()
+        subject_id = self.db.subjects.id_for(subject_name, self.current_user_id) if subject_name else None
+        day = self.attendance_date.get().strip()
+        try:
+            week = self.db.attendance.class_week(self.attendance_class_combo.get(), subject_id, day)
+        except ValueError:
+            # Not a valid date (yet); keep the last summary
+            return
+        self.attendance_week_rows.sync(week)
     
     def mark_attendance(self):
         """Mark attendance for selected students"""
         date = self.attendance_date.get().strip()
+        end_date = self.attendance_end_date.get().strip()
         subject_name = self.attendance_subject_combo.get()
         status = self.attendance_status_var.get()
         remarks = self.attendance_remarks.get().strip()
@@ -1097,118 +1275,97 @@ class StudentManagementSystem:
             return
         
         # Get subject ID
-        self.cursor.execute(
-            "SELECT id FROM subjects WHERE subject_name = ? AND teacher_id = ?",
-            (subject_name, self.current_user_id)
-        )
-        subject_result = self.cursor.fetchone()
-        subject_id = subject_result[0] if subject_result else None
-        
-        # Mark attendance for each selected student
-        count = 0
-        for stu_id, var in self.attendance_checkboxes.items():
-            if var.get():  # If checkbox is checked
-                student_id = self.attendance_student_ids[stu_id]
-                
-                # Check if attendance already exists for this student, date, and subject
-                self.cursor.execute('''
-                    SELECT id FROM attendance 
-                    WHERE student_id = ? AND date = ? AND subject_id = ?
-                ''', (student_id, date, subject_id))
-                
-                existing = self.cursor.fetchone()
-                
-                if existing:
-                    # Update existing record
-                    self.cursor.execute('''
-                        UPDATE attendance 
-                        SET status = ?, remarks = ?
-                        WHERE id = ?
-                    ''', (status, remarks, existing[0]))
-                else:
-                    # Insert new record
-                    self.cursor.execute('''
-                        INSERT INTO attendance (student_id, date, status, subject_id, remarks)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (student_id, date, status, subject_id, remarks))
-                
-                count += 1
+        subject_id = self.db.subjects.id_for(subject_name, self.current_user_id)
+        if subject_id is None:
+            # Renamed or reassigned since the list was loaded
+            messagebox.showerror("Error", f"Subject {subject_name} is no longer assigned to you")
+            return
         
-        self.conn.commit()
-        messagebox.showinfo("Success", f"Attendance marked for {count} students")
+        # Selected students (checkbox is checked)
+        student_ids = [
+            self.attendance_student_ids[stu_id]
+            for stu_id, var in self.attendance_checkboxes.items()
+            if var.get()
+        ]
+        marked = f"{len(student_ids)} students"
+        
+        # One batched upsert for every selected student (and date)
+        try:
+            if self.attendance_all_classes_var.get():
+                class_names = list(self.attendance_class_combo['values'])
+                if not class_names:
+                    messagebox.showerror("Error", "You have no classes with students")
+                    return
+                inserted, updated = self.db.attendance.mark_classes(
+                    class_names, date_range(date, end_date or date), subject_id, status, remarks)
+                marked = f"every student of {', '.join(class_names)}"
+            elif end_date:
+                inserted, updated = self.db.attendance.mark_range(
+                    student_ids, date, end_date, subject_id, status, remarks)
+            else:
+                inserted, updated = self.db.attendance.upsert_many(
+                    [(student_db_id, date, subject_id, status, remarks) for student_db_id in student_ids])
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid date range (use YYYY-MM-DD): {e}")
+            return
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Database error: {e}")
+            return
+        self.load_attendance_week()
+        messagebox.showinfo("Success", f"Attendance marked for {marked}\n"
+                                       f"{inserted} new, {updated} updated records")
     
     def show_admin_dashboard(self):
         """Show admin dashboard"""
-        self.clear_window()
-        
+        self.show_screen("admin", self.build_admin_dashboard, self.refresh_dashboard)
+        self.report_first_paint("Admin")
+    
+    def build_admin_dashboard(self, screen):
+        """Create the admin dashboard widgets"""
         # Header
-        header = ttk.Frame(self.root, bootstyle="danger")
+        header = ttk.Frame(screen, bootstyle="danger")
         header.pack(fill=X, padx=10, pady=10)
         
-        welcome_text = f"👑 Admin Dashboard | Welcome, {self.current_user}"
-        ttk.Label(header, text=welcome_text, 
-                 font=("Helvetica", 14, "bold"), bootstyle="inverse-danger").pack(side=LEFT, padx=10)
+        welcome_label = ttk.Label(header, text=self.welcome_text(), 
+                                 font=("Helvetica", 14, "bold"), bootstyle="inverse-danger")
+        welcome_label.pack(side=LEFT, padx=10)
         
         ttk.Button(header, text="🚪 Logout", command=self.logout, 
                   bootstyle="light-outline").pack(side=RIGHT, padx=5)
+        self.create_busy_indicator(header)
         
         # Stats frame
-        stats_frame = ttk.Frame(self.root)
+        stats_frame = ttk.Frame(screen)
         stats_frame.pack(fill=X, padx=10, pady=10)
         
-        # Get statistics
-        self.cursor.execute("SELECT COUNT(*) FROM students")
-        student_count = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM teachers")
-        teacher_count = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM results")
-        result_count = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM subjects")
-        subject_count = self.cursor.fetchone()[0]
+        # Get statistics: one read of the trigger-maintained counters, shared
+        # with the settings tab
+        self.admin_counts = self.db.stats.counts()
         
         # Display stats
-        stats = [
-            (f"🎓 Students: {student_count}", "primary"),
-            (f"👨‍🏫 Teachers: {teacher_count}", "success"),
-            (f"📊 Results: {result_count}", "info"),
-            (f"📚 Subjects: {subject_count}", "warning")
-        ]
-        
-        for stat_text, style in stats:
-            ttk.Label(stats_frame, text=stat_text, font=("Helvetica", 12),
-                     bootstyle=style).pack(side=LEFT, padx=20)
-        
-        # Main content with Notebook
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill=BOTH, expand=True, padx=10, pady=10)
-        
-        # Students Management Tab
-        students_tab = ttk.Frame(notebook)
-        notebook.add(students_tab, text="🎓 Manage Students")
-        self.create_admin_students_tab(students_tab)
-        
-        # Teachers Management Tab
-        teachers_tab = ttk.Frame(notebook)
-        notebook.add(teachers_tab, text="👨‍🏫 Manage Teachers")
-        self.create_admin_teachers_tab(teachers_tab)
-        
-        # Subjects Management Tab
-        subjects_tab = ttk.Frame(notebook)
-        notebook.add(subjects_tab, text="📚 Manage Subjects")
-        self.create_admin_subjects_tab(subjects_tab)
-        
-        # Classes Management Tab
-        classes_tab = ttk.Frame(notebook)
-        notebook.add(classes_tab, text="🏫 Manage Classes")
-        self.create_admin_classes_tab(classes_tab)
-        
-        # System Settings Tab
-        settings_tab = ttk.Frame(notebook)
-        notebook.add(settings_tab, text="⚙️ System Settings")
-        self.create_admin_settings_tab(settings_tab)
+        self.admin_stats_labels = {}
+        for table, style in (("students", "primary"), ("teachers", "success"),
+                             ("results", "info"), ("subjects", "warning")):
+            label = ttk.Label(stats_frame, font=("Helvetica", 12), bootstyle=style)
+            label.pack(side=LEFT, padx=20)
+            self.admin_stats_labels[table] = label
+        self.show_admin_stats(self.admin_counts)
+        
+        # Main content with Notebook; each tab is built when first opened
+        self.dashboard_tabs = LazyNotebook(screen)
+        self.dashboard_tabs.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        self.dashboard_tabs.add_tab("students", "🎓 Manage Students", self.create_admin_students_tab,
+                                    self.refresh_admin_students_tab)
+        self.dashboard_tabs.add_tab("teachers", "👨‍🏫 Manage Teachers", self.create_admin_teachers_tab,
+                                    lambda tab: self.admin_teachers_tree.refresh())
+        self.dashboard_tabs.add_tab("subjects", "📚 Manage Subjects", self.create_admin_subjects_tab,
+                                    self.refresh_admin_subjects_tab)
+        self.dashboard_tabs.add_tab("classes", "🏫 Manage Classes", self.create_admin_classes_tab,
+                                    lambda tab: self.admin_load_classes())
+        self.dashboard_tabs.add_tab("settings", "⚙️ System Settings", self.create_admin_settings_tab,
+                                    self.refresh_admin_settings_tab)
+        self.dashboard_tabs.show()
+        self.screen_state["admin"] = (self.dashboard_tabs, self.busy_indicator, welcome_label)
     
     def create_admin_students_tab(self, parent):
         """Create students management tab for admin"""
@@ -1271,11 +1428,22 @@ class StudentManagementSystem:
                   bootstyle="secondary").pack(side=LEFT, padx=5)
         ttk.Button(button_frame, text="📋 View All", command=self.admin_load_students,
                   bootstyle="info").pack(side=LEFT, padx=5)
+        ttk.Button(button_frame, text="📥 Import CSV/Excel", command=self.admin_import_students,
+                  bootstyle="primary").pack(side=LEFT, padx=5)
         
         # Students table
         table_frame = ttk.Frame(parent)
         table_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
         
+        # Search as you type by name, CNE, email, student ID or phone
+        search_frame = ttk.Frame(table_frame)
+        search_frame.pack(fill=X, pady=(0, 5))
+        ttk.Label(search_frame, text="🔍 Search:").pack(side=LEFT, padx=5)
+        self.admin_student_search = ttk.Entry(search_frame, width=40)
+        self.admin_student_search.pack(side=LEFT, padx=5)
+        self.admin_student_search.bind('<KeyRelease>',
+                                       Debouncer(self.admin_student_search, self.admin_search_students))
+        
         tree_frame = ttk.Frame(table_frame)
         tree_frame.pack(fill=BOTH, expand=True)
         
@@ -1283,9 +1451,10 @@ class StudentManagementSystem:
         scrollbar.pack(side=RIGHT, fill=Y)
         
         columns = ("ID", "Student ID", "CNE", "Name", "Email", "Class", "Phone", "Registered")
-        self.admin_students_tree = ttk.Treeview(tree_frame, columns=columns,
-                                               show="headings", yscrollcommand=scrollbar.set,
-                                               height=12)
+        self.admin_students_tree = VirtualTreeview(tree_frame, self.db.students.page,
+                                                   key=lambda row: (row[0],), columns=columns,
+                                                   show="headings", yscrollcommand=scrollbar.set,
+                                                   height=12)
         scrollbar.config(command=self.admin_students_tree.yview)
         
         for col in columns:
@@ -1300,30 +1469,33 @@ class StudentManagementSystem:
         # Load students
         self.admin_load_students()
     
+    def refresh_admin_students_tab(self, tab):
+        """Reload the class choices and update the loaded students in place"""
+        self.load_classes_for_admin()
+        self.admin_students_tree.refresh()
+    
     def load_classes_for_admin(self):
         """Load classes for admin forms"""
-        self.cursor.execute("SELECT class_name FROM classes ORDER BY class_name")
-        classes = [c[0] for c in self.cursor.fetchall()]
+        classes = self.db.classes.names()
         self.admin_student_class['values'] = classes
         if classes:
             self.admin_student_class.set(classes[0])
     
     def admin_load_students(self):
-        """Load all students for admin"""
-        for item in self.admin_students_tree.get_children():
-            self.admin_students_tree.delete(item)
-        
-        self.cursor.execute('''
-            SELECT id, student_id, cne, name, email, class, phone, 
-                   strftime('%Y-%m-%d', created_at)
-            FROM students 
-            ORDER BY created_at DESC
-        ''')
-        
-        students = self.cursor.fetchall()
-        
-        for student in students:
-            self.admin_students_tree.insert("", END, values=student)
+        """Show the first page of students; more are fetched while scrolling"""
+        self.admin_student_search.delete(0, END)
+        self.admin_students_tree.reload()
+    
+    def admin_search_students(self):
+        """Show the students matching the search box, best match first"""
+        text = self.admin_student_search.get().strip()
+        if not text:
+            self.admin_students_tree.reload()
+            return
+        try:
+            self.admin_students_tree.show_matches(lambda: self.db.students.search(text))
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Database error: {e}")
     
     def admin_on_student_select(self, event):
         """Handle student selection in admin tree"""
@@ -1333,33 +1505,29 @@ class StudentManagementSystem:
             values = item['values']
             
             # Get full student details
-            self.cursor.execute(
-                "SELECT * FROM students WHERE id = ?", (values[0],)
-            )
-            student = self.cursor.fetchone()
-            columns = [description[0] for description in self.cursor.description]
+            student = self.db.students.get(values[0])
             
             # Fill form
             self.admin_student_id.delete(0, END)
-            self.admin_student_id.insert(0, student[columns.index('student_id')])
+            self.admin_student_id.insert(0, student['student_id'])
             self.admin_student_cne.delete(0, END)
-            self.admin_student_cne.insert(0, student[columns.index('cne')] or "")
+            self.admin_student_cne.insert(0, student['cne'] or "")
             self.admin_student_name.delete(0, END)
-            self.admin_student_name.insert(0, student[columns.index('name')])
+            self.admin_student_name.insert(0, student['name'])
             self.admin_student_email.delete(0, END)
-            self.admin_student_email.insert(0, student[columns.index('email')] or "")
+            self.admin_student_email.insert(0, student['email'] or "")
             self.admin_student_password.delete(0, END)
             self.admin_student_password.insert(0, "********")  # Placeholder
-            if student[columns.index('class')]:
-                self.admin_student_class.set(student[columns.index('class')])
+            if student['class']:
+                self.admin_student_class.set(student['class'])
             else:
                 self.admin_student_class.set("")
             self.admin_student_birth.delete(0, END)
-            self.admin_student_birth.insert(0, student[columns.index('birth_date')] or "")
+            self.admin_student_birth.insert(0, student['birth_date'] or "")
             self.admin_student_phone.delete(0, END)
-            self.admin_student_phone.insert(0, student[columns.index('phone')] or "")
+            self.admin_student_phone.insert(0, student['phone'] or "")
             self.admin_student_address.delete(0, END)
-            self.admin_student_address.insert(0, student[columns.index('address')] or "")
+            self.admin_student_address.insert(0, student['address'] or "")
     
     def admin_add_student(self):
         """Add new student from admin panel"""
@@ -1386,19 +1554,13 @@ class StudentManagementSystem:
             return
         
         # Check if student ID already exists
-        self.cursor.execute(
-            "SELECT id FROM students WHERE student_id = ?", (student_id,)
-        )
-        if self.cursor.fetchone():
+        if self.db.students.id_by("student_id", student_id):
             messagebox.showerror("Error", "Student ID already exists")
             return
         
         # Check if CNE already exists
         if cne:
-            self.cursor.execute(
-                "SELECT id FROM students WHERE cne = ?", (cne,)
-            )
-            if self.cursor.fetchone():
+            if self.db.students.id_by("cne", cne):
                 messagebox.showerror("Error", "CNE already exists")
                 return
         
@@ -1410,20 +1572,61 @@ class StudentManagementSystem:
         
         # Insert student
         try:
-            self.cursor.execute('''
-                INSERT INTO students (student_id, cne, name, email, password, 
-                                    class, birth_date, phone, address)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (student_id, cne, name, email, hashed_password, class_name, 
-                 birth_date, phone, address))
-            self.conn.commit()
+            self.db.students.add(student_id, cne, name, email, hashed_password, class_name,
+                               birth_date, phone, address)
             
             messagebox.showinfo("Success", "Student added successfully!")
             self.admin_clear_student_form()
-            self.admin_load_students()
+            self.admin_students_tree.refresh()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
+    def admin_import_students(self):
+        """Bulk import students from a CSV or Excel file"""
+        if self.runs_on_server("Import", "import <file>"):
+            return
+        path = filedialog.askopenfilename(
+            title="Import Students",
+            filetypes=[("Student lists", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx")]
+        )
+        if not path:
+            return
+        
+        dry_run = messagebox.askyesnocancel(
+            "Import Students",
+            "Validate the file without importing (dry run)?\n\n"
+            "Yes: check every row and report problems only\n"
+            "No: import the valid rows now"
+        )
+        if dry_run is None:
+            return
+        
+        try:
+            # Hashing stays on the executor thread whatever "workers" says: pool
+            # workers would re-import main.py and tkinter. The pool is for cli import.
+            batch_size, _ = importer.import_settings()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Invalid import settings in {database.CONFIG_PATH}: {e}")
+            return
+        
+        def show_report(report):
+            message = report.summary()
+            if report.errors:
+                # Error report goes next to the imported file
+                errors_file = os.path.splitext(path)[0] + "_errors.csv"
+                report.write_errors(errors_file)
+                message += f"\n\nRejected rows are listed in:\n{errors_file}"
+            messagebox.showinfo("Import Complete" if not dry_run else "Dry Run Complete", message)
+            if report.imported and not dry_run:
+                self.admin_students_tree.refresh()
+        
+        self.executor.submit(
+            lambda db: importer.import_students(db.conn, path, batch_size=batch_size, dry_run=dry_run,
+                                                workers=0),
+            show_report,
+            lambda e: messagebox.showerror("Import Failed", f"Error importing students: {e}")
+        )
+    
     def admin_update_student(self):
         """Update existing student"""
         selected = self.admin_students_tree.selection()
@@ -1451,21 +1654,13 @@ class StudentManagementSystem:
             return
         
         # Check if student ID already exists (excluding current student)
-        self.cursor.execute(
-            "SELECT id FROM students WHERE student_id = ? AND id != ?",
-            (student_id, student_db_id)
-        )
-        if self.cursor.fetchone():
+        if self.db.students.id_by("student_id", student_id, exclude_id=student_db_id):
             messagebox.showerror("Error", "Student ID already exists")
             return
         
         # Check if CNE already exists (excluding current student)
         if cne:
-            self.cursor.execute(
-                "SELECT id FROM students WHERE cne = ? AND id != ?",
-                (cne, student_db_id)
-            )
-            if self.cursor.fetchone():
+            if self.db.students.id_by("cne", cne, exclude_id=student_db_id):
                 messagebox.showerror("Error", "CNE already exists")
                 return
         
@@ -1473,26 +1668,13 @@ class StudentManagementSystem:
         try:
             if password != "********":  # If password changed
                 hashed_password = self.hash_password(password)
-                self.cursor.execute('''
-                    UPDATE students 
-                    SET student_id = ?, cne = ?, name = ?, email = ?, password = ?,
-                        class = ?, birth_date = ?, phone = ?, address = ?
-                    WHERE id = ?
-                ''', (student_id, cne, name, email, hashed_password, class_name,
-                     birth_date, phone, address, student_db_id))
             else:
                 # Keep existing password
-                self.cursor.execute('''
-                    UPDATE students 
-                    SET student_id = ?, cne = ?, name = ?, email = ?,
-                        class = ?, birth_date = ?, phone = ?, address = ?
-                    WHERE id = ?
-                ''', (student_id, cne, name, email, class_name,
-                     birth_date, phone, address, student_db_id))
-            
-            self.conn.commit()
+                hashed_password = None
+            self.db.students.update(student_db_id, student_id, cne, name, email, class_name,
+                                  birth_date, phone, address, hashed_password)
             messagebox.showinfo("Success", "Student updated successfully!")
-            self.admin_load_students()
+            self.admin_students_tree.refresh()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -1510,17 +1692,12 @@ class StudentManagementSystem:
         if messagebox.askyesno("Confirm Delete", 
                               f"Are you sure you want to delete student:\n{student_name}?\n\nThis will also delete all their results and attendance records!"):
             try:
-                # Delete related results first (foreign key constraint)
-                self.cursor.execute("DELETE FROM results WHERE student_id = ?", (student_id,))
-                # Delete related attendance
-                self.cursor.execute("DELETE FROM attendance WHERE student_id = ?", (student_id,))
-                # Delete student
-                self.cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
-                self.conn.commit()
+                # Delete student with related results and attendance
+                self.db.students.delete(student_id)
                 
                 messagebox.showinfo("Success", "Student deleted successfully!")
                 self.admin_clear_student_form()
-                self.admin_load_students()
+                self.admin_students_tree.refresh()
             except sqlite3.Error as e:
                 messagebox.showerror("Error", f"Database error: {e}")
     
@@ -1593,6 +1770,15 @@ class StudentManagementSystem:
         table_frame = ttk.Frame(parent)
         table_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
         
+        # Search as you type by name, teacher ID or email
+        search_frame = ttk.Frame(table_frame)
+        search_frame.pack(fill=X, pady=(0, 5))
+        ttk.Label(search_frame, text="🔍 Search:").pack(side=LEFT, padx=5)
+        self.admin_teacher_search = ttk.Entry(search_frame, width=40)
+        self.admin_teacher_search.pack(side=LEFT, padx=5)
+        self.admin_teacher_search.bind('<KeyRelease>',
+                                       Debouncer(self.admin_teacher_search, self.admin_search_teachers))
+        
         tree_frame = ttk.Frame(table_frame)
         tree_frame.pack(fill=BOTH, expand=True)
         
@@ -1600,9 +1786,10 @@ class StudentManagementSystem:
         scrollbar.pack(side=RIGHT, fill=Y)
         
         columns = ("ID", "Teacher ID", "Name", "Email", "Subject", "Qualification", "Phone", "Registered")
-        self.admin_teachers_tree = ttk.Treeview(tree_frame, columns=columns,
-                                               show="headings", yscrollcommand=scrollbar.set,
-                                               height=12)
+        self.admin_teachers_tree = VirtualTreeview(tree_frame, self.db.teachers.page,
+                                                   key=lambda row: (row[0],), columns=columns,
+                                                   show="headings", yscrollcommand=scrollbar.set,
+                                                   height=12)
         scrollbar.config(command=self.admin_teachers_tree.yview)
         
         for col in columns:
@@ -1616,21 +1803,20 @@ class StudentManagementSystem:
         self.admin_load_teachers()
     
     def admin_load_teachers(self):
-        """Load all teachers for admin"""
-        for item in self.admin_teachers_tree.get_children():
-            self.admin_teachers_tree.delete(item)
-        
-        self.cursor.execute('''
-            SELECT id, teacher_id, name, email, subject, qualification, phone,
-                   strftime('%Y-%m-%d', created_at)
-            FROM teachers 
-            ORDER BY created_at DESC
-        ''')
-        
-        teachers = self.cursor.fetchall()
-        
-        for teacher in teachers:
-            self.admin_teachers_tree.insert("", END, values=teacher)
+        """Show the first page of teachers; more are fetched while scrolling"""
+        self.admin_teacher_search.delete(0, END)
+        self.admin_teachers_tree.reload()
+    
+    def admin_search_teachers(self):
+        """Show the teachers matching the search box, best match first"""
+        text = self.admin_teacher_search.get().strip()
+        if not text:
+            self.admin_teachers_tree.reload()
+            return
+        try:
+            self.admin_teachers_tree.show_matches(lambda: self.db.teachers.search(text))
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Database error: {e}")
     
     def admin_on_teacher_select(self, event):
         """Handle teacher selection in admin tree"""
@@ -1640,27 +1826,23 @@ class StudentManagementSystem:
             values = item['values']
             
             # Get full teacher details
-            self.cursor.execute(
-                "SELECT * FROM teachers WHERE id = ?", (values[0],)
-            )
-            teacher = self.cursor.fetchone()
-            columns = [description[0] for description in self.cursor.description]
+            teacher = self.db.teachers.get(values[0])
             
             # Fill form
             self.admin_teacher_id.delete(0, END)
-            self.admin_teacher_id.insert(0, teacher[columns.index('teacher_id')])
+            self.admin_teacher_id.insert(0, teacher['teacher_id'])
             self.admin_teacher_name.delete(0, END)
-            self.admin_teacher_name.insert(0, teacher[columns.index('name')])
+            self.admin_teacher_name.insert(0, teacher['name'])
             self.admin_teacher_email.delete(0, END)
-            self.admin_teacher_email.insert(0, teacher[columns.index('email')] or "")
+            self.admin_teacher_email.insert(0, teacher['email'] or "")
             self.admin_teacher_password.delete(0, END)
             self.admin_teacher_password.insert(0, "********")  # Placeholder
             self.admin_teacher_subject.delete(0, END)
-            self.admin_teacher_subject.insert(0, teacher[columns.index('subject')] or "")
+            self.admin_teacher_subject.insert(0, teacher['subject'] or "")
             self.admin_teacher_qualification.delete(0, END)
-            self.admin_teacher_qualification.insert(0, teacher[columns.index('qualification')] or "")
+            self.admin_teacher_qualification.insert(0, teacher['qualification'] or "")
             self.admin_teacher_phone.delete(0, END)
-            self.admin_teacher_phone.insert(0, teacher[columns.index('phone')] or "")
+            self.admin_teacher_phone.insert(0, teacher['phone'] or "")
     
     def admin_add_teacher(self):
         """Add new teacher from admin panel"""
@@ -1685,18 +1867,12 @@ class StudentManagementSystem:
             return
         
         # Check if teacher ID already exists
-        self.cursor.execute(
-            "SELECT id FROM teachers WHERE teacher_id = ?", (teacher_id,)
-        )
-        if self.cursor.fetchone():
+        if self.db.teachers.id_by("teacher_id", teacher_id):
             messagebox.showerror("Error", "Teacher ID already exists")
             return
         
         # Check if email already exists
-        self.cursor.execute(
-            "SELECT id FROM teachers WHERE email = ?", (email,)
-        )
-        if self.cursor.fetchone():
+        if self.db.teachers.id_by("email", email):
             messagebox.showerror("Error", "Email already exists")
             return
         
@@ -1708,15 +1884,12 @@ class StudentManagementSystem:
         
         # Insert teacher
         try:
-            self.cursor.execute('''
-                INSERT INTO teachers (teacher_id, name, email, password, subject, qualification, phone)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (teacher_id, name, email, hashed_password, subject, qualification, phone))
-            self.conn.commit()
+            self.db.teachers.add(teacher_id, name, email, hashed_password, subject,
+                               qualification, phone)
             
             messagebox.showinfo("Success", "Teacher added successfully!")
             self.admin_clear_teacher_form()
-            self.admin_load_teachers()
+            self.admin_teachers_tree.refresh()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -1745,20 +1918,12 @@ class StudentManagementSystem:
             return
         
         # Check if teacher ID already exists (excluding current teacher)
-        self.cursor.execute(
-            "SELECT id FROM teachers WHERE teacher_id = ? AND id != ?",
-            (teacher_id, teacher_db_id)
-        )
-        if self.cursor.fetchone():
+        if self.db.teachers.id_by("teacher_id", teacher_id, exclude_id=teacher_db_id):
             messagebox.showerror("Error", "Teacher ID already exists")
             return
         
         # Check if email already exists (excluding current teacher)
-        self.cursor.execute(
-            "SELECT id FROM teachers WHERE email = ? AND id != ?",
-            (email, teacher_db_id)
-        )
-        if self.cursor.fetchone():
+        if self.db.teachers.id_by("email", email, exclude_id=teacher_db_id):
             messagebox.showerror("Error", "Email already exists")
             return
         
@@ -1766,26 +1931,13 @@ class StudentManagementSystem:
         try:
             if password != "********":  # If password changed
                 hashed_password = self.hash_password(password)
-                self.cursor.execute('''
-                    UPDATE teachers 
-                    SET teacher_id = ?, name = ?, email = ?, password = ?,
-                        subject = ?, qualification = ?, phone = ?
-                    WHERE id = ?
-                ''', (teacher_id, name, email, hashed_password, subject,
-                     qualification, phone, teacher_db_id))
             else:
                 # Keep existing password
-                self.cursor.execute('''
-                    UPDATE teachers 
-                    SET teacher_id = ?, name = ?, email = ?,
-                        subject = ?, qualification = ?, phone = ?
-                    WHERE id = ?
-                ''', (teacher_id, name, email, subject,
-                     qualification, phone, teacher_db_id))
-            
-            self.conn.commit()
+                hashed_password = None
+            self.db.teachers.update(teacher_db_id, teacher_id, name, email, subject,
+                                  qualification, phone, hashed_password)
             messagebox.showinfo("Success", "Teacher updated successfully!")
-            self.admin_load_teachers()
+            self.admin_teachers_tree.refresh()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -1803,17 +1955,12 @@ class StudentManagementSystem:
         if messagebox.askyesno("Confirm Delete", 
                               f"Are you sure you want to delete teacher:\n{teacher_name}?\n\nThis will also delete all their results and subjects!"):
             try:
-                # Delete related results first
-                self.cursor.execute("DELETE FROM results WHERE teacher_id = ?", (teacher_id,))
-                # Update subjects to remove teacher reference
-                self.cursor.execute("UPDATE subjects SET teacher_id = NULL WHERE teacher_id = ?", (teacher_id,))
-                # Delete teacher
-                self.cursor.execute("DELETE FROM teachers WHERE id = ?", (teacher_id,))
-                self.conn.commit()
+                # Delete teacher with related results and unassign their subjects
+                self.db.teachers.delete(teacher_id)
                 
                 messagebox.showinfo("Success", "Teacher deleted successfully!")
                 self.admin_clear_teacher_form()
-                self.admin_load_teachers()
+                self.admin_teachers_tree.refresh()
             except sqlite3.Error as e:
                 messagebox.showerror("Error", f"Database error: {e}")
     
@@ -1882,9 +2029,10 @@ class StudentManagementSystem:
         scrollbar.pack(side=RIGHT, fill=Y)
         
         columns = ("ID", "Code", "Name", "Teacher", "Class", "Credits")
-        self.admin_subjects_tree = ttk.Treeview(tree_frame, columns=columns,
-                                               show="headings", yscrollcommand=scrollbar.set,
-                                               height=12)
+        self.admin_subjects_tree = VirtualTreeview(tree_frame, self.db.subjects.page,
+                                                   key=lambda row: (row[2], row[0]), columns=columns,
+                                                   show="headings", yscrollcommand=scrollbar.set,
+                                                   height=12)
         scrollbar.config(command=self.admin_subjects_tree.yview)
         
         for col in columns:
@@ -1899,40 +2047,36 @@ class StudentManagementSystem:
         self.load_classes_for_subjects()
         self.admin_load_subjects()
     
+    def refresh_admin_subjects_tab(self, tab):
+        """Reload the teacher and class choices and update the loaded subjects in place"""
+        self.load_teachers_for_subjects()
+        self.load_classes_for_subjects()
+        self.admin_subjects_tree.refresh()
+    
     def load_teachers_for_subjects(self):
         """Load teachers for subject form"""
-        self.cursor.execute("SELECT id, name FROM teachers ORDER BY name")
-        teachers = self.cursor.fetchall()
+        teachers = self.db.teachers.options()
         teacher_list = ["None"] + [f"{t[0]} - {t[1]}" for t in teachers]
         self.admin_subject_teacher['values'] = teacher_list
         self.admin_subject_teacher.set("None")
     
+    def refresh_class_choices(self):
+        """Reload the class comboboxes of the student and subject forms, where built"""
+        if self.dashboard_tabs.built("students"):
+            self.load_classes_for_admin()
+        if self.dashboard_tabs.built("subjects"):
+            self.load_classes_for_subjects()
+    
     def load_classes_for_subjects(self):
         """Load classes for subject form"""
-        self.cursor.execute("SELECT class_name FROM classes ORDER BY class_name")
-        classes = [c[0] for c in self.cursor.fetchall()]
+        classes = self.db.classes.names()
         self.admin_subject_class['values'] = classes
         if classes:
             self.admin_subject_class.set(classes[0])
     
     def admin_load_subjects(self):
-        """Load all subjects for admin"""
-        for item in self.admin_subjects_tree.get_children():
-            self.admin_subjects_tree.delete(item)
-        
-        self.cursor.execute('''
-            SELECT s.id, s.subject_code, s.subject_name, 
-                   COALESCE(t.name, 'Not Assigned'), 
-                   COALESCE(s.class, 'All Classes'), s.credits
-            FROM subjects s
-            LEFT JOIN teachers t ON s.teacher_id = t.id
-            ORDER BY s.subject_name
-        ''')
-        
-        subjects = self.cursor.fetchall()
-        
-        for subject in subjects:
-            self.admin_subjects_tree.insert("", END, values=subject)
+        """Show the first page of subjects; more are fetched while scrolling"""
+        self.admin_subjects_tree.reload()
     
     def admin_on_subject_select(self, event):
         """Handle subject selection in admin tree"""
@@ -1942,36 +2086,31 @@ class StudentManagementSystem:
             values = item['values']
             
             # Get full subject details
-            self.cursor.execute(
-                "SELECT * FROM subjects WHERE id = ?", (values[0],)
-            )
-            subject = self.cursor.fetchone()
-            columns = [description[0] for description in self.cursor.description]
+            subject = self.db.subjects.get(values[0])
             
             # Fill form
             self.admin_subject_code.delete(0, END)
-            self.admin_subject_code.insert(0, subject[columns.index('subject_code')])
+            self.admin_subject_code.insert(0, subject['subject_code'])
             self.admin_subject_name.delete(0, END)
-            self.admin_subject_name.insert(0, subject[columns.index('subject_name')])
+            self.admin_subject_name.insert(0, subject['subject_name'])
             
             # Set teacher
-            teacher_id = subject[columns.index('teacher_id')]
+            teacher_id = subject['teacher_id']
             if teacher_id:
-                self.cursor.execute("SELECT name FROM teachers WHERE id = ?", (teacher_id,))
-                teacher_name = self.cursor.fetchone()[0]
+                teacher_name = self.db.teachers.name(teacher_id)
                 self.admin_subject_teacher.set(f"{teacher_id} - {teacher_name}")
             else:
                 self.admin_subject_teacher.set("None")
             
             # Set class
-            class_name = subject[columns.index('class')]
+            class_name = subject['class']
             if class_name:
                 self.admin_subject_class.set(class_name)
             else:
                 self.admin_subject_class.set("")
             
             self.admin_subject_credits.delete(0, END)
-            self.admin_subject_credits.insert(0, str(subject[columns.index('credits')] or "3"))
+            self.admin_subject_credits.insert(0, str(subject['credits'] or "3"))
     
     def admin_add_subject(self):
         """Add new subject from admin panel"""
@@ -1988,10 +2127,7 @@ class StudentManagementSystem:
             return
         
         # Check if subject code already exists
-        self.cursor.execute(
-            "SELECT id FROM subjects WHERE subject_code = ?", (subject_code,)
-        )
-        if self.cursor.fetchone():
+        if self.db.subjects.id_by_code(subject_code):
             messagebox.showerror("Error", "Subject Code already exists")
             return
         
@@ -2013,15 +2149,11 @@ class StudentManagementSystem:
         
         # Insert subject
         try:
-            self.cursor.execute('''
-                INSERT INTO subjects (subject_code, subject_name, teacher_id, class, credits)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (subject_code, subject_name, teacher_id, class_name, credits_int))
-            self.conn.commit()
+            self.db.subjects.add(subject_code, subject_name, teacher_id, class_name, credits_int)
             
             messagebox.showinfo("Success", "Subject added successfully!")
             self.admin_clear_subject_form()
-            self.admin_load_subjects()
+            self.admin_subjects_tree.refresh()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -2048,11 +2180,7 @@ class StudentManagementSystem:
             return
         
         # Check if subject code already exists (excluding current subject)
-        self.cursor.execute(
-            "SELECT id FROM subjects WHERE subject_code = ? AND id != ?",
-            (subject_code, subject_db_id)
-        )
-        if self.cursor.fetchone():
+        if self.db.subjects.id_by_code(subject_code, exclude_id=subject_db_id):
             messagebox.showerror("Error", "Subject Code already exists")
             return
         
@@ -2074,15 +2202,11 @@ class StudentManagementSystem:
         
         # Update subject
         try:
-            self.cursor.execute('''
-                UPDATE subjects 
-                SET subject_code = ?, subject_name = ?, teacher_id = ?, class = ?, credits = ?
-                WHERE id = ?
-            ''', (subject_code, subject_name, teacher_id, class_name, credits_int, subject_db_id))
+            self.db.subjects.update(subject_db_id, subject_code, subject_name, teacher_id,
+                                  class_name, credits_int)
             
-            self.conn.commit()
             messagebox.showinfo("Success", "Subject updated successfully!")
-            self.admin_load_subjects()
+            self.admin_subjects_tree.refresh()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -2100,15 +2224,12 @@ class StudentManagementSystem:
         if messagebox.askyesno("Confirm Delete", 
                               f"Are you sure you want to delete subject:\n{subject_name}?\n\nThis will also delete all related results!"):
             try:
-                # Delete related results first
-                self.cursor.execute("DELETE FROM results WHERE subject_id = ?", (subject_id,))
-                # Delete subject
-                self.cursor.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
-                self.conn.commit()
+                # Delete subject with related results
+                self.db.subjects.delete(subject_id)
                 
                 messagebox.showinfo("Success", "Subject deleted successfully!")
                 self.admin_clear_subject_form()
-                self.admin_load_subjects()
+                self.admin_subjects_tree.refresh()
             except sqlite3.Error as e:
                 messagebox.showerror("Error", f"Database error: {e}")
     
@@ -2186,26 +2307,14 @@ class StudentManagementSystem:
         
         self.admin_classes_tree.pack(fill=BOTH, expand=True)
         self.admin_classes_tree.bind('<<TreeviewSelect>>', self.admin_on_class_select)
+        self.admin_classes_rows = TreeRows(self.admin_classes_tree)
         
         # Load classes
         self.admin_load_classes()
     
     def admin_load_classes(self):
-        """Load all classes for admin"""
-        for item in self.admin_classes_tree.get_children():
-            self.admin_classes_tree.delete(item)
-        
-        self.cursor.execute('''
-            SELECT c.id, c.class_name, c.level, c.capacity, c.year,
-                   (SELECT COUNT(*) FROM students s WHERE s.class = c.class_name) as student_count
-            FROM classes c
-            ORDER BY c.class_name
-        ''')
-        
-        classes = self.cursor.fetchall()
-        
-        for class_item in classes:
-            self.admin_classes_tree.insert("", END, values=class_item)
+        """Load all classes for admin, touching only the rows that changed"""
+        self.admin_classes_rows.sync(self.db.classes.list())
     
     def admin_on_class_select(self, event):
         """Handle class selection in admin tree"""
@@ -2215,20 +2324,16 @@ class StudentManagementSystem:
             values = item['values']
             
             # Get full class details
-            self.cursor.execute(
-                "SELECT * FROM classes WHERE id = ?", (values[0],)
-            )
-            class_item = self.cursor.fetchone()
-            columns = [description[0] for description in self.cursor.description]
+            class_item = self.db.classes.get(values[0])
             
             # Fill form
             self.admin_class_name.delete(0, END)
-            self.admin_class_name.insert(0, class_item[columns.index('class_name')])
-            self.admin_class_level.set(class_item[columns.index('level')] or "High School")
+            self.admin_class_name.insert(0, class_item['class_name'])
+            self.admin_class_level.set(class_item['level'] or "High School")
             self.admin_class_capacity.delete(0, END)
-            self.admin_class_capacity.insert(0, str(class_item[columns.index('capacity')] or "30"))
+            self.admin_class_capacity.insert(0, str(class_item['capacity'] or "30"))
             self.admin_class_year.delete(0, END)
-            self.admin_class_year.insert(0, class_item[columns.index('year')] or "2023-2024")
+            self.admin_class_year.insert(0, class_item['year'] or "2023-2024")
     
     def admin_add_class(self):
         """Add new class from admin panel"""
@@ -2244,10 +2349,7 @@ class StudentManagementSystem:
             return
         
         # Check if class already exists
-        self.cursor.execute(
-            "SELECT id FROM classes WHERE class_name = ?", (class_name,)
-        )
-        if self.cursor.fetchone():
+        if self.db.classes.id_by_name(class_name):
             messagebox.showerror("Error", "Class already exists")
             return
         
@@ -2260,18 +2362,13 @@ class StudentManagementSystem:
         
         # Insert class
         try:
-            self.cursor.execute('''
-                INSERT INTO classes (class_name, level, capacity, year)
-                VALUES (?, ?, ?, ?)
-            ''', (class_name, level, capacity_int, year))
-            self.conn.commit()
+            self.db.classes.add(class_name, level, capacity_int, year)
             
             messagebox.showinfo("Success", "Class added successfully!")
             self.admin_clear_class_form()
             self.admin_load_classes()
             # Refresh class combobox in other forms
-            self.load_classes_for_admin()
-            self.load_classes_for_subjects()
+            self.refresh_class_choices()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -2298,11 +2395,7 @@ class StudentManagementSystem:
             return
         
         # Check if class already exists (excluding current class)
-        self.cursor.execute(
-            "SELECT id FROM classes WHERE class_name = ? AND id != ?",
-            (class_name, class_db_id)
-        )
-        if self.cursor.fetchone():
+        if self.db.classes.id_by_name(class_name, exclude_id=class_db_id):
             messagebox.showerror("Error", "Class already exists")
             return
         
@@ -2315,26 +2408,13 @@ class StudentManagementSystem:
         
         # Update class
         try:
-            self.cursor.execute('''
-                UPDATE classes 
-                SET class_name = ?, level = ?, capacity = ?, year = ?
-                WHERE id = ?
-            ''', (class_name, level, capacity_int, year, class_db_id))
-            
-            # Update students' class if class name changed
-            if old_class_name != class_name:
-                self.cursor.execute('''
-                    UPDATE students 
-                    SET class = ? 
-                    WHERE class = ?
-                ''', (class_name, old_class_name))
-            
-            self.conn.commit()
+            # Students follow by id; subjects taught to the class are renamed along
+            self.db.classes.update(class_db_id, old_class_name, class_name, level,
+                                 capacity_int, year)
             messagebox.showinfo("Success", "Class updated successfully!")
             self.admin_load_classes()
             # Refresh class combobox in other forms
-            self.load_classes_for_admin()
-            self.load_classes_for_subjects()
+            self.refresh_class_choices()
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Database error: {e}")
     
@@ -2350,10 +2430,7 @@ class StudentManagementSystem:
         class_name = item['values'][1]
         
         # Check if class has students
-        self.cursor.execute(
-            "SELECT COUNT(*) FROM students WHERE class = ?", (class_name,)
-        )
-        student_count = self.cursor.fetchone()[0]
+        student_count = self.db.classes.student_count(class_id)
         
         if student_count > 0:
             messagebox.showerror("Error", 
@@ -2365,15 +2442,13 @@ class StudentManagementSystem:
                               f"Are you sure you want to delete class:\n{class_name}?"):
             try:
                 # Delete class
-                self.cursor.execute("DELETE FROM classes WHERE id = ?", (class_id,))
-                self.conn.commit()
+                self.db.classes.delete(class_id)
                 
                 messagebox.showinfo("Success", "Class deleted successfully!")
                 self.admin_clear_class_form()
                 self.admin_load_classes()
                 # Refresh class combobox in other forms
-                self.load_classes_for_admin()
-                self.load_classes_for_subjects()
+                self.refresh_class_choices()
             except sqlite3.Error as e:
                 messagebox.showerror("Error", f"Database error: {e}")
     
@@ -2394,40 +2469,35 @@ class StudentManagementSystem:
         
         ttk.Button(db_frame, text="💾 Backup Database", command=self.backup_database,
                   bootstyle="info", width=20).pack(side=LEFT, padx=10)
+        ttk.Button(db_frame, text="♻️ Restore Backup", command=self.restore_database,
+                  bootstyle="warning", width=20).pack(side=LEFT, padx=10)
         ttk.Button(db_frame, text="🔄 Reset Database", command=self.reset_database,
                   bootstyle="danger", width=20).pack(side=LEFT, padx=10)
         ttk.Button(db_frame, text="📊 Export to Excel", command=self.export_to_excel,
                   bootstyle="success", width=20).pack(side=LEFT, padx=10)
+        ttk.Button(db_frame, text="🔢 Recount Statistics", command=self.recount_statistics,
+                  bootstyle="secondary", width=20).pack(side=LEFT, padx=10)
+        
+        # Backup progress
+        progress_frame = ttk.Frame(parent)
+        progress_frame.pack(fill=X, padx=20)
+        
+        self.backup_progress = ttk.Progressbar(progress_frame, mode="determinate", maximum=100,
+                                               bootstyle="info-striped")
+        self.backup_progress.pack(side=LEFT, fill=X, expand=True, padx=10)
+        self.backup_status_label = ttk.Label(progress_frame, text="", width=40)
+        self.backup_status_label.pack(side=LEFT, padx=10)
         
         # System info frame
         info_frame = ttk.Labelframe(parent, text="System Information", padding=20)
         info_frame.pack(fill=BOTH, expand=True, padx=20, pady=20)
         
-        # Get system statistics
-        self.cursor.execute("SELECT COUNT(*) FROM students")
-        total_students = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM teachers")
-        total_teachers = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM results")
-        total_results = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM subjects")
-        total_subjects = self.cursor.fetchone()[0]
-        
-        self.cursor.execute("SELECT COUNT(*) FROM classes")
-        total_classes = self.cursor.fetchone()[0]
-        
-        info_text = f"""
-        📊 System Statistics:
-        
-        • Total Students: {total_students}
-        • Total Teachers: {total_teachers}
-        • Total Results: {total_results}
-        • Total Subjects: {total_subjects}
-        • Total Classes: {total_classes}
+        # Filled by show_admin_stats, which recounts and refreshes call again
+        self.settings_stats_label = ttk.Label(info_frame, font=("Consolas", 10))
+        self.settings_stats_label.pack(anchor=W)
+        self.show_admin_stats(self.admin_counts)
         
+        info_text = """
         ⚙️ System Information:
         
         • Database: SQLite3
@@ -2443,23 +2513,144 @@ class StudentManagementSystem:
         
         ttk.Label(info_frame, text=info_text, font=("Consolas", 10)).pack(anchor=W)
     
+    def load_backup_settings(self):
+        """Return the backup settings, or None after reporting invalid ones"""
+        try:
+            return backup.load_backup_settings()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Invalid backup settings in {database.CONFIG_PATH}: {e}")
+            return None
+    
     def backup_database(self):
-        """Create a backup of the database"""
-        import shutil
-        import datetime
+        """Add a compressed backup of the database to the backup set"""
+        if self.runs_on_server("Backup", "backup"):
+            return
+        if getattr(self, 'backup_running', False):
+            messagebox.showinfo("Backup", "A backup is already in progress")
+            return
         
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"massar_backup_{timestamp}.db"
+        settings = self.load_backup_settings()
+        if settings is None:
+            return
         
-        try:
-            shutil.copy2('massar_system.db', backup_file)
-            messagebox.showinfo("Backup Successful", 
-                              f"Database backed up successfully to:\n{backup_file}")
-        except Exception as e:
+        def finished(result):
+            manifest, removed = result
+            self.backup_running = False
+            self.show_backup_progress(1, 1, "Backup verified")
+            message = (f"{manifest['kind'].capitalize()} backup saved to:\n"
+                       f"{os.path.join(settings['directory'], manifest['data'])}")
+            if manifest['kind'] == 'incremental':
+                message += (f"\n\n{manifest['changed_pages']} of {manifest['page_count']} pages "
+                            f"changed since {manifest['base']}")
+            if removed:
+                message += f"\n\n{len(removed)} old backups removed by the retention policy"
+            messagebox.showinfo("Backup Successful", message)
+        
+        def failed(e):
+            self.backup_running = False
+            self.show_backup_progress(0, 1, "Backup failed")
             messagebox.showerror("Backup Failed", f"Error creating backup: {e}")
+        
+        # Online backup on the worker thread: copies a few pages at a time from
+        # the live database, checks the copy with PRAGMA integrity_check, then
+        # stores it compressed (in full or as changed pages) and prunes old backups
+        self.backup_running = True
+        self.show_backup_progress(0, 1, "Starting backup...")
+        progress = self.executor.in_tk_thread(self.show_backup_progress)
+        self.executor.submit(
+            lambda db: backup.create_backup(db.conn, settings, progress=progress),
+            finished, failed
+        )
+    
+    def restore_database(self):
+        """Choose a backup and restore the database from it"""
+        if self.runs_on_server("Restore"):
+            return
+        settings = self.load_backup_settings()
+        if settings is None:
+            return
+        
+        backups = backup.list_backups(settings['directory'])
+        if not backups:
+            messagebox.showinfo("Restore Backup", f"No backups found in {settings['directory']}")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Restore Backup")
+        dialog.geometry("600x400")
+        dialog.transient(self.root)
+        
+        columns = ("Created", "Type", "Changed Pages", "Size (MB)")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", height=12)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=130, anchor=CENTER)
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        
+        for manifest in backups:
+            data_file = os.path.join(settings['directory'], manifest['data'])
+            size = os.path.getsize(data_file) if os.path.exists(data_file) else 0
+            tree.insert("", END, iid=manifest['name'], values=(
+                manifest['created'][:19].replace("T", " "),
+                manifest['kind'],
+                f"{manifest['changed_pages']} / {manifest['page_count']}",
+                f"{size / 1048576:.1f}"
+            ))
+        
+        def restore_selected():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showerror("Error", "Please select a backup to restore", parent=dialog)
+                return
+            name = selected[0]
+            created = tree.item(name)['values'][0]
+            if not messagebox.askyesno("⚠️ Restore Database",
+                                      f"Replace the current database with the backup from {created}?\n\n"
+                                      "All changes made since then will be lost.", parent=dialog):
+                return
+            dialog.destroy()
+            
+            def failed(e):
+                self.show_backup_progress(0, 1, "Restore failed")
+                messagebox.showerror("Restore Failed", f"Error restoring backup: {e}")
+            
+            # Rebuild and verify on the worker; the live database is untouched until the swap
+            self.show_backup_progress(0, 1, "Rebuilding and verifying backup...")
+            self.executor.submit(
+                lambda db: backup.prepare_restore(settings['directory'], name, database.DB_PATH),
+                self.finish_restore, failed
+            )
+        
+        ttk.Button(dialog, text="♻️ Restore Selected", command=restore_selected,
+                  bootstyle="warning").pack(pady=10)
+    
+    def finish_restore(self, restored):
+        """Swap a verified restore in for the live database and start over"""
+        try:
+            # Every connection must be closed before the file is replaced
+            self.executor.shutdown()
+            self.conn.close()
+            backup.swap_in(restored, database.DB_PATH)
+            messagebox.showinfo("Restore Complete", "Database restored successfully.\n"
+                                                    "Please log in again.")
+        except OSError as e:
+            messagebox.showerror("Restore Failed", f"Error replacing the database file: {e}")
+        
+        self.init_database()
+        self.logout()
+    
+    def show_backup_progress(self, copied, total, status=None):
+        """Update the backup progress bar in the settings tab"""
+        progress_bar = getattr(self, 'backup_progress', None)
+        if progress_bar is None or not progress_bar.winfo_exists():
+            return
+        progress_bar['value'] = 100 * copied / total if total else 0
+        self.backup_status_label.config(text=status or f"Copying pages: {copied} / {total}")
     
     def reset_database(self):
         """Reset the database (warning: will delete all data!)"""
+        if self.runs_on_server("Reset"):
+            return
         if messagebox.askyesno("⚠️ Danger Zone", 
                               "Are you absolutely sure you want to reset the database?\n\n"
                               "This will DELETE ALL DATA and cannot be undone!"):
@@ -2467,12 +2658,14 @@ class StudentManagementSystem:
                                   "LAST WARNING: This will delete ALL students, teachers, results, etc.\n"
                                   "Are you really sure?"):
                 try:
-                    # Close current connection
+                    # Close current connections
+                    self.executor.shutdown()
                     self.conn.close()
                     
-                    # Delete database file
-                    if os.path.exists('massar_system.db'):
-                        os.remove('massar_system.db')
+                    # Delete database file and its WAL/journal files
+                    for path in database.database_files(database.DB_PATH):
+                        if os.path.exists(path):
+                            os.remove(path)
                     
                     # Reinitialize database
                     self.init_database()
@@ -2486,53 +2679,91 @@ class StudentManagementSystem:
                 except Exception as e:
                     messagebox.showerror("Reset Failed", f"Error resetting database: {e}")
     
+    def show_admin_stats(self, counts):
+        """Show row counts in the admin dashboard header and settings tab"""
+        titles = {
+            "students": "🎓 Students",
+            "teachers": "👨‍🏫 Teachers",
+            "results": "📊 Results",
+            "subjects": "📚 Subjects",
+        }
+        for table, label in self.admin_stats_labels.items():
+            label.config(text=f"{titles[table]}: {counts[table]}")
+        
+        # The settings tab lists them too, once it is built
+        label = getattr(self, 'settings_stats_label', None)
+        if label is not None and label.winfo_exists():
+            label.config(text="\n        📊 System Statistics:\n\n" + "\n".join(
+                f"        • Total {table.capitalize()}: {counts[table]}"
+                for table in ("students", "teachers", "results", "subjects", "classes")
+            ))
+    
+    def refresh_admin_settings_tab(self, tab):
+        """Show the current row counts when the kept settings tab is shown again"""
+        self.admin_counts = self.db.stats.counts()
+        self.show_admin_stats(self.admin_counts)
+    
+    def recount_statistics(self):
+        """Rebuild the statistics counters and grade summaries from the raw tables"""
+        def show_result(counts):
+            self.admin_counts = counts
+            self.show_admin_stats(counts)
+            messagebox.showinfo("Statistics Recounted",
+                              "\n".join(f"{table.capitalize()}: {count}" for table, count in counts.items()))
+        
+        # Full scans of every table: keep them off the Tk thread
+        self.executor.submit(lambda db: db.stats.rebuild(), show_result, key="recount_statistics")
+    
     def export_to_excel(self):
         """Export data to Excel file"""
-        try:
-            # Create a Pandas Excel writer
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            excel_file = f"massar_export_{timestamp}.xlsx"
-            
-            with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-                # Export each table
-                tables = ['students', 'teachers', 'subjects', 'results', 'classes', 'attendance']
-                
-                for table in tables:
-                    df = pd.read_sql_query(f"SELECT * FROM {table}", self.conn)
-                    if not df.empty:
-                        df.to_excel(writer, sheet_name=table, index=False)
-                
-                # Adjust column widths
-                workbook = writer.book
-                for table in tables:
-                    if table in writer.sheets:
-                        worksheet = writer.sheets[table]
-                        for column in worksheet.columns:
-                            max_length = 0
-                            column_letter = column[0].column_letter
-                            for cell in column:
-                                try:
-                                    if len(str(cell.value)) > max_length:
-                                        max_length = len(str(cell.value))
-                                except:
-                                    pass
-                            adjusted_width = min(max_length + 2, 50)
-                            worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            messagebox.showinfo("Export Successful", 
-                              f"Data exported successfully to:\n{excel_file}")
-        except Exception as e:
-            messagebox.showerror("Export Failed", f"Error exporting to Excel: {e}")
+        if self.runs_on_server("Export", "export"):
+            return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        excel_file = f"massar_export_{timestamp}.xlsx"
+        
+        def show_result(sheets):
+            message = f"Data exported successfully to:\n{excel_file}"
+            split = [sheet for table, sheet, _ in sheets if sheet != table]
+            if split:
+                message += "\n\nLarge tables were continued on extra sheets: " + ", ".join(split)
+            messagebox.showinfo("Export Successful", message)
+        
+        # Streams every table on the worker thread, reading through its own connection
+        self.executor.submit(
+            lambda db: exporter.export_tables(db.conn, excel_file),
+            show_result,
+            lambda e: messagebox.showerror("Export Failed", f"Error exporting to Excel: {e}")
+        )
     
     def __del__(self):
-        """Destructor to close database connection"""
+        """Destructor to close database connections"""
+        if hasattr(self, 'executor'):
+            self.executor.shutdown()
         if hasattr(self, 'conn'):
             self.conn.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Massar student management system")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="log import, database init and first frame times (and dashboard first paints)")
+    parser.add_argument("--server", metavar="URL",
+                        help="work through a server started with 'main.py cli serve' "
+                             "instead of opening the database file")
+    args = parser.parse_args()
+    server = None
+    if args.server:
+        try:
+            server = remote.RemoteClient(args.server)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.profile_startup:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Create and run the application
     root = ttk.Window(themename="cosmo")
-    app = StudentManagementSystem(root)
+    app = StudentManagementSystem(root, server)
+    if args.profile_startup:
+        app.report_startup()
     root.mainloop()
 
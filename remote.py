@@ -0,0 +1,156 @@
+"""Client side of server.py: repositories whose methods run on a Massar server
+
+RemoteRepositories(client) has the same attributes and method names as
+repository.Repositories, so the GUI and QueryExecutor use either one the same
+way. A call that fails on the server raises the same sqlite3 exception (or
+ValueError) it raised there, and RemoteError, an sqlite3.DatabaseError, is
+raised when the server cannot be reached or refuses the call, so existing
+`except sqlite3.Error` handlers apply unchanged.
+"""
+import http.client
+import json
+import sqlite3
+from urllib.parse import urlsplit
+
+# Seconds to wait for the server to answer one call
+TIMEOUT = 30
+
+REPOSITORIES = ("admins", "students", "teachers", "subjects", "classes", "results", "attendance", "stats")
+
+# Exception types the server reports by name and the client raises again
+ERRORS = {
+    "IntegrityError": sqlite3.IntegrityError,
+    "OperationalError": sqlite3.OperationalError,
+    "DatabaseError": sqlite3.DatabaseError,
+    "ValueError": ValueError,
+}
+
+
+class RemoteError(sqlite3.DatabaseError):
+    """The server could not be reached or refused the call"""
+
+
+class Record(tuple):
+    """A record sent by the server, readable by index or column name like sqlite3.Row"""
+    
+    def __new__(cls, columns, values):
+        record = super().__new__(cls, values)
+        record._columns = columns
+        return record
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._columns.index(key)
+            except ValueError:
+                raise IndexError(f"No item with that key: {key}")
+        return super().__getitem__(key)
+    
+    def keys(self):
+        return list(self._columns)
+
+
+def _decode(obj):
+    if set(obj) == {"__columns__", "__values__"}:
+        return Record(obj["__columns__"], obj["__values__"])
+    return obj
+
+
+class RemoteClient:
+    """Connection to a Massar server, used where an sqlite3 connection would be
+    
+    Safe to share between threads: every call opens its own HTTP connection.
+    The session token of the last successful login is used by all of them.
+    """
+    in_transaction = False          # every call commits (or rolls back) on the server
+    
+    def __init__(self, url, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"Server address must look like http://host:port, not {url}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.token = None
+    
+    def post(self, path, body):
+        """Send one request and return the decoded reply, raising its error if any"""
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("POST", path, json.dumps(body).encode("utf-8"), headers)
+            data = conn.getresponse().read()
+        except (OSError, http.client.HTTPException) as e:
+            raise RemoteError(f"Cannot reach the server at {self.url}: {e}")
+        finally:
+            conn.close()
+        
+        try:
+            reply = json.loads(data, object_hook=_decode)
+        except ValueError:
+            raise RemoteError(f"Unexpected reply from {self.url}")
+        error = reply.get("error")
+        if error is not None:
+            raise ERRORS.get(error["type"], RemoteError)(error["message"])
+        return reply
+    
+    def login(self, repo, args):
+        """Call <repo>.authenticate on the server, keeping the session on success
+        
+        args is [user, password]: the password goes in plain text and the
+        server hashes it.
+        """
+        reply = self.post("/login", {"repo": repo, "args": args})
+        if reply.get("token"):
+            self.token = reply["token"]
+        return reply["result"]
+    
+    def logout(self):
+        """End the session on the server and forget its token"""
+        if self.token:
+            try:
+                self.post("/logout", {})
+            except RemoteError:
+                pass        # unreachable: the server expires the session on its own
+        self.token = None
+    
+    def call(self, repo, method, args, kwargs):
+        """Run a repository method on the server and return its result"""
+        return self.post("/call", {"repo": repo, "method": method, "args": args, "kwargs": kwargs})["result"]
+    
+    def interrupt(self):
+        # A call cannot be stopped once sent; QueryExecutor drops its result
+        pass
+    
+    def rollback(self):
+        pass
+    
+    def close(self):
+        pass
+
+
+class RemoteRepo:
+    """Forwards method calls on one repository to the server"""
+    
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+    
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        if method == "authenticate":
+            return lambda *args: self.client.login(self.name, list(args))
+        return lambda *args, **kwargs: self.client.call(self.name, method, list(args), kwargs)
+
+
+class RemoteRepositories:
+    """Stands in for repository.Repositories when the database is behind a server"""
+    
+    def __init__(self, client):
+        self.conn = client
+        for name in REPOSITORIES:
+            setattr(self, name, RemoteRepo(client, name))
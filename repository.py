@@ -0,0 +1,1023 @@
+"""Data-access layer: every SQL statement the application runs lives here
+
+Repositories take an open sqlite3 connection and never touch the GUI, so they
+can be used from the Tk app, scripts and benchmarks alike. Queries return
+plain tuples (or sqlite3.Row for single full records).
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from database import ATTENDANCE_ROLLUPS, COUNTED_TABLES, STATEMENT_CACHE_SIZE, rollup_recount_sql
+
+# Rows returned by a full-text search
+SEARCH_LIMIT = 50
+
+# Seconds between checks of reference_version for edits made by other processes
+REFERENCE_CHECK_INTERVAL = 1.0
+
+
+def match_query(text):
+    """Turn search box text into an FTS5 query matching every word as a prefix
+    
+    Returns None when the text has no searchable words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class StatementCache:
+    """Bounded LRU cache of generated SQL text
+    
+    sqlite3 reuses a compiled statement when it sees the exact same SQL text
+    again, so queries assembled from optional filters are built once per shape
+    and handed back verbatim afterwards.
+    """
+    
+    def __init__(self, size=STATEMENT_CACHE_SIZE):
+        self.size = size
+        self._statements = OrderedDict()
+    
+    def get(self, key, build):
+        """Return the SQL cached under key, building it with build() on a miss"""
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build()
+            self._statements[key] = sql
+            if len(self._statements) > self.size:
+                self._statements.popitem(last=False)
+        else:
+            self._statements.move_to_end(key)
+        return sql
+    
+    def __len__(self):
+        return len(self._statements)
+
+
+class ReferenceCache:
+    """Subjects, teacher names and class names held in memory, one copy per database file
+    
+    These small tables back every combobox and id lookup but rarely change.
+    Every connection of the process shares the copy (see reference_cache), so
+    the invalidate() the repositories call after editing them reaches all of
+    them. Edits by other processes bump reference_version (migration 11),
+    which is read at most every check_interval seconds; other writes, such as
+    attendance and grades, never cause a reload.
+    """
+    
+    def __init__(self, check_interval=REFERENCE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked = 0.0
+    
+    def invalidate(self):
+        """Forget the cached rows; the next read reloads them"""
+        with self._lock:
+            self._data = None
+    
+    def get(self, conn, name):
+        """Return the cached "subjects", "subject_ids", "teachers" or "classes" data
+        
+        conn is the caller's connection, used if the data has to be (re)loaded.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._data is not None and now - self._checked >= self.check_interval:
+                if self._current_version(conn) != self._version:
+                    self._data = None
+                self._checked = now
+            if self._data is None:
+                # Version first: data read after it is at least as new
+                self._version = self._current_version(conn)
+                self._data = self._load(conn)
+                self._checked = now
+            return self._data[name]
+    
+    def _current_version(self, conn):
+        return conn.execute("SELECT version FROM reference_version").fetchone()[0]
+    
+    def _load(self, conn):
+        subjects = conn.execute(
+            "SELECT id, subject_name, class, teacher_id FROM subjects ORDER BY subject_name, class, id"
+        ).fetchall()
+        # (subject name, teacher id) -> lowest subject id
+        subject_ids = {}
+        for subject_db_id, subject_name, _, teacher_db_id in sorted(subjects):
+            subject_ids.setdefault((subject_name, teacher_db_id), subject_db_id)
+        return {
+            "subjects": subjects,
+            "subject_ids": subject_ids,
+            "teachers": conn.execute("SELECT id, name FROM teachers ORDER BY name").fetchall(),
+            "classes": [row[0] for row in
+                        conn.execute("SELECT class_name FROM classes ORDER BY class_name")],
+        }
+
+
+_reference_caches = {}          # database file path -> ReferenceCache
+_reference_caches_lock = threading.Lock()
+
+
+def reference_cache(conn):
+    """Return the ReferenceCache shared by every connection to conn's database file"""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not path:
+        # In-memory or temporary database: no other connection can see it
+        return ReferenceCache()
+    with _reference_caches_lock:
+        return _reference_caches.setdefault(path, ReferenceCache())
+
+
+class Repo:
+    """Base class holding the connection, the shared statement cache and reference data"""
+    
+    def __init__(self, conn, statements, reference=None):
+        self.conn = conn
+        self.statements = statements
+        self.reference = reference if reference is not None else reference_cache(conn)
+    
+    def _all(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+    
+    def _one(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchone()
+    
+    def _scalar(self, sql, params=()):
+        row = self._one(sql, params)
+        return row[0] if row else None
+    
+    def _column(self, sql, params=()):
+        return [row[0] for row in self._all(sql, params)]
+    
+    def _record(self, sql, params=()):
+        """Fetch one row as an sqlite3.Row (accessible by column name)"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return cursor.execute(sql, params).fetchone()
+    
+    def _id_by(self, table, column, value, exclude_id=None):
+        """Return the id of the row whose column equals value, ignoring exclude_id"""
+        sql = self.statements.get(
+            ("id_by", table, column, exclude_id is not None),
+            lambda: f"SELECT id FROM {table} WHERE {column} = ?" +
+                    (" AND id != ?" if exclude_id is not None else "")
+        )
+        params = (value,) if exclude_id is None else (value, exclude_id)
+        return self._scalar(sql, params)
+    
+    def _sync_enrollments(self, column, ids_sql, params=()):
+        """Bring the enrollments of some students or subjects in line with their classes
+        
+        column is "student_id" or "subject_id" and ids_sql a SELECT of the ids
+        to sync. Enrollments whose class no longer matches are dropped unless
+        the student has results in the subject; missing ones are added. Call
+        inside the transaction that changed the classes.
+        """
+        self.conn.execute(f'''
+            DELETE FROM enrollments
+            WHERE {column} IN ({ids_sql})
+              AND NOT EXISTS (SELECT 1 FROM students s
+                              JOIN classes c ON c.id = s.class_id
+                              JOIN subjects sub ON sub.class = c.class_name
+                              WHERE s.id = enrollments.student_id AND sub.id = enrollments.subject_id)
+              AND NOT EXISTS (SELECT 1 FROM results r
+                              WHERE r.student_id = enrollments.student_id
+                                AND r.subject_id = enrollments.subject_id)
+        ''', params)
+        self.conn.execute(f'''
+            INSERT OR IGNORE INTO enrollments (student_id, subject_id)
+            SELECT s.id, sub.id FROM students s
+            JOIN classes c ON c.id = s.class_id
+            JOIN subjects sub ON sub.class = c.class_name
+            WHERE {"s.id" if column == "student_id" else "sub.id"} IN ({ids_sql})
+        ''', params)
+    
+    def _page(self, select, keys, descending=False, after=None, before=None, limit=100):
+        """Return one page of `select` in keyset order
+        
+        keys are the columns of the sort key (ending in a unique column) and
+        must be backed by an index. after/before hold the key of the last/first
+        row already shown; the page continues past it, in display order.
+        """
+        forward = before is None
+        bound = after if forward else before
+        ascending = descending != forward
+        sql = self.statements.get(
+            ("page", select, keys, ascending, bound is not None),
+            lambda: select +
+                    (f" WHERE ({', '.join(keys)}) {'>' if ascending else '<'} "
+                     f"({', '.join('?' * len(keys))})" if bound is not None else "") +
+                    " ORDER BY " + ", ".join(f"{key} {'ASC' if ascending else 'DESC'}" for key in keys) +
+                    " LIMIT ?"
+        )
+        rows = self._all(sql, (*(bound or ()), limit))
+        return rows if forward else rows[::-1]
+
+
+class AdminRepo(Repo):
+    def authenticate(self, username, hashed_password):
+        """Return the admin id for valid credentials, else None"""
+        return self._scalar(
+            "SELECT id FROM admin WHERE username = ? AND password = ?",
+            (username, hashed_password)
+        )
+
+
+class StudentRepo(Repo):
+    UNIQUE_COLUMNS = ("student_id", "cne", "email")
+    
+    # Students are written with a class name; unknown or empty names leave no class
+    CLASS_ID = "(SELECT id FROM classes WHERE class_name = ?)"
+    
+    def authenticate(self, student_id, hashed_password):
+        """Return (id, name) for valid credentials, else None"""
+        return self._one(
+            "SELECT id, name FROM students WHERE student_id = ? AND password = ?",
+            (student_id, hashed_password)
+        )
+    
+    def header(self, student_db_id):
+        """Return (name, student_id, class) for the dashboard header"""
+        return self._one('''
+            SELECT s.name, s.student_id, c.class_name
+            FROM students s LEFT JOIN classes c ON c.id = s.class_id
+            WHERE s.id = ?
+        ''', (student_db_id,))
+    
+    def get(self, student_db_id):
+        """Return the full student record, with its class name as 'class'"""
+        return self._record('''
+            SELECT s.*, c.class_name AS class
+            FROM students s LEFT JOIN classes c ON c.id = s.class_id
+            WHERE s.id = ?
+        ''', (student_db_id,))
+    
+    def page(self, after=None, before=None, limit=100):
+        """Return a page of students for the admin list, newest first
+        
+        Keyed on id, which follows registration order.
+        """
+        return self._page(
+            "SELECT s.id, s.student_id, s.cne, s.name, s.email, c.class_name, s.phone, "
+            "strftime('%Y-%m-%d', s.created_at) "
+            "FROM students s LEFT JOIN classes c ON c.id = s.class_id",
+            ("s.id",), True, after, before, limit
+        )
+    
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Return the students best matching text, in admin list columns, best first"""
+        query = match_query(text)
+        if query is None:
+            return []
+        return self._all('''
+            SELECT s.id, s.student_id, s.cne, s.name, s.email, c.class_name, s.phone,
+                   strftime('%Y-%m-%d', s.created_at)
+            FROM (SELECT rowid, rank FROM students_fts
+                  WHERE students_fts MATCH ? ORDER BY rank LIMIT ?) m
+            JOIN students s ON s.id = m.rowid
+            LEFT JOIN classes c ON c.id = s.class_id
+            ORDER BY m.rank
+        ''', (query, limit))
+    
+    def id_by(self, column, value, exclude_id=None):
+        """Return the id of the student with a given unique column value"""
+        if column not in self.UNIQUE_COLUMNS:
+            raise ValueError(f"Not a unique student column: {column}")
+        return self._id_by("students", column, value, exclude_id)
+    
+    def for_teacher(self, teacher_db_id):
+        """Return (id, name, student_id) of the students enrolled in a teacher's subjects"""
+        return self._all('''
+            SELECT DISTINCT s.id, s.name, s.student_id
+            FROM subjects sub
+            JOIN enrollments e ON e.subject_id = sub.id
+            JOIN students s ON s.id = e.student_id
+            WHERE sub.teacher_id = ?
+            ORDER BY s.name
+        ''', (teacher_db_id,))
+    
+    def in_class(self, class_name):
+        """Return (id, name, student_id) of the students in a class"""
+        return self._all('''
+            SELECT id, name, student_id FROM students
+            WHERE class_id = (SELECT id FROM classes WHERE class_name = ?)
+            ORDER BY name
+        ''', (class_name,))
+    
+    def class_names(self):
+        """Return the classes that have students, in order"""
+        return self._column('''
+            SELECT class_name FROM classes c
+            WHERE EXISTS (SELECT 1 FROM students s WHERE s.class_id = c.id)
+            ORDER BY class_name
+        ''')
+    
+    def class_names_for_teacher(self, teacher_db_id):
+        """Return the classes that have students and are taught one of a teacher's subjects"""
+        return self._column('''
+            SELECT c.class_name FROM classes c
+            WHERE EXISTS (SELECT 1 FROM subjects sub
+                          WHERE sub.teacher_id = ? AND sub.class = c.class_name)
+              AND EXISTS (SELECT 1 FROM students s WHERE s.class_id = c.id)
+            ORDER BY c.class_name
+        ''', (teacher_db_id,))
+    
+    def add(self, student_id, cne, name, email, hashed_password, class_name,
+            birth_date, phone, address):
+        """Insert a student and return its id"""
+        with self.conn:
+            cursor = self.conn.execute(f'''
+                INSERT INTO students (student_id, cne, name, email, password,
+                                    class_id, birth_date, phone, address)
+                VALUES (?, ?, ?, ?, ?, {self.CLASS_ID}, ?, ?, ?)
+            ''', (student_id, cne, name, email, hashed_password, class_name,
+                 birth_date, phone, address))
+            self._sync_enrollments("student_id", "?", (cursor.lastrowid,))
+        return cursor.lastrowid
+    
+    def add_many(self, records):
+        """Insert student records in one transaction and return how many were inserted
+        
+        Each record is (student_id, cne, name, email, hashed_password, class,
+        birth_date, phone, address).
+        """
+        with self.conn:
+            last_id = self._scalar("SELECT COALESCE(MAX(id), 0) FROM students")
+            cursor = self.conn.executemany(f'''
+                INSERT INTO students (student_id, cne, name, email, password,
+                                    class_id, birth_date, phone, address)
+                VALUES (?, ?, ?, ?, ?, {self.CLASS_ID}, ?, ?, ?)
+            ''', records)
+            # Enroll the whole batch in one statement
+            self._sync_enrollments("student_id", "SELECT id FROM students WHERE id > ?", (last_id,))
+        return cursor.rowcount
+    
+    def unique_values(self):
+        """Return {column: set of values in use} for the UNIQUE columns"""
+        values = {column: set() for column in self.UNIQUE_COLUMNS}
+        for row in self.conn.execute(f"SELECT {', '.join(self.UNIQUE_COLUMNS)} FROM students"):
+            for column, value in zip(self.UNIQUE_COLUMNS, row):
+                if value is not None:
+                    values[column].add(value)
+        return values
+    
+    def update(self, student_db_id, student_id, cne, name, email, class_name,
+               birth_date, phone, address, hashed_password=None):
+        """Update a student; the password is kept when hashed_password is None"""
+        with self.conn:
+            if hashed_password is not None:
+                self.conn.execute(f'''
+                    UPDATE students
+                    SET student_id = ?, cne = ?, name = ?, email = ?, password = ?,
+                        class_id = {self.CLASS_ID}, birth_date = ?, phone = ?, address = ?
+                    WHERE id = ?
+                ''', (student_id, cne, name, email, hashed_password, class_name,
+                     birth_date, phone, address, student_db_id))
+            else:
+                self.conn.execute(f'''
+                    UPDATE students
+                    SET student_id = ?, cne = ?, name = ?, email = ?,
+                        class_id = {self.CLASS_ID}, birth_date = ?, phone = ?, address = ?
+                    WHERE id = ?
+                ''', (student_id, cne, name, email, class_name,
+                     birth_date, phone, address, student_db_id))
+            self._sync_enrollments("student_id", "?", (student_db_id,))
+    
+    def delete(self, student_db_id):
+        """Delete a student with their results and attendance"""
+        with self.conn:
+            self.conn.execute("DELETE FROM results WHERE student_id = ?", (student_db_id,))
+            self.conn.execute("DELETE FROM attendance WHERE student_id = ?", (student_db_id,))
+            self.conn.execute("DELETE FROM enrollments WHERE student_id = ?", (student_db_id,))
+            self.conn.execute("DELETE FROM students WHERE id = ?", (student_db_id,))
+
+
+class TeacherRepo(Repo):
+    UNIQUE_COLUMNS = ("teacher_id", "email")
+    
+    def authenticate(self, teacher_id, hashed_password):
+        """Return (id, name) for valid credentials, else None"""
+        return self._one(
+            "SELECT id, name FROM teachers WHERE teacher_id = ? AND password = ?",
+            (teacher_id, hashed_password)
+        )
+    
+    def header(self, teacher_db_id):
+        """Return (name, teacher_id, subject) for the dashboard header"""
+        return self._one(
+            "SELECT name, teacher_id, subject FROM teachers WHERE id = ?",
+            (teacher_db_id,)
+        )
+    
+    def get(self, teacher_db_id):
+        """Return the full teacher record"""
+        return self._record("SELECT * FROM teachers WHERE id = ?", (teacher_db_id,))
+    
+    def name(self, teacher_db_id):
+        """Return a teacher's name"""
+        return self._scalar("SELECT name FROM teachers WHERE id = ?", (teacher_db_id,))
+    
+    def page(self, after=None, before=None, limit=100):
+        """Return a page of teachers for the admin list, newest first"""
+        return self._page(
+            "SELECT id, teacher_id, name, email, subject, qualification, phone, "
+            "strftime('%Y-%m-%d', created_at) FROM teachers",
+            ("id",), True, after, before, limit
+        )
+    
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Return the teachers best matching text, in admin list columns, best first"""
+        query = match_query(text)
+        if query is None:
+            return []
+        return self._all('''
+            SELECT t.id, t.teacher_id, t.name, t.email, t.subject, t.qualification, t.phone,
+                   strftime('%Y-%m-%d', t.created_at)
+            FROM (SELECT rowid, rank FROM teachers_fts
+                  WHERE teachers_fts MATCH ? ORDER BY rank LIMIT ?) m
+            JOIN teachers t ON t.id = m.rowid
+            ORDER BY m.rank
+        ''', (query, limit))
+    
+    def options(self):
+        """Return (id, name) of all teachers ordered by name"""
+        return list(self.reference.get(self.conn, "teachers"))
+    
+    def id_by(self, column, value, exclude_id=None):
+        """Return the id of the teacher with a given unique column value"""
+        if column not in self.UNIQUE_COLUMNS:
+            raise ValueError(f"Not a unique teacher column: {column}")
+        return self._id_by("teachers", column, value, exclude_id)
+    
+    def add(self, teacher_id, name, email, hashed_password, subject, qualification, phone):
+        """Insert a teacher and return its id"""
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO teachers (teacher_id, name, email, password, subject, qualification, phone)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (teacher_id, name, email, hashed_password, subject, qualification, phone))
+        self.reference.invalidate()
+        return cursor.lastrowid
+    
+    def update(self, teacher_db_id, teacher_id, name, email, subject, qualification,
+               phone, hashed_password=None):
+        """Update a teacher; the password is kept when hashed_password is None"""
+        with self.conn:
+            if hashed_password is not None:
+                self.conn.execute('''
+                    UPDATE teachers
+                    SET teacher_id = ?, name = ?, email = ?, password = ?,
+                        subject = ?, qualification = ?, phone = ?
+                    WHERE id = ?
+                ''', (teacher_id, name, email, hashed_password, subject,
+                     qualification, phone, teacher_db_id))
+            else:
+                self.conn.execute('''
+                    UPDATE teachers
+                    SET teacher_id = ?, name = ?, email = ?,
+                        subject = ?, qualification = ?, phone = ?
+                    WHERE id = ?
+                ''', (teacher_id, name, email, subject,
+                     qualification, phone, teacher_db_id))
+        self.reference.invalidate()
+    
+    def delete(self, teacher_db_id):
+        """Delete a teacher with their results, unassigning their subjects"""
+        with self.conn:
+            self.conn.execute("DELETE FROM results WHERE teacher_id = ?", (teacher_db_id,))
+            self.conn.execute("UPDATE subjects SET teacher_id = NULL WHERE teacher_id = ?", (teacher_db_id,))
+            self.conn.execute("DELETE FROM teachers WHERE id = ?", (teacher_db_id,))
+        self.reference.invalidate()
+
+
+class SubjectRepo(Repo):
+    def get(self, subject_db_id):
+        """Return the full subject record"""
+        return self._record("SELECT * FROM subjects WHERE id = ?", (subject_db_id,))
+    
+    def page(self, after=None, before=None, limit=100):
+        """Return a page of subjects with their teacher for the admin list, by name
+        
+        Keyed on (subject_name, id), served by idx_subjects_name.
+        """
+        return self._page(
+            "SELECT s.id, s.subject_code, s.subject_name, "
+            "COALESCE(t.name, 'Not Assigned'), COALESCE(s.class, 'All Classes'), s.credits "
+            "FROM subjects s LEFT JOIN teachers t ON s.teacher_id = t.id",
+            ("s.subject_name", "s.id"), False, after, before, limit
+        )
+    
+    def names_for_teacher(self, teacher_db_id):
+        """Return the names of the subjects a teacher teaches"""
+        return list(dict.fromkeys(name for _, name, _ in self.for_teacher(teacher_db_id)))
+    
+    def for_teacher(self, teacher_db_id):
+        """Return (id, subject_name, class) of the subjects a teacher teaches"""
+        subjects = self.reference.get(self.conn, "subjects")
+        return [(subject_db_id, name, class_name)
+                for subject_db_id, name, class_name, teacher in subjects
+                if teacher == teacher_db_id]
+    
+    def id_for(self, subject_name, teacher_db_id):
+        """Return the id of a teacher's subject by name"""
+        return self.reference.get(self.conn, "subject_ids").get((subject_name, teacher_db_id))
+    
+    def id_by_code(self, subject_code, exclude_id=None):
+        """Return the id of the subject with a given code"""
+        return self._id_by("subjects", "subject_code", subject_code, exclude_id)
+    
+    def add(self, subject_code, subject_name, teacher_db_id, class_name, credits):
+        """Insert a subject and return its id"""
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO subjects (subject_code, subject_name, teacher_id, class, credits)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (subject_code, subject_name, teacher_db_id, class_name, credits))
+            self._sync_enrollments("subject_id", "?", (cursor.lastrowid,))
+        self.reference.invalidate()
+        return cursor.lastrowid
+    
+    def update(self, subject_db_id, subject_code, subject_name, teacher_db_id, class_name, credits):
+        """Update a subject"""
+        with self.conn:
+            self.conn.execute('''
+                UPDATE subjects
+                SET subject_code = ?, subject_name = ?, teacher_id = ?, class = ?, credits = ?
+                WHERE id = ?
+            ''', (subject_code, subject_name, teacher_db_id, class_name, credits, subject_db_id))
+            self._sync_enrollments("subject_id", "?", (subject_db_id,))
+        self.reference.invalidate()
+    
+    def delete(self, subject_db_id):
+        """Delete a subject with its results"""
+        with self.conn:
+            self.conn.execute("DELETE FROM results WHERE subject_id = ?", (subject_db_id,))
+            self.conn.execute("DELETE FROM enrollments WHERE subject_id = ?", (subject_db_id,))
+            self.conn.execute("DELETE FROM subjects WHERE id = ?", (subject_db_id,))
+        self.reference.invalidate()
+
+
+class ClassRepo(Repo):
+    def get(self, class_db_id):
+        """Return the full class record"""
+        return self._record("SELECT * FROM classes WHERE id = ?", (class_db_id,))
+    
+    def names(self):
+        """Return all class names in order"""
+        return list(self.reference.get(self.conn, "classes"))
+    
+    def list(self):
+        """Return all classes with their head-count for the admin list"""
+        return self._all('''
+            SELECT c.id, c.class_name, c.level, c.capacity, c.year,
+                   COALESCE(n.student_count, 0)
+            FROM classes c
+            LEFT JOIN (SELECT class_id, COUNT(*) AS student_count
+                       FROM students
+                       WHERE class_id IS NOT NULL
+                       GROUP BY class_id) n ON n.class_id = c.id
+            ORDER BY c.class_name
+        ''')
+    
+    def id_by_name(self, class_name, exclude_id=None):
+        """Return the id of the class with a given name"""
+        return self._id_by("classes", "class_name", class_name, exclude_id)
+    
+    def student_count(self, class_db_id):
+        """Return the number of students in a class"""
+        return self._scalar("SELECT COUNT(*) FROM students WHERE class_id = ?", (class_db_id,))
+    
+    def add(self, class_name, level, capacity, year):
+        """Insert a class and return its id"""
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO classes (class_name, level, capacity, year)
+                VALUES (?, ?, ?, ?)
+            ''', (class_name, level, capacity, year))
+        self.reference.invalidate()
+        return cursor.lastrowid
+    
+    def update(self, class_db_id, old_class_name, class_name, level, capacity, year):
+        """Update a class, moving the subjects taught to it along when it is renamed
+        
+        Students reference the class by id, so they follow without being touched.
+        """
+        with self.conn:
+            self.conn.execute('''
+                UPDATE classes
+                SET class_name = ?, level = ?, capacity = ?, year = ?
+                WHERE id = ?
+            ''', (class_name, level, capacity, year, class_db_id))
+            
+            if old_class_name != class_name:
+                # Subjects still name their class; keeping them in step keeps
+                # the enrollments valid. Subjects that already named the new
+                # class without it existing now match it and need enrolling.
+                adopted = self._column("SELECT id FROM subjects WHERE class = ?", (class_name,))
+                self.conn.execute(
+                    "UPDATE subjects SET class = ? WHERE class = ?",
+                    (class_name, old_class_name)
+                )
+                if adopted:
+                    self._sync_enrollments(
+                        "subject_id", ", ".join("?" * len(adopted)), adopted)
+        self.reference.invalidate()
+    
+    def delete(self, class_db_id):
+        """Delete a class no student belongs to
+        
+        Raises sqlite3.IntegrityError if students still reference it. The check
+        is part of the DELETE, so no student can join the class in between.
+        """
+        with self.conn:
+            cursor = self.conn.execute('''
+                DELETE FROM classes
+                WHERE id = ? AND NOT EXISTS (SELECT 1 FROM students WHERE class_id = ?)
+            ''', (class_db_id, class_db_id))
+            if cursor.rowcount == 0 and self.get(class_db_id) is not None:
+                raise sqlite3.IntegrityError("Class still has students")
+        self.reference.invalidate()
+
+
+class ResultRepo(Repo):
+    # A graded student stays on the subject's roster even if their class changes
+    ENROLL = "INSERT OR IGNORE INTO enrollments (student_id, subject_id) VALUES (?, ?)"
+    
+    def for_student(self, student_db_id):
+        """Return a student's results, newest first"""
+        return self._all('''
+            SELECT
+                sub.subject_name,
+                r.grade,
+                r.exam_type,
+                r.semester,
+                r.academic_year,
+                r.date,
+                t.name
+            FROM results r
+            LEFT JOIN subjects sub ON r.subject_id = sub.id
+            LEFT JOIN teachers t ON r.teacher_id = t.id
+            WHERE r.student_id = ?
+            ORDER BY r.date DESC
+        ''', (student_db_id,))
+    
+    def student_stats(self, student_db_id):
+        """Return (count, average, min, max) of a student's grades
+        
+        Read from student_grade_summary: one row per subject and teacher.
+        """
+        return self._one('''
+            SELECT COALESCE(SUM(result_count), 0), SUM(grade_sum) / SUM(result_count),
+                   MIN(grade_min), MAX(grade_max)
+            FROM student_grade_summary
+            WHERE student_id = ?
+        ''', (student_db_id,))
+    
+    def for_teacher(self, teacher_db_id, subject_name=None, class_name=None, search=None):
+        """Return a teacher's results (id first), optionally filtered by subject and class
+        
+        With search, only results whose remarks or student match the text are
+        returned. bm25 scores from different tables do not compare, so each
+        table's matches are ranked on their own and the two rankings
+        interleaved: best remark match and best student match first.
+        """
+        search = match_query(search) if search else None
+        
+        def build():
+            query = '''
+                SELECT r.id, stu.name, stu.student_id, sub.subject_name, r.grade,
+                       r.exam_type, r.date, r.remarks
+                FROM results r
+            '''
+            if search is not None:
+                query += '''
+                JOIN (SELECT id, MIN(position) AS position
+                      FROM (SELECT r2.id, DENSE_RANK() OVER (ORDER BY f.rank) AS position
+                            FROM results_fts f
+                            JOIN results r2 ON r2.id = f.rowid
+                            WHERE results_fts MATCH ? AND r2.teacher_id = ?
+                            UNION ALL
+                            SELECT r2.id, DENSE_RANK() OVER (ORDER BY f.rank)
+                            FROM students_fts f
+                            JOIN results r2 ON r2.student_id = f.rowid
+                            WHERE students_fts MATCH ? AND r2.teacher_id = ?)
+                      GROUP BY id) m ON m.id = r.id
+                '''
+            query += '''
+                JOIN students stu ON r.student_id = stu.id
+                JOIN subjects sub ON r.subject_id = sub.id
+                WHERE r.teacher_id = ?
+            '''
+            if subject_name is not None:
+                query += " AND sub.subject_name = ?"
+            if class_name is not None:
+                query += " AND stu.class_id = (SELECT id FROM classes WHERE class_name = ?)"
+            if search is not None:
+                return query + " ORDER BY m.position, r.date DESC, r.id DESC"
+            return query + " ORDER BY r.date DESC, r.id DESC"
+        
+        sql = self.statements.get(
+            ("results_for_teacher", subject_name is not None, class_name is not None,
+             search is not None), build
+        )
+        params = [search, teacher_db_id] * 2 if search is not None else []
+        params += [teacher_db_id] + [p for p in (subject_name, class_name) if p is not None]
+        return self._all(sql, params)
+    
+    def classes_for_teacher(self, teacher_db_id):
+        """Return the classes of the students a teacher has graded"""
+        return self._column('''
+            SELECT c.class_name FROM classes c
+            WHERE EXISTS (SELECT 1 FROM results r
+                          JOIN students stu ON r.student_id = stu.id
+                          WHERE r.teacher_id = ? AND stu.class_id = c.id)
+            ORDER BY c.class_name
+        ''', (teacher_db_id,))
+    
+    def teacher_stats(self, teacher_db_id):
+        """Return (distinct students, average grade, result count) for a teacher"""
+        return self._one('''
+            SELECT COUNT(DISTINCT student_id),
+                   SUM(grade_sum) / SUM(result_count),
+                   COALESCE(SUM(result_count), 0)
+            FROM student_grade_summary
+            WHERE teacher_id = ?
+        ''', (teacher_db_id,))
+    
+    def student_averages(self, teacher_db_id):
+        """Return each student a teacher graded with their last result date and average"""
+        return self._all('''
+            SELECT
+                stu.student_id, stu.name, c.class_name, stu.email, stu.phone,
+                MAX(g.last_date) as last_date,
+                SUM(g.grade_sum) / SUM(g.result_count) as avg_grade
+            FROM student_grade_summary g
+            JOIN students stu ON stu.id = g.student_id
+            LEFT JOIN classes c ON c.id = stu.class_id
+            WHERE g.teacher_id = ?
+            GROUP BY stu.id
+            ORDER BY stu.name
+        ''', (teacher_db_id,))
+    
+    def add(self, student_db_id, subject_db_id, teacher_db_id, grade, exam_type,
+            semester, academic_year, remarks):
+        """Insert a result and return its id"""
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO results (student_id, subject_id, teacher_id, grade,
+                                   exam_type, semester, academic_year, remarks)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (student_db_id, subject_db_id, teacher_db_id, grade,
+                 exam_type, semester, academic_year, remarks))
+            self.conn.execute(self.ENROLL, (student_db_id, subject_db_id))
+        return cursor.lastrowid
+    
+    def add_many(self, records):
+        """Insert result records in one transaction and return how many were inserted
+        
+        Each record is (student_id, subject_id, teacher_id, grade, exam_type,
+        semester, academic_year, remarks), with database ids.
+        """
+        with self.conn:
+            cursor = self.conn.executemany('''
+                INSERT INTO results (student_id, subject_id, teacher_id, grade,
+                                   exam_type, semester, academic_year, remarks)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', records)
+            inserted = cursor.rowcount
+            self.conn.executemany(self.ENROLL, {(record[0], record[1]) for record in records})
+        return inserted
+
+
+def week_start(day):
+    """Return the Monday of the ISO week of an ISO date, as attendance_weekly keys it"""
+    day = date.fromisoformat(day)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def term_range(term):
+    """Return the first and last ISO date of a term such as '2023-2024 Semester 1'"""
+    years, semester = term.split(" ", 1)
+    first_year = int(years.split("-")[0])
+    if semester == "Semester 1":
+        return f"{first_year}-09-01", f"{first_year + 1}-01-31"
+    return f"{first_year + 1}-02-01", f"{first_year + 1}-08-31"
+
+
+def date_range(start, end):
+    """Return the ISO dates from start to end inclusive (YYYY-MM-DD strings)"""
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    if last < first:
+        raise ValueError("End date is before start date")
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+
+class AttendanceRepo(Repo):
+    # Relies on the unique (student_id, date, IFNULL(subject_id, 0)) key from migration 3,
+    # which unlike a plain subject_id column also matches records without a subject
+    UPSERT = '''
+        INSERT INTO attendance (student_id, date, subject_id, status, remarks)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (student_id, date, IFNULL(subject_id, 0))
+        DO UPDATE SET status = excluded.status, remarks = excluded.remarks
+    '''
+    
+    def for_student(self, student_db_id, first, last, subject_db_id=None):
+        """Return a student's attendance records from first to last inclusive, newest first
+        
+        The drill-down behind a rollup row: pass subject_db_id (0 for records
+        without a subject) to narrow it to one subject.
+        """
+        sql = self.statements.get(
+            ("attendance.for_student", subject_db_id is not None),
+            lambda: '''
+                SELECT a.date, s.subject_name, a.status, a.remarks
+                FROM attendance a
+                LEFT JOIN subjects s ON a.subject_id = s.id
+                WHERE a.student_id = ? AND a.date >= ? AND a.date <= ?
+            ''' + (" AND COALESCE(a.subject_id, 0) = ?" if subject_db_id is not None else "") +
+                  " ORDER BY a.date DESC"
+        )
+        params = (student_db_id, first, last) + ((subject_db_id,) if subject_db_id is not None else ())
+        return self._all(sql, params)
+    
+    def student_stats(self, student_db_id, term=None):
+        """Return (total, present, absent, late) for a student, from the term rollup"""
+        sql = self.statements.get(
+            ("attendance.student_stats", term is not None),
+            lambda: '''
+                SELECT COALESCE(SUM(total), 0), COALESCE(SUM(present), 0),
+                       COALESCE(SUM(absent), 0), COALESCE(SUM(late), 0)
+                FROM attendance_term
+                WHERE student_id = ?
+            ''' + (" AND term = ?" if term is not None else "")
+        )
+        return self._one(sql, (student_db_id,) + ((term,) if term is not None else ()))
+    
+    def terms(self, student_db_id):
+        """Return the terms a student has attendance in, latest first"""
+        return self._column(
+            "SELECT term FROM attendance_term WHERE student_id = ? ORDER BY term DESC",
+            (student_db_id,)
+        )
+    
+    def weekly(self, student_db_id, first=None, last=None):
+        """Return a student's weekly rollup, latest week first
+        
+        Rows are (week_start, subject_id, subject, present, absent, late, total);
+        first/last limit them to the weeks overlapping that date range.
+        """
+        if first is not None:
+            # A week starting up to six days earlier still overlaps the range
+            first = (date.fromisoformat(first) - timedelta(days=6)).isoformat()
+        return self._all('''
+            SELECT w.week_start, w.subject_id, COALESCE(s.subject_name, '-'),
+                   w.present, w.absent, w.late, w.total
+            FROM attendance_weekly w
+            LEFT JOIN subjects s ON w.subject_id = s.id
+            WHERE w.student_id = ?
+              AND w.week_start >= COALESCE(?, '') AND w.week_start <= COALESCE(?, '9999')
+            ORDER BY w.week_start DESC, s.subject_name
+        ''', (student_db_id, first, last))
+    
+    def class_week(self, class_name, subject_db_id, day):
+        """Return each student of a class with their counts for one subject in the week of day
+        
+        Rows are (id, student_id, name, present, absent, late, total).
+        """
+        return self._all('''
+            SELECT s.id, s.student_id, s.name,
+                   COALESCE(w.present, 0), COALESCE(w.absent, 0),
+                   COALESCE(w.late, 0), COALESCE(w.total, 0)
+            FROM students s
+            LEFT JOIN attendance_weekly w
+                   ON w.student_id = s.id AND w.subject_id = ? AND w.week_start = ?
+            WHERE s.class_id = (SELECT id FROM classes WHERE class_name = ?)
+            ORDER BY s.name
+        ''', (subject_db_id or 0, week_start(day), class_name))
+    
+    def upsert_many(self, records):
+        """Insert or update (student_id, date, subject_id, status, remarks) records
+        
+        One upsert statement through executemany, in a single transaction.
+        Returns (inserted, updated).
+        """
+        return self._counted_write(lambda: self.conn.executemany(self.UPSERT, records))
+    
+    def mark_classes(self, class_names, dates, subject_db_id, status, remarks=""):
+        """Mark every student of several classes on several dates, e.g. exam days
+        
+        Each date is one INSERT ... SELECT over the classes' students, all in a
+        single transaction. Returns (inserted, updated).
+        """
+        class_names, dates = list(class_names), list(dates)
+        if not class_names or not dates:
+            return 0, 0
+        sql = self.statements.get(
+            ("attendance.mark_classes", len(class_names)),
+            lambda: f'''
+                INSERT INTO attendance (student_id, date, subject_id, status, remarks)
+                SELECT id, ?, ?, ?, ? FROM students
+                WHERE class_id IN (SELECT id FROM classes
+                                   WHERE class_name IN ({", ".join("?" * len(class_names))}))
+                ON CONFLICT (student_id, date, IFNULL(subject_id, 0))
+                DO UPDATE SET status = excluded.status, remarks = excluded.remarks
+            '''
+        )
+        params = [(day, subject_db_id, status, remarks, *class_names) for day in dates]
+        return self._counted_write(lambda: self.conn.executemany(sql, params))
+    
+    def mark_range(self, student_db_ids, start, end, subject_db_id, status, remarks=""):
+        """Mark the given students on every date from start to end inclusive
+        
+        Returns (inserted, updated).
+        """
+        records = [(student_db_id, day, subject_db_id, status, remarks)
+                   for day in date_range(start, end)
+                   for student_db_id in student_db_ids]
+        return self.upsert_many(records)
+    
+    def _counted_write(self, write):
+        """Run write() in an explicit transaction and return (inserted, updated)
+        
+        Ids are AUTOINCREMENT, so rows above the previous maximum are exactly
+        the ones this transaction inserted; every other change was an update.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            last_id = self._scalar("SELECT COALESCE(MAX(id), 0) FROM attendance")
+            written = write().rowcount
+            inserted = self._scalar("SELECT COUNT(*) FROM attendance WHERE id > ?", (last_id,))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return inserted, written - inserted
+
+
+class StatsRepo(Repo):
+    """Row counts from stats_counters, which triggers keep current (migration 6)"""
+    TABLES = COUNTED_TABLES
+    
+    def counts(self, tables=TABLES):
+        """Return {table: row count} for the given tables with one query"""
+        unknown = set(tables) - set(self.TABLES)
+        if unknown:
+            raise ValueError(f"Unknown table: {', '.join(sorted(unknown))}")
+        counts = dict(self._all("SELECT table_name, row_count FROM stats_counters"))
+        return {table: counts.get(table, 0) for table in tables}
+    
+    def rebuild(self):
+        """Recompute stats_counters, student_grade_summary and the attendance rollups from the raw tables
+        
+        For recovery, e.g. after rows were changed with the triggers missing.
+        Returns the new row counts.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in self.TABLES:
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO stats_counters (table_name, row_count) "
+                    f"SELECT ?, COUNT(*) FROM {table}",
+                    (table,)
+                )
+            self.conn.execute("DELETE FROM student_grade_summary")
+            self.conn.execute('''
+                INSERT INTO student_grade_summary
+                SELECT student_id, subject_id, teacher_id,
+                       COUNT(*), SUM(grade), MIN(grade), MAX(grade), MAX(date)
+                FROM results
+                GROUP BY student_id, subject_id, teacher_id
+            ''')
+            for table in ATTENDANCE_ROLLUPS:
+                self.conn.execute(f"DELETE FROM {table}")
+                self.conn.execute(rollup_recount_sql(table))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return self.counts()
+
+
+class Repositories:
+    """All repositories over one connection, sharing a statement cache and the file's reference cache"""
+    
+    def __init__(self, conn, cache_size=STATEMENT_CACHE_SIZE):
+        self.conn = conn
+        self.statements = StatementCache(cache_size)
+        self.reference = reference_cache(conn)
+        shared = (self.statements, self.reference)
+        self.admins = AdminRepo(conn, *shared)
+        self.students = StudentRepo(conn, *shared)
+        self.teachers = TeacherRepo(conn, *shared)
+        self.subjects = SubjectRepo(conn, *shared)
+        self.classes = ClassRepo(conn, *shared)
+        self.results = ResultRepo(conn, *shared)
+        self.attendance = AttendanceRepo(conn, *shared)
+        self.stats = StatsRepo(conn, *shared)
@@ -0,0 +1,376 @@
+"""Threaded JSON API over the Massar database, for many clients at once
+
+Usage:
+    python main.py cli serve --host 0.0.0.0 [--port PORT] [--readers N]   (on the PC with the database)
+    python main.py --server http://SERVER:PORT                             (on every lab PC)
+
+Run it on a trusted LAN only. Requests are plain HTTP, so passwords and
+session tokens cross the network readable by anyone on it. The default host,
+127.0.0.1, only accepts clients on the server PC itself; --host 0.0.0.0
+listens on every network interface, which puts the login in reach of every
+machine that can route to the PC.
+
+Instead of each PC opening massar_system.db, the server process owns the
+database: one writer connection, on which writes are serialized by a lock,
+and a pool of read-only connections that in WAL mode read alongside it.
+
+Protocol (POST, JSON bodies):
+    /login  {"repo": "admins"|"students"|"teachers", "args": [user, password]}
+            -> {"result": what <repo>.authenticate returned, "token": ...}
+    /call   {"repo", "method", "args", "kwargs"} with "Authorization: Bearer <token>"
+            -> {"result": what the repository method returned}
+    /logout {} with "Authorization: Bearer <token>" -> {"result": null}
+The server hashes the password itself, so a stored hash is no use as one.
+Sessions end at logout or after SESSION_TIMEOUT seconds without a call.
+Failures return {"error": {"type": exception class name, "message"}}.
+Bodies over MAX_BODY_BYTES are refused with status 413.
+Records (sqlite3.Row) are sent as {"__columns__": [...], "__values__": [...]}.
+
+Only the repository methods listed in API can be called, each by the roles
+it lists. Students and teachers can only pass their own id where a method
+is keyed by one, and teachers only their own subjects, the students enrolled
+in them and the classes they teach.
+"""
+import json
+import logging
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import database
+from repository import Repositories
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Read-only connections; more let more slow reads run at once
+READERS = 4
+
+# Seconds a session may go without a call before it has to log in again
+SESSION_TIMEOUT = 30 * 60
+
+# Largest request body read; longer ones are refused before being read
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+READ, WRITE = "read", "write"
+
+# Roles that authenticate through each repository
+LOGIN_ROLES = {"admins": "admin", "students": "student", "teachers": "teacher"}
+
+
+def _roles(admin=False, teacher=False, student=False):
+    # role -> None (any arguments) or the rules its arguments must pass
+    roles = {"admin": None} if admin else {}
+    for role, rules in (("teacher", teacher), ("student", student)):
+        if rules is not False:
+            roles[role] = rules
+    return roles
+
+
+# Rules are (what, position, field): the argument at position must be the
+# caller's own id ("user"), or one of the teacher's subjects ("subject"),
+# students ("student") or classes ("class"). With a field the argument is a
+# list and the rule applies to every item ("each") or to that field of every
+# record.
+STUDENT_OWN = _roles(admin=True, student=[("user", 0, None)])
+TEACHER_OWN = _roles(admin=True, teacher=[("user", 0, None)])
+ADMIN = _roles(admin=True)
+
+# (repository, method) -> (READ or WRITE, roles allowed to call it)
+API = {
+    # Student dashboard
+    ("students", "header"): (READ, STUDENT_OWN),
+    ("students", "get"): (READ, STUDENT_OWN),
+    ("results", "for_student"): (READ, STUDENT_OWN),
+    ("results", "student_stats"): (READ, STUDENT_OWN),
+    ("attendance", "terms"): (READ, STUDENT_OWN),
+    ("attendance", "student_stats"): (READ, STUDENT_OWN),
+    ("attendance", "weekly"): (READ, STUDENT_OWN),
+    ("attendance", "for_student"): (READ, STUDENT_OWN),
+    
+    # Teacher dashboard
+    ("teachers", "header"): (READ, TEACHER_OWN),
+    ("students", "for_teacher"): (READ, TEACHER_OWN),
+    ("subjects", "for_teacher"): (READ, TEACHER_OWN),
+    ("subjects", "names_for_teacher"): (READ, TEACHER_OWN),
+    ("subjects", "id_for"): (READ, _roles(admin=True, teacher=[("user", 1, None)])),
+    ("results", "for_teacher"): (READ, TEACHER_OWN),
+    ("results", "classes_for_teacher"): (READ, TEACHER_OWN),
+    ("results", "teacher_stats"): (READ, TEACHER_OWN),
+    ("results", "student_averages"): (READ, TEACHER_OWN),
+    ("students", "class_names_for_teacher"): (READ, TEACHER_OWN),
+    ("students", "in_class"): (READ, _roles(admin=True, teacher=[("class", 0, None)])),
+    ("attendance", "class_week"): (READ, _roles(admin=True, teacher=[("class", 0, None),
+                                                                     ("subject", 1, None)])),
+    ("results", "add"): (WRITE, _roles(admin=True, teacher=[("student", 0, None), ("subject", 1, None),
+                                                             ("user", 2, None)])),
+    ("results", "add_many"): (WRITE, _roles(admin=True, teacher=[("student", 0, 0), ("subject", 0, 1),
+                                                                  ("user", 0, 2)])),
+    ("attendance", "upsert_many"): (WRITE, _roles(admin=True, teacher=[("student", 0, 0),
+                                                                       ("subject", 0, 2)])),
+    ("attendance", "mark_range"): (WRITE, _roles(admin=True, teacher=[("student", 0, "each"),
+                                                                      ("subject", 3, None)])),
+    ("attendance", "mark_classes"): (WRITE, _roles(admin=True, teacher=[("class", 0, "each"),
+                                                                        ("subject", 2, None)])),
+    
+    # Admin dashboard
+    ("students", "class_names"): (READ, ADMIN),
+    ("students", "page"): (READ, ADMIN),
+    ("students", "search"): (READ, ADMIN),
+    ("students", "id_by"): (READ, ADMIN),
+    ("students", "add"): (WRITE, ADMIN),
+    ("students", "update"): (WRITE, ADMIN),
+    ("students", "delete"): (WRITE, ADMIN),
+    ("teachers", "get"): (READ, ADMIN),
+    ("teachers", "name"): (READ, ADMIN),
+    ("teachers", "page"): (READ, ADMIN),
+    ("teachers", "search"): (READ, ADMIN),
+    ("teachers", "options"): (READ, ADMIN),
+    ("teachers", "id_by"): (READ, ADMIN),
+    ("teachers", "add"): (WRITE, ADMIN),
+    ("teachers", "update"): (WRITE, ADMIN),
+    ("teachers", "delete"): (WRITE, ADMIN),
+    ("subjects", "get"): (READ, ADMIN),
+    ("subjects", "page"): (READ, ADMIN),
+    ("subjects", "id_by_code"): (READ, ADMIN),
+    ("subjects", "add"): (WRITE, ADMIN),
+    ("subjects", "update"): (WRITE, ADMIN),
+    ("subjects", "delete"): (WRITE, ADMIN),
+    ("classes", "get"): (READ, ADMIN),
+    ("classes", "names"): (READ, ADMIN),
+    ("classes", "list"): (READ, ADMIN),
+    ("classes", "id_by_name"): (READ, ADMIN),
+    ("classes", "student_count"): (READ, ADMIN),
+    ("classes", "add"): (WRITE, ADMIN),
+    ("classes", "update"): (WRITE, ADMIN),
+    ("classes", "delete"): (WRITE, ADMIN),
+    ("stats", "counts"): (READ, ADMIN),
+    ("stats", "rebuild"): (WRITE, ADMIN),
+}
+
+log = logging.getLogger("massar.server")
+
+
+class ApiError(Exception):
+    """A request the server refuses, with the HTTP status to answer it with"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _encode(value):
+    if isinstance(value, sqlite3.Row):
+        return {"__columns__": value.keys(), "__values__": tuple(value)}
+    raise TypeError(f"Cannot send {type(value).__name__} as JSON")
+
+
+def _rule_values(args, position, field):
+    """Return the values a rule checks, or None if the arguments lack that shape"""
+    if len(args) <= position:
+        return None
+    value = args[position]
+    if field is None:
+        return [value]
+    if not isinstance(value, list):
+        return None
+    if field == "each":
+        return value
+    if not all(isinstance(record, list) and len(record) > field for record in value):
+        return None
+    return [record[field] for record in value]
+
+
+def _owned(repos, what, user_id):
+    """Return the ids (or class names) of a kind the user may pass"""
+    if what == "user":
+        return {user_id}
+    if what == "subject":
+        return {row[0] for row in repos.subjects.for_teacher(user_id)}
+    if what == "student":
+        return {row[0] for row in repos.students.for_teacher(user_id)}
+    if what == "class":
+        return set(repos.students.class_names_for_teacher(user_id))
+    raise ValueError(f"Unknown rule: {what}")
+
+
+class MassarServer(ThreadingHTTPServer):
+    """HTTP server sharing one writer and a pool of reader connections between its threads"""
+    daemon_threads = True
+    # Pending connections the OS queues; the default of 5 drops bursts from a full lab
+    request_queue_size = 128
+    
+    def __init__(self, address, db_path=database.DB_PATH, readers=READERS, profile=None,
+                 session_timeout=SESSION_TIMEOUT):
+        if profile is None:
+            profile = database.load_storage_profile()
+        # Connections move between handler threads, but only one uses each at a time
+        self.writer = Repositories(database.connect(db_path, profile, check_same_thread=False))
+        self.write_lock = threading.Lock()
+        self.readers = queue.Queue()
+        for _ in range(readers):
+            conn = database.connect(db_path, profile, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            self.readers.put(Repositories(conn))
+        self.reader_count = readers
+        
+        self.sessions = {}          # token -> [role, user id, time of the last call]
+        self.sessions_lock = threading.Lock()
+        self.session_timeout = session_timeout
+        super().__init__(address, ApiHandler)
+    
+    def run(self, kind, func):
+        """Return func(repos) run on the writer or on a free reader"""
+        if kind == WRITE:
+            with self.write_lock:
+                try:
+                    return func(self.writer)
+                except Exception:
+                    # Leave no transaction open for the next writer
+                    if self.writer.conn.in_transaction:
+                        self.writer.conn.rollback()
+                    raise
+        repos = self.readers.get()
+        try:
+            return func(repos)
+        finally:
+            self.readers.put(repos)
+    
+    def login(self, request):
+        """Authenticate and open a session"""
+        repo, args = request.get("repo"), request.get("args", [])
+        role = LOGIN_ROLES.get(repo)
+        if role is None:
+            raise ApiError(404, f"Cannot log in through {repo}")
+        if not (isinstance(args, list) and len(args) == 2 and all(isinstance(arg, str) for arg in args)):
+            raise ApiError(400, "Log in with [user, password]")
+        username, hashed_password = args[0], database.hash_password(args[1])
+        result = self.run(READ, lambda repos: getattr(repos, repo).authenticate(username, hashed_password))
+        if not result:
+            return {"result": result}
+        
+        user_id = result if isinstance(result, int) else result[0]
+        token = secrets.token_urlsafe(24)
+        with self.sessions_lock:
+            self._expire_sessions()
+            self.sessions[token] = [role, user_id, time.monotonic()]
+        return {"result": result, "token": token}
+    
+    def logout(self, token):
+        """End the session behind token"""
+        with self.sessions_lock:
+            self.sessions.pop(token, None)
+        return {"result": None}
+    
+    def _expire_sessions(self):
+        # Called with sessions_lock held, on every login, so the table only
+        # ever holds the sessions used within the timeout
+        oldest = time.monotonic() - self.session_timeout
+        for token in [token for token, session in self.sessions.items() if session[2] < oldest]:
+            del self.sessions[token]
+    
+    def call(self, token, request):
+        """Run one repository method for the session behind token"""
+        now = time.monotonic()
+        with self.sessions_lock:
+            session = self.sessions.get(token)
+            if session is not None and session[2] < now - self.session_timeout:
+                del self.sessions[token]
+                raise ApiError(401, "Session expired; log in again")
+            if session is not None:
+                session[2] = now
+        if session is None:
+            raise ApiError(401, "Not logged in")
+        role, user_id, _ = session
+        
+        repo, method = request.get("repo"), request.get("method")
+        args, kwargs = request.get("args", []), request.get("kwargs", {})
+        entry = API.get((repo, method))
+        if entry is None:
+            raise ApiError(404, f"Unknown operation: {repo}.{method}")
+        kind, roles = entry
+        if role not in roles:
+            raise ApiError(403, f"{role} cannot call {repo}.{method}")
+        rules = roles[role]
+        if rules is not None and not self.allowed(rules, args, user_id):
+            raise ApiError(403, f"{repo}.{method} is limited to your own records")
+        
+        return {"result": self.run(kind, lambda repos: getattr(getattr(repos, repo), method)(*args, **kwargs))}
+    
+    def allowed(self, rules, args, user_id):
+        """Return True if the arguments pass every rule for user_id"""
+        values = [_rule_values(args, position, field) for _, position, field in rules]
+        if any(value is None for value in values):
+            return False
+        
+        def check(repos):
+            owned = {}
+            for (what, _, _), checked in zip(rules, values):
+                if what not in owned:
+                    owned[what] = _owned(repos, what, user_id)
+                if not all(value in owned[what] for value in checked):
+                    return False
+            return True
+        return self.run(READ, check)
+    
+    def server_close(self):
+        super().server_close()
+        self.writer.conn.close()
+        for _ in range(self.reader_count):
+            self.readers.get().conn.close()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Answers /login, /call and /logout; one request per connection"""
+    
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ApiError(400, "Invalid Content-Length")
+            if length > MAX_BODY_BYTES:
+                raise ApiError(413, f"Request body is over {MAX_BODY_BYTES} bytes")
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ApiError(400, "Request body must be a JSON object")
+            if self.path == "/login":
+                reply = self.server.login(request)
+            elif self.path == "/call":
+                reply = self.server.call(self._token(), request)
+            elif self.path == "/logout":
+                reply = self.server.logout(self._token())
+            else:
+                raise ApiError(404, f"No such endpoint: {self.path}")
+            status = 200
+        except ApiError as e:
+            status, reply = e.status, self._error(e)
+        except (TypeError, ValueError) as e:
+            # Malformed JSON, wrong arguments or values the method rejects
+            status, reply = 400, self._error(e)
+        except sqlite3.IntegrityError as e:
+            status, reply = 409, self._error(e)
+        except sqlite3.Error as e:
+            status, reply = 500, self._error(e)
+        except Exception as e:
+            log.exception("Error handling %s", self.path)
+            status, reply = 500, self._error(e)
+        
+        body = json.dumps(reply, default=_encode).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _token(self):
+        auth = self.headers.get("Authorization", "")
+        return auth[len("Bearer "):] if auth.startswith("Bearer ") else None
+    
+    def _error(self, error):
+        return {"error": {"type": type(error).__name__, "message": str(error)}}
+    
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)
@@ -0,0 +1,63 @@
+"""Shared fixtures: throwaway databases in pytest's tmp_path and a hidden Tk window"""
+import tkinter
+
+import pytest
+
+import database
+from repository import Repositories
+
+
+@pytest.fixture
+def profile():
+    return dict(database.DEFAULT_STORAGE_PROFILE)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "massar.db")
+
+
+@pytest.fixture
+def conn(db_path, profile):
+    """A connection to a new database migrated to the current schema"""
+    conn = database.connect(db_path, profile)
+    database.migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def repos(conn):
+    return Repositories(conn)
+
+
+@pytest.fixture
+def school(repos):
+    """Two classes, each with a teacher teaching it one subject and one student
+    
+    Returns {"T1": teacher id, "SUB1": subject id, "S1": student id, ...}.
+    """
+    ids = {}
+    for number, class_name in ((1, "1A"), (2, "2B")):
+        repos.classes.add(class_name, "1", 30, "2025-2026")
+        teacher = ids[f"T{number}"] = repos.teachers.add(
+            f"T{number}", f"Teacher {number}", f"t{number}@school.ma",
+            database.hash_password("1234"), f"Subject {number}", "", "")
+        ids[f"SUB{number}"] = repos.subjects.add(f"SUB{number}", f"Subject {number}", teacher, class_name, 2)
+        ids[f"S{number}"] = repos.students.add(
+            f"S{number}", f"CNE{number}", f"Student {number}", f"s{number}@school.ma",
+            database.hash_password("1234"), class_name, "2010-01-01", "", "")
+    return ids
+
+
+@pytest.fixture
+def tk_root():
+    """A withdrawn ttkbootstrap window; tests using it are skipped without a display"""
+    ttk = pytest.importorskip("ttkbootstrap")
+    try:
+        root = ttk.Window()
+    except tkinter.TclError as e:
+        pytest.skip(f"No display: {e}")
+    root.withdraw()
+    yield root
+    root.destroy()
@@ -0,0 +1,74 @@
+import pytest
+
+import database
+
+
+def statuses(conn):
+    return conn.execute("SELECT student_id, date, subject_id, status FROM attendance ORDER BY id").fetchall()
+
+
+def test_upsert_many_counts_inserts_and_updates(repos, school):
+    s1, s2, subject = school["S1"], school["S2"], school["SUB1"]
+    records = [(s1, "2025-10-06", subject, "Present", ""), (s2, "2025-10-06", subject, "Absent", "")]
+    assert repos.attendance.upsert_many(records) == (2, 0)
+    
+    records = [(s1, "2025-10-06", subject, "Late", ""), (s1, "2025-10-07", subject, "Present", "")]
+    assert repos.attendance.upsert_many(records) == (1, 1)
+    assert statuses(repos.conn) == [(s1, "2025-10-06", subject, "Late"),
+                                    (s2, "2025-10-06", subject, "Absent"),
+                                    (s1, "2025-10-07", subject, "Present")]
+
+
+def test_upsert_without_subject_updates_in_place(repos, school):
+    s1 = school["S1"]
+    assert repos.attendance.upsert_many([(s1, "2025-10-06", None, "Absent", "")]) == (1, 0)
+    assert repos.attendance.upsert_many([(s1, "2025-10-06", None, "Present", "")]) == (0, 1)
+    
+    assert statuses(repos.conn) == [(s1, "2025-10-06", None, "Present")]
+    assert repos.stats.counts(["attendance"]) == {"attendance": 1}
+    assert repos.attendance.student_stats(s1) == (1, 1, 0, 0)
+
+
+def test_mark_range(repos, school):
+    s1, s2, subject = school["S1"], school["S2"], school["SUB1"]
+    assert repos.attendance.mark_range([s1, s2], "2025-10-06", "2025-10-08", subject, "Present") == (6, 0)
+    assert repos.attendance.mark_range([s1], "2025-10-08", "2025-10-09", subject, "Absent") == (1, 1)
+    assert repos.attendance.student_stats(s1) == (4, 2, 2, 0)
+    
+    with pytest.raises(ValueError):
+        repos.attendance.mark_range([s1], "2025-10-09", "2025-10-08", subject, "Absent")
+    with pytest.raises(ValueError):
+        repos.attendance.mark_range([s1], "2025-13-01", "2025-13-02", subject, "Absent")
+    assert repos.stats.counts(["attendance"]) == {"attendance": 7}
+
+
+def test_mark_classes(repos, school):
+    s1, s2, subject = school["S1"], school["S2"], school["SUB1"]
+    days = ["2025-10-06", "2025-10-09"]
+    assert repos.attendance.mark_classes(["1A", "2B"], days, subject, "Present") == (4, 0)
+    assert repos.attendance.mark_classes(["2B"], days, subject, "Absent", "exam") == (0, 2)
+    assert repos.attendance.mark_classes([], days, subject, "Absent") == (0, 0)
+    
+    assert repos.attendance.student_stats(s1) == (2, 2, 0, 0)
+    assert repos.attendance.student_stats(s2) == (2, 0, 2, 0)
+    assert repos.stats.counts(["attendance"]) == {"attendance": 4}
+
+
+def test_migration_collapses_duplicates_without_subject(db_path, profile, monkeypatch):
+    conn = database.connect(db_path, profile)
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "MIGRATIONS", database.MIGRATIONS[:2])
+        patch.setattr(database, "SCHEMA_VERSION", 2)
+        database.migrate(conn)
+    with conn:
+        conn.execute("INSERT INTO students (student_id, name, password) VALUES ('S1', 'Amina', 'x')")
+        conn.executemany(
+            "INSERT INTO attendance (student_id, date, status, subject_id) VALUES (1, '2025-10-06', ?, NULL)",
+            [("Absent",), ("Late",), ("Present",)]
+        )
+    
+    database.migrate(conn)
+    
+    assert statuses(conn) == [(1, "2025-10-06", None, "Present")]
+    assert database.check_indexes(conn) == []
+    conn.close()
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import backup
+
+NOW = datetime(2025, 10, 6, 10, 15, 0)
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return dict(backup.DEFAULT_BACKUP_SETTINGS, directory=str(tmp_path / "backups"))
+
+
+def add_student(repos, number):
+    repos.students.add(f"S{number}", f"CNE{number}", f"Student {number}", f"s{number}@school.ma",
+                       "x", "1A", "", "", "")
+
+
+def restored_students(settings, name, tmp_path):
+    path = backup.prepare_restore(settings["directory"], name, str(tmp_path / "restored.db"))
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT student_id FROM students ORDER BY id")]
+    finally:
+        conn.close()
+        os.remove(path)
+
+
+def test_full_then_incremental_restore(repos, school, settings, tmp_path):
+    full, removed = backup.create_backup(repos.conn, settings, now=NOW)
+    assert (full["kind"], full["base"], removed) == ("full", None, [])
+    
+    add_student(repos, 3)
+    incremental, _ = backup.create_backup(repos.conn, settings, now=NOW + timedelta(hours=1))
+    assert (incremental["kind"], incremental["base"]) == ("incremental", full["name"])
+    assert incremental["changed_pages"] < incremental["page_count"]
+    
+    assert restored_students(settings, full["name"], tmp_path) == ["S1", "S2"]
+    assert restored_students(settings, incremental["name"], tmp_path) == ["S1", "S2", "S3"]
+    # Only backup files are left behind
+    assert sorted(os.listdir(settings["directory"])) == sorted([
+        full["name"] + ".json", full["data"], full["hashes"],
+        incremental["name"] + ".json", incremental["data"]])
+
+
+def test_full_backup_after_interval(repos, school, settings):
+    backup.create_backup(repos.conn, settings, now=NOW)
+    later = NOW + timedelta(days=settings["full_interval_days"])
+    manifest, _ = backup.create_backup(repos.conn, settings, now=later)
+    assert manifest["kind"] == "full"
+
+
+def test_backups_in_the_same_second_keep_their_own_files(repos, school, settings, tmp_path):
+    settings["full_interval_days"] = 0      # every backup is a full one
+    first, _ = backup.create_backup(repos.conn, settings, now=NOW)
+    add_student(repos, 3)
+    second, removed = backup.create_backup(repos.conn, settings, now=NOW.replace(microsecond=1))
+    
+    assert first["name"] != second["name"]
+    # Retention keeps the newest full backup of the day
+    assert removed == [first["name"]]
+    assert restored_students(settings, second["name"], tmp_path) == ["S1", "S2", "S3"]
+
+
+def test_failed_backup_leaves_others_alone(repos, school, settings, tmp_path, monkeypatch):
+    settings["full_interval_days"] = 0
+    first, _ = backup.create_backup(repos.conn, settings, now=NOW)
+    
+    def fail(snapshot, directory, name, page_size, compression):
+        open(os.path.join(directory, name + ".db.gz"), "wb").close()
+        raise OSError("disk full")
+    monkeypatch.setattr(backup, "_write_full", fail)
+    with pytest.raises(OSError):
+        backup.create_backup(repos.conn, settings, now=NOW)
+    
+    assert restored_students(settings, first["name"], tmp_path) == ["S1", "S2"]
+    assert sorted(os.listdir(settings["directory"])) == sorted([
+        first["name"] + ".json", first["data"], first["hashes"]])
+
+
+def test_name_in_use_by_a_running_backup_is_skipped(repos, school, settings):
+    os.makedirs(settings["directory"])
+    stamp = f"massar_{NOW.strftime('%Y%m%d_%H%M%S')}"
+    running = os.path.join(settings["directory"], f".{stamp}.lock")
+    open(running, "w").close()
+    
+    manifest, _ = backup.create_backup(repos.conn, settings, now=NOW)
+    
+    assert manifest["name"] == f"{stamp}_2_full"
+    assert os.path.exists(running)
+
+
+def test_damaged_backup_is_refused(repos, school, settings, tmp_path):
+    settings["compression"] = "none"
+    full, _ = backup.create_backup(repos.conn, settings, now=NOW)
+    with open(os.path.join(settings["directory"], full["data"]), "r+b") as f:
+        f.seek(200)
+        f.write(b"\xff" * 16)
+    
+    target = str(tmp_path / "restored.db")
+    with pytest.raises(backup.BackupError, match="checksum"):
+        backup.prepare_restore(settings["directory"], full["name"], target)
+    assert not os.path.exists(target + ".restore")
+
+
+def test_swap_in_replaces_database(repos, school, settings, tmp_path):
+    full, _ = backup.create_backup(repos.conn, settings, now=NOW)
+    target = str(tmp_path / "live.db")
+    with open(target, "wb") as f:
+        f.write(b"old")
+    open(target + "-wal", "wb").close()
+    
+    backup.swap_in(backup.prepare_restore(settings["directory"], full["name"], target), target)
+    
+    assert not os.path.exists(target + "-wal")
+    conn = sqlite3.connect(target)
+    assert conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 2
+    conn.close()
+
+
+def test_backup_to_copies_in_one_step_after_repeated_restarts(repos, school, db_path, tmp_path):
+    other = sqlite3.connect(db_path)
+    calls = []
+    
+    def progress(copied, total):
+        calls.append((copied, total))
+        # A write from another connection restarts the stepwise copy
+        with other:
+            other.execute("INSERT INTO classes (class_name) VALUES (?)", (f"X{len(calls)}",))
+    
+    target = str(tmp_path / "copy.db")
+    backup.backup_to(repos.conn, target, pages=1, pause=0, progress=progress)
+    other.close()
+    
+    assert calls[-1] == (1, 1)
+    assert len(calls) > backup.MAX_RESTARTS
+    conn = sqlite3.connect(target)
+    assert backup.integrity_errors(conn) == []
+    # Everything written before the final single-step copy is in it
+    assert conn.execute("SELECT COUNT(*) FROM classes").fetchone()[0] == 2 + len(calls) - 1
+    conn.close()
+
+
+def test_backup_to_removes_a_copy_that_fails_verification(repos, school, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "integrity_errors", lambda conn: ["page 3 is never used"])
+    target = str(tmp_path / "copy.db")
+    
+    with pytest.raises(backup.BackupError, match="page 3 is never used"):
+        backup.backup_to(repos.conn, target, pause=0)
+    
+    assert not os.path.exists(target)
+    assert not os.path.exists(target + ".part")
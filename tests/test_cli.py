@@ -0,0 +1,72 @@
+"""Exit codes and output of the headless command line"""
+import csv
+import os
+
+import pytest
+
+import cli
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in tmp_path, so no massar_config.json applies and backups land there"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("student_id", "cne", "name", "email", "password", "class"))
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_missing_database_fails(workdir, capsys):
+    assert cli.main(["--db", str(workdir / "typo.db"), "stats"]) == cli.EXIT_FAILED
+    assert "does not exist" in capsys.readouterr().err
+    assert not os.path.exists(workdir / "typo.db")
+
+
+def test_bad_arguments_exit_with_2(workdir, db_path, conn):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(["--db", db_path, "frobnicate"])
+    assert exit_info.value.code == 2
+
+
+def test_stats_and_recount(workdir, db_path, school, capsys):
+    assert cli.main(["--db", db_path, "stats"]) == cli.EXIT_OK
+    assert "students: 2" in capsys.readouterr().out.splitlines()
+    
+    assert cli.main(["--db", db_path, "stats", "--recount"]) == cli.EXIT_OK
+    assert "classes: 2" in capsys.readouterr().out.splitlines()
+
+
+def test_check_reports_missing_indexes(workdir, db_path, conn, capsys):
+    assert cli.main(["--db", db_path, "check"]) == cli.EXIT_OK
+    assert "Database is sound" in capsys.readouterr().out
+    
+    with conn:
+        conn.execute("DROP INDEX idx_results_subject")
+    assert cli.main(["--db", db_path, "check"]) == cli.EXIT_PROBLEMS
+    assert "Missing index: idx_results_subject ON results (subject_id)" in capsys.readouterr().out
+
+
+def test_import_exit_code_reflects_rejected_rows(workdir, db_path, school, capsys):
+    good = write_csv(workdir / "good.csv", [("S10", "CNE10", "Salma", "", "", "1A")])
+    assert cli.main(["--db", db_path, "import", good]) == cli.EXIT_OK
+    
+    bad = write_csv(workdir / "bad.csv", [("S1", "CNE11", "Duplicate", "", "", "")])
+    assert cli.main(["--db", db_path, "import", bad]) == cli.EXIT_PROBLEMS
+    assert os.path.exists(workdir / "bad_errors.csv")
+    assert "Rejected rows are listed in" in capsys.readouterr().out
+
+
+def test_failed_command_exits_with_1(workdir, db_path, conn, capsys):
+    assert cli.main(["--db", db_path, "import", str(workdir / "missing.csv")]) == cli.EXIT_FAILED
+    assert capsys.readouterr().err.startswith("import failed:")
+
+
+def test_backup(workdir, db_path, school, capsys):
+    assert cli.main(["--db", db_path, "backup"]) == cli.EXIT_OK
+    assert any(name.endswith("_full.json") for name in os.listdir(workdir / "backups"))
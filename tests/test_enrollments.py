@@ -0,0 +1,57 @@
+"""The enrollments table kept in line with classes, subjects and results"""
+
+
+def enrolled(repos, subject):
+    return sorted(row[0] for row in repos.conn.execute(
+        "SELECT student_id FROM enrollments WHERE subject_id = ?", (subject,)))
+
+
+def move_student(repos, school, number, class_name):
+    repos.students.update(school[f"S{number}"], f"S{number}", f"CNE{number}", f"Student {number}",
+                          f"s{number}@school.ma", class_name, "2010-01-01", "", "")
+
+
+def test_students_are_enrolled_in_their_class_subjects(repos, school):
+    assert enrolled(repos, school["SUB1"]) == [school["S1"]]
+    assert enrolled(repos, school["SUB2"]) == [school["S2"]]
+    
+    repos.students.add_many([("S3", "CNE3", "Student 3", "s3@school.ma", "x", "2B", "", "", ""),
+                             ("S4", "CNE4", "Student 4", "s4@school.ma", "x", None, "", "", "")])
+    s3 = repos.students.id_by("student_id", "S3")
+    assert enrolled(repos, school["SUB2"]) == [school["S2"], s3]
+
+
+def test_changing_class_moves_enrollments_but_keeps_graded_subjects(repos, school):
+    repos.results.add(school["S1"], school["SUB1"], school["T1"], 14, "Normal", "Semester 1", "2025-2026", "")
+    
+    move_student(repos, school, 1, "2B")
+    move_student(repos, school, 2, "1A")
+    
+    # S1 keeps the subject they were graded in
+    assert enrolled(repos, school["SUB1"]) == [school["S1"], school["S2"]]
+    assert enrolled(repos, school["SUB2"]) == [school["S1"]]
+
+
+def test_subject_roster_follows_its_class(repos, school):
+    repos.subjects.update(school["SUB1"], "SUB1", "Subject 1", school["T1"], "2B", 2)
+    
+    assert enrolled(repos, school["SUB1"]) == [school["S2"]]
+    assert [row[0] for row in repos.students.for_teacher(school["T1"])] == [school["S2"]]
+
+
+def test_renaming_a_class_keeps_its_rosters(repos, school):
+    class_id = repos.classes.id_by_name("1A")
+    repos.classes.update(class_id, "1A", "1A-bis", "1", 30, "2025-2026")
+    
+    assert repos.subjects.get(school["SUB1"])["class"] == "1A-bis"
+    assert enrolled(repos, school["SUB1"]) == [school["S1"]]
+
+
+def test_renaming_onto_a_subject_class_enrolls_its_students(repos, school):
+    orphan = repos.subjects.add("SUB3", "Subject 3", school["T1"], "3C", 2)
+    assert enrolled(repos, orphan) == []
+    
+    repos.classes.update(repos.classes.id_by_name("2B"), "2B", "3C", "3", 30, "2025-2026")
+    
+    assert enrolled(repos, orphan) == [school["S2"]]
+    assert enrolled(repos, school["SUB2"]) == [school["S2"]]
@@ -0,0 +1,103 @@
+"""The background query executor, driven by a stand-in for the Tk root"""
+import threading
+import time
+
+import pytest
+
+import database
+from executor import QueryExecutor
+
+# Counts forever; only an interrupt ends it
+ENDLESS_QUERY = '''
+    WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n)
+    SELECT COUNT(*) FROM n
+'''
+
+
+class FakeRoot:
+    """Collects root.after calls so the test decides when they run"""
+    
+    def __init__(self):
+        self.pending = []
+    
+    def after(self, ms, func, *args):
+        self.pending.append((func, args))
+    
+    def run_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out"
+            pending, self.pending = self.pending, []
+            for func, args in pending:
+                func(*args)
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def root():
+    return FakeRoot()
+
+
+@pytest.fixture
+def executor(root, conn, db_path, profile):
+    busy = []
+    executor = QueryExecutor(root, lambda: database.connect(db_path, profile),
+                             on_busy=busy.append, poll_interval=0)
+    executor.busy_changes = busy
+    yield executor
+    executor.shutdown()
+
+
+def test_delivers_result_on_the_tk_thread(root, executor):
+    results = []
+    executor.submit(lambda repos: repos.stats.counts()["classes"], results.append)
+    
+    root.run_until(lambda: not executor.busy())
+    
+    assert results == [0]
+    assert executor.busy_changes == [True, False]
+
+
+def test_errors_go_to_on_error(root, executor):
+    errors = []
+    executor.submit(lambda repos: repos.conn.execute("SELECT * FROM missing"),
+                    on_error=errors.append)
+    
+    root.run_until(lambda: not executor.busy())
+    
+    assert "no such table" in str(errors[0])
+
+
+def test_newer_job_supersedes_queued_one(root, executor):
+    release = threading.Event()
+    results = []
+    executor.submit(lambda repos: release.wait(5))
+    executor.submit(lambda repos: "stale", results.append, key="filter")
+    executor.submit(lambda repos: "fresh", results.append, key="filter")
+    release.set()
+    
+    root.run_until(lambda: not executor.busy())
+    
+    assert results == ["fresh"]
+
+
+def test_newer_job_interrupts_running_one(root, executor):
+    started = threading.Event()
+    results, errors = [], []
+    
+    def endless(repos):
+        # Called from inside the running statement, so the interrupt cannot miss it
+        repos.conn.set_progress_handler(started.set, 1000)
+        try:
+            return repos.conn.execute(ENDLESS_QUERY).fetchone()
+        finally:
+            repos.conn.set_progress_handler(None, 0)
+    
+    executor.submit(endless, results.append, errors.append, key="filter")
+    assert started.wait(5)
+    executor.submit(lambda repos: "fresh", results.append, errors.append, key="filter")
+    
+    root.run_until(lambda: not executor.busy())
+    
+    assert results == ["fresh"]
+    assert errors == []
@@ -0,0 +1,56 @@
+import pytest
+
+import database
+import exporter
+import importer
+from repository import Repositories
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def sheet_rows(path, name):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [list(row) for row in workbook[name].iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def test_export_leaves_out_passwords(repos, school, tmp_path):
+    path = str(tmp_path / "export.xlsx")
+    sheets = exporter.export_tables(repos.conn, path)
+    
+    assert [table for table, _, _ in sheets] == ["students", "teachers", "subjects", "classes"]
+    students = sheet_rows(path, "students")
+    assert students[0] == ["id", "student_id", "cne", "name", "email", "class",
+                           "birth_date", "phone", "address", "created_at"]
+    assert [row[1:6] for row in students[1:]] == [
+        ["S1", "CNE1", "Student 1", "s1@school.ma", "1A"],
+        ["S2", "CNE2", "Student 2", "s2@school.ma", "2B"]]
+    assert "password" not in sheet_rows(path, "teachers")[0]
+
+
+def test_exported_students_import_again(repos, school, tmp_path, profile):
+    path = str(tmp_path / "export.xlsx")
+    exporter.export_tables(repos.conn, path, tables=["students"])
+    
+    conn = database.connect(str(tmp_path / "other.db"), profile)
+    database.migrate(conn)
+    other = Repositories(conn)
+    other.classes.add("1A", "1", 30, "2025-2026")
+    other.classes.add("2B", "1", 30, "2025-2026")
+    report = importer.import_students(conn, path, workers=0)
+    
+    assert (report.imported, report.errors) == (2, [])
+    assert conn.execute('''
+        SELECT s.student_id, c.class_name FROM students s JOIN classes c ON c.id = s.class_id
+    ''').fetchall() == [("S1", "1A"), ("S2", "2B")]
+    conn.close()
+
+
+def test_long_tables_continue_on_extra_sheets(repos, school, tmp_path):
+    path = str(tmp_path / "export.xlsx")
+    sheets = exporter.export_tables(repos.conn, path, tables=["students"], max_rows=2)
+    
+    assert sheets == [("students", "students", 1), ("students", "students_2", 1)]
+    assert sheet_rows(path, "students_2")[1][1] == "S2"
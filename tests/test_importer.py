@@ -0,0 +1,123 @@
+import concurrent.futures
+import csv
+import json
+
+import pytest
+
+import database
+import importer
+
+ROWS = [
+    ("S10", "CNE10", "Salma", "s10@school.ma", "", "1A"),
+    ("S11", "CNE11", "Hamza", "", "secret", ""),
+    ("S10", "CNE12", "Duplicate in file", "", "", ""),
+    ("S1", "CNE13", "Duplicate in database", "", "", ""),
+    ("S14", "CNE14", "Unknown class", "", "", "9Z"),
+    ("S15", "", "Missing cne", "", "", ""),
+    ("S16", "CNE16", "Short password", "", "abc", ""),
+]
+
+
+@pytest.fixture
+def students_csv(tmp_path):
+    path = tmp_path / "students.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("Student ID", "CNE", "Full Name", "email", "password", "class_name"))
+        writer.writerows(ROWS)
+        writer.writerow(())
+    return str(path)
+
+
+@pytest.fixture
+def no_pool(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("a process pool was started")
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", refuse)
+
+
+def student_ids(conn):
+    return [row[0] for row in conn.execute("SELECT student_id FROM students ORDER BY id")]
+
+
+def test_dry_run_reports_without_writing(repos, school, students_csv, no_pool):
+    report = importer.import_students(repos.conn, students_csv, dry_run=True)
+    
+    assert (report.total, report.imported) == (7, 2)
+    assert [(line, student_id) for line, student_id, _ in report.errors] == [
+        (4, "S10"), (5, "S1"), (6, "S14"), (7, "S15"), (8, "S16")]
+    assert "would be imported" in report.summary()
+    assert student_ids(repos.conn) == ["S1", "S2"]
+
+
+def test_import_writes_valid_rows(repos, school, students_csv, tmp_path, no_pool):
+    report = importer.import_students(repos.conn, students_csv, batch_size=1)
+    
+    assert (report.total, report.imported, len(report.errors)) == (7, 2, 5)
+    assert student_ids(repos.conn) == ["S1", "S2", "S10", "S11"]
+    rows = repos.conn.execute('''
+        SELECT s.email, s.password, c.class_name FROM students s
+        LEFT JOIN classes c ON c.id = s.class_id
+        WHERE s.student_id IN ('S10', 'S11') ORDER BY s.id
+    ''').fetchall()
+    assert rows == [("s10@school.ma", database.hash_password(importer.DEFAULT_PASSWORD), "1A"),
+                    (None, database.hash_password("secret"), None)]
+    assert repos.stats.counts(["students"]) == {"students": 4}
+    
+    errors_file = tmp_path / "errors.csv"
+    report.write_errors(str(errors_file))
+    assert errors_file.read_text(encoding="utf-8").splitlines()[0] == "line,student_id,error"
+    
+    # Importing the same file again only finds duplicates
+    again = importer.import_students(repos.conn, students_csv)
+    assert (again.imported, len(again.errors)) == (0, 7)
+
+
+def test_pool_only_for_large_files(repos, school, students_csv, monkeypatch):
+    started = []
+    
+    class Pool:
+        def __init__(self, max_workers):
+            started.append(max_workers)
+        
+        def map(self, func, items, chunksize):
+            return map(func, items)
+        
+        def shutdown(self):
+            pass
+    
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", Pool)
+    monkeypatch.setattr(importer, "POOL_MIN_ROWS", 2)
+    report = importer.import_students(repos.conn, students_csv, batch_size=1, workers=None)
+    
+    assert report.imported == 2
+    assert len(started) == 1
+
+
+def test_import_settings(tmp_path):
+    config = tmp_path / "massar_config.json"
+    config.write_text(json.dumps({"import": {"batch_size": 50}}))
+    assert importer.import_settings(str(config)) == (50, None)
+    
+    config.write_text(json.dumps({"import": {"batch_size": 50, "workers": 0}}))
+    assert importer.import_settings(str(config)) == (50, 0)
+    
+    config.write_text(json.dumps({"import": {"workers": -1}}))
+    with pytest.raises(ValueError):
+        importer.import_settings(str(config))
+
+
+def test_reads_xlsx(repos, school, tmp_path, no_pool):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = str(tmp_path / "students.xlsx")
+    workbook = openpyxl.Workbook()
+    workbook.active.append(("student_id", "cne", "name", "phone", "birthdate"))
+    workbook.active.append(("S20", 20, "Nora", 612345678.0, None))
+    workbook.save(path)
+    
+    report = importer.import_students(repos.conn, path)
+    
+    assert report.imported == 1
+    assert repos.conn.execute(
+        "SELECT cne, phone FROM students WHERE student_id = 'S20'"
+    ).fetchone() == ("20", "612345678")
@@ -0,0 +1,35 @@
+"""The managed secondary indexes and the startup index check"""
+import database
+
+
+def query_plan(conn, sql, params=()):
+    return " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def test_reports_dropped_index(conn):
+    with conn:
+        conn.execute("DROP INDEX idx_results_subject")
+    
+    assert database.check_indexes(conn) == ["idx_results_subject ON results (subject_id)"]
+
+
+def test_reports_index_that_differs_from_its_definition(conn):
+    with conn:
+        conn.execute("DROP INDEX idx_results_student_date")
+        conn.execute("CREATE INDEX idx_results_student_date ON results (student_id)")
+    
+    assert database.check_indexes(conn) == ["idx_results_student_date ON results (student_id, date)"]
+
+
+def test_existing_indexes_reports_expression_columns_as_none(conn):
+    assert database.existing_indexes(conn, "attendance")["idx_attendance_key"] == (
+        ("student_id", "date", None), True)
+
+
+def test_hot_queries_use_the_indexes(conn):
+    assert "idx_results_student_date" in query_plan(
+        conn, "SELECT * FROM results WHERE student_id = ? ORDER BY date DESC", (1,))
+    assert "idx_results_teacher_date" in query_plan(
+        conn, "SELECT * FROM results WHERE teacher_id = ? ORDER BY date DESC", (1,))
+    assert "idx_subjects_teacher" in query_plan(
+        conn, "SELECT * FROM subjects WHERE teacher_id = ?", (1,))
@@ -0,0 +1,172 @@
+import sqlite3
+
+import pytest
+
+import database
+from repository import Repositories
+
+# The tables as the app created them before schema versioning (user_version 0)
+BASELINE_SCHEMA = '''
+    CREATE TABLE students (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT UNIQUE NOT NULL,
+        cne TEXT UNIQUE,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE,
+        password TEXT NOT NULL,
+        class TEXT,
+        birth_date TEXT,
+        address TEXT,
+        phone TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE teachers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE,
+        password TEXT NOT NULL,
+        subject TEXT,
+        qualification TEXT,
+        phone TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE subjects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject_code TEXT UNIQUE NOT NULL,
+        subject_name TEXT NOT NULL,
+        teacher_id INTEGER,
+        class TEXT,
+        credits INTEGER,
+        FOREIGN KEY (teacher_id) REFERENCES teachers (id)
+    );
+    CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        subject_id INTEGER NOT NULL,
+        teacher_id INTEGER NOT NULL,
+        grade REAL NOT NULL,
+        exam_type TEXT,
+        semester TEXT,
+        academic_year TEXT,
+        remarks TEXT,
+        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (student_id) REFERENCES students (id),
+        FOREIGN KEY (subject_id) REFERENCES subjects (id),
+        FOREIGN KEY (teacher_id) REFERENCES teachers (id)
+    );
+    CREATE TABLE classes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        class_name TEXT UNIQUE NOT NULL,
+        level TEXT,
+        capacity INTEGER,
+        year TEXT
+    );
+    CREATE TABLE attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        status TEXT NOT NULL,
+        subject_id INTEGER,
+        remarks TEXT,
+        FOREIGN KEY (student_id) REFERENCES students (id),
+        FOREIGN KEY (subject_id) REFERENCES subjects (id)
+    );
+    CREATE TABLE admin (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        email TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+
+@pytest.fixture
+def baseline(db_path, profile):
+    """A database as the app left it before schema versioning, with some data"""
+    conn = database.connect(db_path, profile)
+    conn.executescript(BASELINE_SCHEMA)
+    with conn:
+        conn.execute("INSERT INTO classes (class_name) VALUES ('1A')")
+        conn.executemany(
+            "INSERT INTO students (student_id, name, email, password, class) VALUES (?, ?, ?, 'x', ?)",
+            [("S1", "Amina", "s1@school.ma", "1A"), ("S2", "Yassine", "s2@school.ma", "2B"),
+             ("S3", "Omar", "s3@school.ma", None)]
+        )
+        conn.execute("INSERT INTO teachers (teacher_id, name, password) VALUES ('T1', 'Karim', 'x')")
+        conn.execute("INSERT INTO subjects (subject_code, subject_name, teacher_id, class) "
+                     "VALUES ('MATH', 'Math', 1, '1A')")
+        conn.execute("INSERT INTO results (student_id, subject_id, teacher_id, grade) VALUES (2, 1, 1, 14)")
+        # Marked twice, once with and once without a subject
+        conn.executemany(
+            "INSERT INTO attendance (student_id, date, status, subject_id) VALUES (?, ?, ?, ?)",
+            [(1, "2025-10-06", "Absent", 1), (1, "2025-10-06", "Present", 1),
+             (1, "2025-10-07", "Absent", None), (1, "2025-10-07", "Late", None)]
+        )
+    yield conn
+    conn.close()
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_migrates_baseline_database(baseline):
+    applied = database.migrate(baseline)
+    
+    assert [m.version for m in applied] == [m.version for m in database.MIGRATIONS]
+    assert database.schema_version(baseline) == database.SCHEMA_VERSION
+    assert database.check_indexes(baseline) == []
+    assert "idx_students_class_name" not in database.existing_indexes(baseline, "students")
+    
+    # Students reference their class by id; classes only typed on students were created
+    assert "class" not in columns(baseline, "students")
+    assert baseline.execute('''
+        SELECT s.student_id, c.class_name FROM students s
+        LEFT JOIN classes c ON c.id = s.class_id ORDER BY s.id
+    ''').fetchall() == [("S1", "1A"), ("S2", "2B"), ("S3", None)]
+    
+    # Duplicate attendance collapsed to the latest row, with or without a subject
+    assert baseline.execute(
+        "SELECT date, status FROM attendance ORDER BY date"
+    ).fetchall() == [("2025-10-06", "Present"), ("2025-10-07", "Late")]
+    
+    repos = Repositories(baseline)
+    assert repos.stats.counts() == {"students": 3, "teachers": 1, "results": 1,
+                                    "subjects": 1, "classes": 2, "attendance": 2}
+    assert repos.attendance.student_stats(1) == (2, 1, 0, 1)
+    # S1 through its class, S2 through its result
+    assert baseline.execute("SELECT student_id FROM enrollments ORDER BY 1").fetchall() == [(1,), (2,)]
+    
+    assert database.migrate(baseline) == []
+
+
+def test_new_database_gets_current_schema(conn):
+    assert database.schema_version(conn) == database.SCHEMA_VERSION
+    assert database.check_indexes(conn) == []
+    assert "idx_students_class_name" not in database.existing_indexes(conn, "students")
+    assert "class" not in columns(conn, "students")
+
+
+def test_refuses_to_start_on_old_sqlite(baseline, monkeypatch):
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 31, 1))
+    
+    with pytest.raises(sqlite3.NotSupportedError, match="needs SQLite 3.35.0"):
+        database.migrate(baseline)
+    
+    # Nothing was applied
+    assert database.schema_version(baseline) == 0
+    assert "class" in columns(baseline, "students")
+
+
+def test_migrations_do_not_depend_on_the_managed_index_list(db_path, profile, monkeypatch):
+    conn = database.connect(db_path, profile)
+    managed = list(database.INDEXES)
+    monkeypatch.setattr(database, "INDEXES", [])
+    
+    database.migrate(conn)
+    
+    monkeypatch.setattr(database, "INDEXES", managed)
+    assert database.check_indexes(conn) == []
+    conn.close()
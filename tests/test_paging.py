@@ -0,0 +1,52 @@
+"""Keyset paging of the admin lists"""
+
+
+def add_students(repos, count):
+    return [repos.students.add(f"P{n}", f"PCNE{n}", f"Pupil {n}", f"p{n}@school.ma",
+                               "x", "1A", "", "", "")
+            for n in range(count)]
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_pages_forward_and_back_newest_first(repos):
+    added = add_students(repos, 5)
+    newest_first = added[::-1]
+    
+    first = repos.students.page(limit=2)
+    assert ids(first) == newest_first[:2]
+    second = repos.students.page(after=(first[-1][0],), limit=2)
+    assert ids(second) == newest_first[2:4]
+    last = repos.students.page(after=(second[-1][0],), limit=2)
+    assert ids(last) == newest_first[4:]
+    assert repos.students.page(after=(last[-1][0],), limit=2) == []
+    
+    # Back from the second page, still in display order
+    assert ids(repos.students.page(before=(second[0][0],), limit=2)) == newest_first[:2]
+    assert repos.students.page(before=(first[0][0],), limit=2) == []
+
+
+def test_subject_pages_split_equal_names_without_gaps(repos):
+    for n in range(5):
+        repos.subjects.add(f"C{n}", "Math" if n < 4 else "Arabic", None, None, 2)
+    
+    seen, after = [], None
+    while True:
+        page = repos.subjects.page(after=after, limit=2)
+        if not page:
+            break
+        seen.extend(page)
+        after = (page[-1][2], page[-1][0])
+    
+    assert [(row[2], row[1]) for row in seen] == [
+        ("Arabic", "C4"), ("Math", "C0"), ("Math", "C1"), ("Math", "C2"), ("Math", "C3")]
+
+
+def test_subject_pages_use_the_name_index(repos):
+    plan = repos.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM subjects WHERE (subject_name, id) > (?, ?) "
+        "ORDER BY subject_name, id LIMIT 2", ("Math", 1)).fetchall()
+    
+    assert "idx_subjects_name" in " ".join(row[-1] for row in plan)
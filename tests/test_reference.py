@@ -0,0 +1,82 @@
+import database
+import repository
+from repository import Repositories
+
+
+def count_loads(cache, monkeypatch):
+    loads = []
+    load = cache._load
+    monkeypatch.setattr(cache, "_load", lambda conn: loads.append(conn) or load(conn))
+    return loads
+
+
+def test_one_cache_per_database_file(repos, db_path, profile, tmp_path):
+    other = database.connect(db_path, profile)
+    elsewhere = database.connect(str(tmp_path / "elsewhere.db"), profile)
+    try:
+        assert Repositories(other).reference is repos.reference
+        assert Repositories(elsewhere).reference is not repos.reference
+    finally:
+        other.close()
+        elsewhere.close()
+
+
+def test_edits_through_any_connection_of_the_process_show_at_once(repos, school, db_path, profile):
+    other = database.connect(db_path, profile)
+    try:
+        assert Repositories(other).classes.names() == ["1A", "2B"]
+        repos.classes.add("3C", "3", 30, "2025-2026")
+        repos.subjects.add("SUB3", "Subject 3", school["T1"], "3C", 1)
+        assert Repositories(other).classes.names() == ["1A", "2B", "3C"]
+        assert Repositories(other).subjects.id_for("Subject 3", school["T1"]) is not None
+    finally:
+        other.close()
+
+
+def test_other_writes_do_not_reload(repos, school, db_path, profile, monkeypatch):
+    cache = repos.reference
+    monkeypatch.setattr(cache, "check_interval", 0)
+    repos.teachers.options()
+    loads = count_loads(cache, monkeypatch)
+    
+    other = database.connect(db_path, profile)
+    try:
+        with other:
+            other.execute("INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)",
+                          (school["S1"], "2025-10-06", "Absent"))
+            other.execute("UPDATE teachers SET password = 'x'")
+        repos.teachers.options()
+        assert loads == []
+        
+        # Another process renaming a teacher is picked up by the version check
+        with other:
+            other.execute("UPDATE teachers SET name = 'Renamed' WHERE id = ?", (school["T1"],))
+        assert (school["T1"], "Renamed") in repos.teachers.options()
+        assert len(loads) == 1
+    finally:
+        other.close()
+
+
+def test_version_is_only_checked_every_interval(repos, school, db_path, profile, monkeypatch):
+    cache = repos.reference
+    monkeypatch.setattr(cache, "check_interval", 3600)
+    repos.classes.names()
+    
+    other = database.connect(db_path, profile)
+    try:
+        with other:
+            other.execute("INSERT INTO classes (class_name) VALUES ('9Z')")
+        assert "9Z" not in repos.classes.names()
+        
+        monkeypatch.setattr(cache, "check_interval", 0)
+        assert "9Z" in repos.classes.names()
+    finally:
+        other.close()
+
+
+def test_in_memory_databases_do_not_share(profile):
+    conn = database.connect(":memory:", profile)
+    try:
+        assert repository.reference_cache(conn) is not repository.reference_cache(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,86 @@
+"""The data-access layer, run without a display"""
+import sqlite3
+
+import pytest
+
+import database
+from repository import StatementCache
+
+
+def test_statement_cache_evicts_least_recently_used():
+    cache = StatementCache(size=2)
+    built = []
+    
+    def build(sql):
+        built.append(sql)
+        return sql
+    
+    cache.get("a", lambda: build("SELECT 1"))
+    cache.get("b", lambda: build("SELECT 2"))
+    assert cache.get("a", lambda: build("unused")) == "SELECT 1"
+    cache.get("c", lambda: build("SELECT 3"))
+    cache.get("b", lambda: build("SELECT 2"))
+    
+    assert built == ["SELECT 1", "SELECT 2", "SELECT 3", "SELECT 2"]
+    assert len(cache) == 2
+
+
+def test_authenticates_students_and_teachers(repos, school):
+    password = database.hash_password("1234")
+    
+    assert repos.students.authenticate("S1", password) == (school["S1"], "Student 1")
+    assert repos.students.authenticate("S1", database.hash_password("wrong")) is None
+    assert repos.teachers.authenticate("T2", password) == (school["T2"], "Teacher 2")
+    assert repos.admins.authenticate("admin", database.hash_password("admin123")) == 1
+
+
+def test_student_update_keeps_password_unless_given(repos, school):
+    student = school["S1"]
+    repos.students.update(student, "S1", "CNE1", "Amina", "s1@school.ma", "2B",
+                          "2010-01-01", "", "")
+    
+    record = repos.students.get(student)
+    assert (record["name"], record["class"]) == ("Amina", "2B")
+    assert record["password"] == database.hash_password("1234")
+    
+    repos.students.update(student, "S1", "CNE1", "Amina", "s1@school.ma", "2B",
+                          "2010-01-01", "", "", database.hash_password("new"))
+    assert repos.students.authenticate("S1", database.hash_password("new")) == (student, "Amina")
+
+
+def test_student_delete_removes_results_and_attendance(repos, school):
+    student = school["S1"]
+    repos.results.add(student, school["SUB1"], school["T1"], 15, "Exam", "1", "2025-2026", "")
+    repos.attendance.upsert_many([(student, "2025-10-06", "Absent", school["SUB1"], "")])
+    
+    repos.students.delete(student)
+    
+    assert repos.students.get(student) is None
+    assert repos.results.for_student(student) == []
+    assert repos.attendance.student_stats(student) == (0, 0, 0, 0)
+
+
+def test_id_by_checks_unique_columns(repos, school):
+    assert repos.students.id_by("email", "s2@school.ma") == school["S2"]
+    assert repos.students.id_by("email", "s2@school.ma", exclude_id=school["S2"]) is None
+    with pytest.raises(ValueError, match="Not a unique student column"):
+        repos.students.id_by("name", "Student 2")
+
+
+def test_teacher_delete_unassigns_subjects(repos, school):
+    repos.teachers.delete(school["T1"])
+    
+    assert repos.subjects.get(school["SUB1"])["teacher_id"] is None
+    assert repos.teachers.options() == [(school["T2"], "Teacher 2")]
+
+
+def test_class_with_students_cannot_be_deleted(repos, school):
+    class_id = repos.classes.id_by_name("1A")
+    
+    with pytest.raises(sqlite3.IntegrityError, match="still has students"):
+        repos.classes.delete(class_id)
+    assert repos.classes.names() == ["1A", "2B"]
+    
+    repos.students.delete(school["S1"])
+    repos.classes.delete(class_id)
+    assert repos.classes.names() == ["2B"]
@@ -0,0 +1,34 @@
+"""Grades saved from the gradebook"""
+import sqlite3
+
+import pytest
+
+
+def exam(student, school, grade, remarks=""):
+    return (student, school["SUB1"], school["T1"], grade, "Normal", "Semester 1", "2025-2026", remarks)
+
+
+def test_add_many_saves_a_class_in_one_call(repos, school):
+    s1, s2 = school["S1"], school["S2"]
+    
+    assert repos.results.add_many([exam(s1, school, 14.5), exam(s2, school, 9, "retake")]) == 2
+    
+    assert [row[:2] for row in repos.results.for_student(s1)] == [("Subject 1", 14.5)]
+    assert [row[:2] for row in repos.results.for_student(s2)] == [("Subject 1", 9)]
+    assert repos.stats.counts(["results"]) == {"results": 2}
+
+
+def test_add_many_keeps_graded_students_on_the_roster(repos, school):
+    # S2 is in 2B, which Subject 1 is not taught to
+    repos.results.add_many([exam(school["S2"], school, 12)])
+    
+    assert [row[0] for row in repos.students.for_teacher(school["T1"])] == [school["S1"], school["S2"]]
+
+
+def test_add_many_saves_nothing_when_a_record_fails(repos, school):
+    with pytest.raises(sqlite3.IntegrityError):
+        repos.results.add_many([exam(school["S1"], school, 15), exam(school["S2"], school, None)])
+    
+    assert repos.results.for_student(school["S1"]) == []
+    assert repos.stats.counts(["results"]) == {"results": 0}
+    assert not repos.conn.in_transaction
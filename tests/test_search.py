@@ -0,0 +1,66 @@
+"""Full-text search and the triggers that keep its indexes in step"""
+
+
+def fts_rowids(conn, fts, text):
+    return [row[0] for row in conn.execute(f"SELECT rowid FROM {fts} WHERE {fts} MATCH ?", (text,))]
+
+
+def grade(repos, school, student, teacher, subject, remarks):
+    return repos.results.add(school[student], school[subject], school[teacher], 12,
+                             "Normal", "Semester 1", "2025-2026", remarks)
+
+
+def test_triggers_follow_student_writes(repos, school):
+    s1 = school["S1"]
+    assert [row[0] for row in repos.students.search("stud")] == [school["S1"], school["S2"]]
+    
+    repos.students.update(s1, "S1", "CNE1", "Amina Benali", "s1@school.ma", "1A", "", "", "")
+    assert [row[0] for row in repos.students.search("benal")] == [s1]
+    assert [row[0] for row in repos.students.search("student 1")] == []
+    
+    repos.students.delete(s1)
+    assert fts_rowids(repos.conn, "students_fts", "amina") == []
+
+
+def test_only_results_with_remarks_are_indexed(repos, school):
+    blank = grade(repos, school, "S1", "T1", "SUB1", "")
+    noted = grade(repos, school, "S1", "T1", "SUB1", "Excellent oral")
+    assert repos.conn.execute("SELECT rowid FROM results_fts").fetchall() == [(noted,)]
+    
+    with repos.conn:
+        repos.conn.execute("UPDATE results SET remarks = 'Excellent work' WHERE id = ?", (blank,))
+        repos.conn.execute("UPDATE results SET remarks = '' WHERE id = ?", (noted,))
+    assert fts_rowids(repos.conn, "results_fts", "excellent") == [blank]
+
+
+def test_names_outrank_emails(repos, school):
+    repos.students.add("S3", "CNE3", "Karim", "amina.k@school.ma", "x", "1A", "", "", "")
+    repos.students.update(school["S1"], "S1", "CNE1", "Amina", "s1@school.ma", "1A", "", "", "")
+    
+    assert [row[3] for row in repos.students.search("amina")] == ["Amina", "Karim"]
+    assert repos.students.search("  --  ") == []
+
+
+def test_result_search_interleaves_remarks_and_students(repos, school):
+    repos.students.update(school["S1"], "S1", "CNE1", "Sara Amina Benali Idrissi", "s1@school.ma",
+                          "1A", "", "", "")
+    repos.students.update(school["S2"], "S2", "CNE2", "Sara", "s2@school.ma", "1A", "", "", "")
+    best_remark = grade(repos, school, "S1", "T1", "SUB1", "Sara sara")
+    other_remark = grade(repos, school, "S1", "T1", "SUB1", "Ask Sara to bring the signed form next week")
+    best_student = grade(repos, school, "S2", "T1", "SUB1", "")
+    other_student = grade(repos, school, "S1", "T1", "SUB1", "")
+    with repos.conn:
+        repos.conn.execute("UPDATE results SET date = '2025-10-06'")
+    
+    rows = repos.results.for_teacher(school["T1"], search="sara")
+    
+    # Each table's best match first, equal places newest first
+    assert [row[0] for row in rows] == [best_student, best_remark, other_student, other_remark]
+
+
+def test_result_search_is_limited_to_the_teacher(repos, school):
+    own = grade(repos, school, "S1", "T1", "SUB1", "Needs revision")
+    grade(repos, school, "S2", "T2", "SUB2", "Needs revision")
+    
+    assert [row[0] for row in repos.results.for_teacher(school["T1"], search="revision")] == [own]
+    assert repos.results.for_teacher(school["T1"], search="student 2") == []
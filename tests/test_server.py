@@ -0,0 +1,153 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import database
+import remote
+import server
+
+
+@pytest.fixture
+def api(db_path, profile, school):
+    httpd = server.MassarServer(("127.0.0.1", 0), db_path, readers=2, profile=profile)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def login(api, repo, username, password="1234"):
+    client = remote.RemoteClient(f"http://127.0.0.1:{api.server_address[1]}")
+    repos = remote.RemoteRepositories(client)
+    assert getattr(repos, repo).authenticate(username, password)
+    return repos
+
+
+def refused(call, *args):
+    with pytest.raises(remote.RemoteError) as error:
+        call(*args)
+    return str(error.value)
+
+
+def attendance_rows(repos):
+    return repos.conn.execute("SELECT student_id, subject_id FROM attendance ORDER BY id").fetchall()
+
+
+def test_teacher_writes_attendance_only_for_own_students_and_subjects(api, repos, school):
+    teacher = login(api, "teachers", "T1").attendance
+    s1, s2, own, foreign = school["S1"], school["S2"], school["SUB1"], school["SUB2"]
+    
+    assert teacher.upsert_many([[s1, "2025-10-06", own, "Present", ""]]) == [1, 0]
+    assert "limited to your own" in refused(teacher.upsert_many, [[s2, "2025-10-06", own, "Present", ""]])
+    refused(teacher.upsert_many, [[s1, "2025-10-06", foreign, "Present", ""]])
+    refused(teacher.upsert_many, [[s1, "2025-10-06", 99, "Present", ""]])
+    refused(teacher.upsert_many, [[s1, "2025-10-06", None, "Present", ""]])
+    refused(teacher.upsert_many, [[s1, "2025-10-06", own, "Present", ""], [s2, "2025-10-06", own, "Late", ""]])
+    
+    assert teacher.mark_range([s1], "2025-10-07", "2025-10-08", own, "Absent") == [2, 0]
+    refused(teacher.mark_range, [s1, s2], "2025-10-07", "2025-10-08", own, "Absent")
+    refused(teacher.mark_range, [s1], "2025-10-07", "2025-10-08", foreign, "Absent")
+    
+    assert teacher.mark_classes(["1A"], ["2025-10-09"], own, "Late") == [1, 0]
+    refused(teacher.mark_classes, ["1A", "2B"], ["2025-10-09"], own, "Late")
+    refused(teacher.mark_classes, ["1A"], ["2025-10-09"], foreign, "Late")
+    
+    assert attendance_rows(repos) == [(s1, own)] * 4
+
+
+def test_teacher_reads_only_own_classes(api, school):
+    teacher = login(api, "teachers", "T1")
+    
+    assert teacher.students.class_names_for_teacher(school["T1"]) == ["1A"]
+    assert [row[0] for row in teacher.students.in_class("1A")] == [school["S1"]]
+    refused(teacher.students.in_class, "2B")
+    refused(teacher.students.class_names)
+    assert len(teacher.attendance.class_week("1A", school["SUB1"], "2025-10-06")) == 1
+    refused(teacher.attendance.class_week, "2B", school["SUB1"], "2025-10-06")
+    refused(teacher.attendance.class_week, "1A", school["SUB2"], "2025-10-06")
+    refused(teacher.students.for_teacher, school["T2"])
+
+
+def test_teacher_grades_only_own_students_and_subjects(api, repos, school):
+    results = login(api, "teachers", "T1").results
+    s1, s2, t1 = school["S1"], school["S2"], school["T1"]
+    
+    assert results.add(s1, school["SUB1"], t1, 15, "Exam", "S1", "2025-2026", "")
+    refused(results.add, s1, school["SUB2"], t1, 15, "Exam", "S1", "2025-2026", "")
+    refused(results.add, s2, school["SUB1"], t1, 15, "Exam", "S1", "2025-2026", "")
+    refused(results.add, s1, school["SUB1"], school["T2"], 15, "Exam", "S1", "2025-2026", "")
+    refused(results.add_many, [[s1, school["SUB1"], t1, 12, "Exam", "S1", "2025-2026", ""],
+                               [s2, school["SUB1"], t1, 12, "Exam", "S1", "2025-2026", ""]])
+    assert repos.stats.counts(["results"]) == {"results": 1}
+
+
+def test_student_reads_only_own_records(api, school):
+    student = login(api, "students", "S1")
+    
+    assert student.students.header(school["S1"])[1] == "S1"
+    refused(student.students.get, school["S2"])
+    refused(student.attendance.for_student, school["S2"], "2025-01-01", "2025-12-31")
+    assert "student cannot call" in refused(student.attendance.upsert_many, [])
+    refused(student.students.in_class, "1A")
+
+
+def test_admin_and_anonymous(api, school):
+    admin = login(api, "admins", "admin", "admin123")
+    assert admin.students.in_class("2B")[0][0] == school["S2"]
+    assert admin.students.class_names() == ["1A", "2B"]
+    
+    anonymous = remote.RemoteRepositories(remote.RemoteClient(f"http://127.0.0.1:{api.server_address[1]}"))
+    assert "Not logged in" in refused(anonymous.students.class_names)
+    assert anonymous.teachers.authenticate("T1", "wrong") is None
+
+
+def test_stored_hash_is_not_a_password(api, school):
+    client = remote.RemoteClient(f"http://127.0.0.1:{api.server_address[1]}")
+    assert client.login("teachers", ["T1", database.hash_password("1234")]) is None
+    assert client.token is None
+    refused(client.login, "teachers", ["T1"])
+
+
+def test_logout_ends_the_session(api, school):
+    teacher = login(api, "teachers", "T1")
+    token = teacher.conn.token
+    teacher.conn.logout()
+    
+    assert teacher.conn.token is None
+    assert token not in api.sessions
+    teacher.conn.token = token
+    assert "Not logged in" in refused(teacher.subjects.for_teacher, school["T1"])
+
+
+def test_idle_sessions_expire(api, school, monkeypatch):
+    teacher = login(api, "teachers", "T1")
+    teacher.subjects.for_teacher(school["T1"])
+    
+    clock = [server.time.monotonic() + api.session_timeout + 1]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    assert "Session expired" in refused(teacher.subjects.for_teacher, school["T1"])
+    
+    # Logins sweep the sessions nobody used within the timeout
+    idle = login(api, "students", "S1")
+    clock[0] += api.session_timeout + 1
+    login(api, "students", "S2")
+    assert idle.conn.token not in api.sessions
+    assert len(api.sessions) == 1
+
+
+def test_oversized_body_is_refused_unread(api, monkeypatch):
+    monkeypatch.setattr(server, "MAX_BODY_BYTES", 1000)
+    conn = http.client.HTTPConnection("127.0.0.1", api.server_address[1], timeout=5)
+    # Only the headers are sent: the server must answer without waiting for the body
+    conn.putrequest("POST", "/login")
+    conn.putheader("Content-Length", "1001")
+    conn.endheaders()
+    response = conn.getresponse()
+    
+    assert response.status == 413
+    assert json.loads(response.read())["error"]["message"] == "Request body is over 1000 bytes"
+    conn.close()
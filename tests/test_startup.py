@@ -0,0 +1,17 @@
+"""Startup leaves out the modules only some features need"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("module", ["main", "cli", "exporter", "importer"])
+def test_import_loads_neither_openpyxl_nor_process_pools(module):
+    code = f"import sys, {module}; print(sorted({{'openpyxl', 'concurrent.futures'}} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,83 @@
+"""Trigger-maintained statistics checked against a recount from the raw tables"""
+import pytest
+
+import database
+
+
+def churn(repos, school):
+    """Writes of every kind the app makes, including cascading deletes"""
+    s1, s2, t1, sub1, sub2 = school["S1"], school["S2"], school["T1"], school["SUB1"], school["SUB2"]
+    s3 = repos.students.add("S3", "CNE3", "Student 3", "s3@school.ma", "x", "1A", "", "", "")
+    repos.results.add(s1, sub1, t1, 15, "Normal", "Semester 1", "2025-2026", "")
+    repos.results.add_many([(s3, sub1, t1, grade, "Normal", "Semester 1", "2025-2026", "")
+                            for grade in (8, 12.5, 17)])
+    repos.results.add_many([(s1, sub1, t1, 9, "Retake", "Semester 1", "2025-2026", ""),
+                            (s2, sub1, t1, 13, "Normal", "Semester 1", "2025-2026", "")])
+    repos.results.add(s2, sub2, school["T2"], 11, "Normal", "Semester 1", "2025-2026", "")
+    repos.attendance.mark_range([s1, s3], "2025-10-06", "2025-10-10", sub1, "Present")
+    repos.attendance.upsert_many([(s1, "2025-10-07", sub1, "Absent", ""),
+                                  (s2, "2026-02-02", None, "Late", "")])
+    repos.classes.add("3C", "3", 30, "2025-2026")
+    repos.students.delete(s3)
+    repos.subjects.delete(sub2)
+    repos.teachers.delete(school["T2"])
+
+
+def table_rows(conn, table):
+    return sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+
+
+def test_counters_match_a_recount(repos, school):
+    churn(repos, school)
+    
+    counts = repos.stats.counts()
+    assert counts == {table: repos.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in database.COUNTED_TABLES}
+    assert repos.stats.rebuild() == counts
+
+
+def test_rebuild_repairs_drifted_counters(repos, school):
+    with repos.conn:
+        repos.conn.execute("UPDATE stats_counters SET row_count = 999")
+    
+    assert repos.stats.rebuild() == {"students": 2, "teachers": 2, "results": 0,
+                                     "subjects": 2, "classes": 2, "attendance": 0}
+
+
+def test_counts_rejects_unknown_tables(repos):
+    with pytest.raises(ValueError, match="Unknown table: admin"):
+        repos.stats.counts(["students", "admin"])
+
+
+def test_grade_summaries_match_a_rebuild(repos, school):
+    churn(repos, school)
+    with repos.conn:
+        repos.conn.execute("UPDATE results SET grade = grade + 1 WHERE grade < 10")
+        repos.conn.execute("UPDATE results SET date = '2025-11-03' WHERE exam_type = 'Retake'")
+        repos.conn.execute("UPDATE results SET student_id = ? WHERE student_id = ?",
+                           (school["S1"], school["S2"]))
+    
+    summaries = table_rows(repos.conn, "student_grade_summary")
+    repos.stats.rebuild()
+    
+    assert table_rows(repos.conn, "student_grade_summary") == summaries
+    # S1's 15, their retake raised to 10 and S2's 13, now S1's
+    assert repos.results.student_stats(school["S1"]) == (3, pytest.approx(38 / 3), 10, 15)
+
+
+def test_attendance_rollups_match_a_rebuild(repos, school):
+    churn(repos, school)
+    with repos.conn:
+        repos.conn.execute("UPDATE attendance SET status = 'Late' WHERE date = '2025-10-08'")
+        # Across a week and a term boundary, and from a subject to none
+        repos.conn.execute("UPDATE attendance SET date = '2026-02-03' WHERE date = '2025-10-09'")
+        repos.conn.execute("UPDATE attendance SET subject_id = NULL WHERE date = '2025-10-10'")
+        repos.conn.execute("DELETE FROM attendance WHERE date = '2025-10-06'")
+    
+    rollups = {table: table_rows(repos.conn, table) for table in database.ATTENDANCE_ROLLUPS}
+    repos.stats.rebuild()
+    
+    assert {table: table_rows(repos.conn, table) for table in database.ATTENDANCE_ROLLUPS} == rollups
+    # Absent on 7 October, late on the 8th, present on the 10th and on 3 February
+    assert repos.attendance.student_stats(school["S1"]) == (4, 2, 1, 1)
+    assert repos.attendance.student_stats(school["S1"], "2025-2026 Semester 2") == (1, 1, 0, 0)
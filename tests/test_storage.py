@@ -0,0 +1,49 @@
+"""The storage profile read from massar_config.json and applied on connect"""
+import json
+
+import pytest
+
+import database
+
+
+def write_config(tmp_path, storage):
+    path = tmp_path / "massar_config.json"
+    path.write_text(json.dumps({"storage": storage}), encoding="utf-8")
+    return str(path)
+
+
+def test_defaults_without_config_file(tmp_path):
+    assert database.load_storage_profile(str(tmp_path / "missing.json")) == database.DEFAULT_STORAGE_PROFILE
+
+
+def test_config_overrides_are_normalized(tmp_path):
+    path = write_config(tmp_path, {"journal_mode": "delete", "cache_size": "-2000"})
+    
+    profile = database.load_storage_profile(path)
+    
+    assert profile["journal_mode"] == "DELETE"
+    assert profile["cache_size"] == -2000
+    assert profile["synchronous"] == database.DEFAULT_STORAGE_PROFILE["synchronous"]
+
+
+@pytest.mark.parametrize("storage, message", [
+    ({"page_size": 4096}, "Unknown storage settings: page_size"),
+    ({"journal_mode": "FAST"}, "journal_mode must be one of"),
+    ({"synchronous": "SOMETIMES"}, "synchronous must be one of"),
+    ({"busy_timeout": "soon"}, "invalid literal"),
+])
+def test_rejects_invalid_settings(tmp_path, storage, message):
+    with pytest.raises(ValueError, match=message):
+        database.load_storage_profile(write_config(tmp_path, storage))
+
+
+def test_connect_applies_the_profile(db_path, profile):
+    profile.update(synchronous="FULL", busy_timeout=1234, temp_store="MEMORY")
+    conn = database.connect(db_path, profile)
+    
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == profile["cache_size"]
+    conn.close()
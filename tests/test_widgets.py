@@ -0,0 +1,217 @@
+"""Widget helpers; the ones that need real Tk widgets skip without a display"""
+import pytest
+import ttkbootstrap as ttk
+
+from widgets import LazyNotebook, ScreenManager, TreeRows
+
+
+class FakeTree:
+    """The part of ttk.Treeview TreeRows uses, recording every change"""
+    
+    def __init__(self):
+        self.items = {}
+        self.order = []
+        self.calls = []
+    
+    def get_children(self, item=""):
+        return tuple(self.order)
+    
+    def insert(self, parent, index, iid, values=(), tags=()):
+        self.calls.append(("insert", iid))
+        self.items[iid] = (tuple(values), tuple(tags))
+        self.order.insert(len(self.order) if index == "end" else index, iid)
+    
+    def delete(self, *iids):
+        self.calls.append(("delete",) + iids)
+        for iid in iids:
+            del self.items[iid]
+            self.order.remove(iid)
+    
+    def item(self, iid, values=(), tags=()):
+        self.calls.append(("item", iid))
+        self.items[iid] = (tuple(values), tuple(tags))
+    
+    def move(self, iid, parent, index):
+        self.calls.append(("move", iid))
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+    
+    def shown(self):
+        return [self.items[iid][0] for iid in self.order]
+
+
+def rows_for(tree):
+    return TreeRows(tree, values=lambda row: row[1:], tags=lambda row: ("low",) if row[2] < 10 else ())
+
+
+def test_sync_fills_an_empty_tree():
+    tree = FakeTree()
+    
+    assert rows_for(tree).sync([(1, "Amina", 15), (2, "Omar", 8)]) == (2, 0, 0)
+    assert tree.shown() == [("Amina", 15), ("Omar", 8)]
+    assert tree.items["2"][1] == ("low",)
+
+
+def test_sync_touches_only_what_changed():
+    tree = FakeTree()
+    rows = rows_for(tree)
+    rows.sync([(1, "Amina", 15), (2, "Omar", 8), (3, "Sara", 12)])
+    tree.calls.clear()
+    
+    assert rows.sync([(1, "Amina", 15), (2, "Omar", 11), (3, "Sara", 12)]) == (0, 1, 0)
+    assert tree.calls == [("item", "2")]
+    assert tree.items["2"] == (("Omar", 11), ())
+    
+    tree.calls.clear()
+    assert rows.sync([(1, "Amina", 15), (2, "Omar", 11), (3, "Sara", 12)]) == (0, 0, 0)
+    assert tree.calls == []
+
+
+def test_sync_inserts_deletes_and_reorders():
+    tree = FakeTree()
+    rows = rows_for(tree)
+    rows.sync([(1, "Amina", 15), (2, "Omar", 8), (3, "Sara", 12)])
+    
+    assert rows.sync([(3, "Sara", 12), (4, "Yassine", 9), (1, "Amina", 15)]) == (1, 0, 1)
+    assert tree.shown() == [("Sara", 12), ("Yassine", 9), ("Amina", 15)]
+    assert rows["4"] == (4, "Yassine", 9)
+    
+    rows.clear()
+    assert tree.order == []
+
+
+class Tabs:
+    """Builders and refreshers for notebook tabs that log their calls"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def build(self, name):
+        def build(frame):
+            self.calls.append(("build", name))
+            ttk.Label(frame, text=name).pack()
+        return build
+    
+    def refresh(self, name):
+        return lambda frame: self.calls.append(("refresh", name))
+
+
+@pytest.fixture
+def tabs():
+    return Tabs()
+
+
+@pytest.fixture
+def notebook(tk_root, tabs):
+    """Tabs first and second with a refresh hook, third without"""
+    notebook = LazyNotebook(tk_root, build_delay=0)
+    notebook.frames = {}
+    for name in ("first", "second", "third"):
+        refresh = tabs.refresh(name) if name != "third" else None
+        notebook.frames[name] = notebook.add_tab(name, name.title(), tabs.build(name), refresh)
+    return notebook
+
+
+def test_notebook_builds_the_next_tab_after_the_shown_one(tk_root, notebook, tabs):
+    notebook.show()
+    assert tabs.calls == [("build", "first")]
+    assert not notebook.built("second")
+    
+    tk_root.update()
+    assert tabs.calls == [("build", "first"), ("build", "second")]
+    assert not notebook.built("third")
+
+
+def test_notebook_switching_tabs_drops_the_deferred_build(tk_root, notebook, tabs):
+    notebook.show()
+    notebook.select(2)
+    tk_root.update()
+    
+    assert tabs.calls == [("build", "first"), ("build", "third")]
+    assert not notebook.built("second")
+
+
+def test_notebook_invalidate_refreshes_or_rebuilds_built_tabs(tk_root, notebook, tabs):
+    notebook.show()
+    tk_root.update()
+    notebook.select(2)
+    tk_root.update()
+    tabs.calls.clear()
+    
+    # The selected tab has no refresh hook: it is emptied and built again
+    notebook.invalidate()
+    assert tabs.calls == [("build", "third")]
+    assert len(notebook.frames["third"].winfo_children()) == 1
+    
+    notebook.select(0)
+    tk_root.update()
+    assert tabs.calls == [("build", "third"), ("refresh", "first")]
+
+
+class Screens:
+    """build and refresh callbacks for ScreenManager that log their calls"""
+    
+    def __init__(self, widgets=1):
+        self.widgets = widgets
+        self.calls = []
+    
+    def build(self, key):
+        def build(frame):
+            self.calls.append(("build", key))
+            for _ in range(self.widgets):
+                ttk.Label(frame, text=key).pack()
+        return build
+    
+    def refresh(self, key):
+        return lambda frame: self.calls.append(("refresh", key))
+    
+    def show(self, manager, key):
+        return manager.show(key, self.build(key), self.refresh(key))
+
+
+def test_screens_are_kept_and_refreshed(tk_root):
+    screens = Screens()
+    manager = ScreenManager(tk_root)
+    
+    login = screens.show(manager, "login")
+    dialog = ttk.Toplevel(tk_root)
+    screens.show(manager, "admin")
+    
+    assert screens.show(manager, "login") is login
+    assert screens.calls == [("build", "login"), ("build", "admin"), ("refresh", "login")]
+    assert manager.current == "login"
+    # Windows opened on a screen go with it
+    assert not dialog.winfo_exists()
+
+
+def test_hidden_screens_over_the_budget_are_discarded(tk_root):
+    screens = Screens(widgets=5)
+    discarded = []
+    # Room for one hidden screen of a frame and five labels
+    manager = ScreenManager(tk_root, max_items=6, on_discard=discarded.append)
+    
+    first = screens.show(manager, "login")
+    screens.show(manager, "student")
+    assert discarded == []
+    screens.show(manager, "teacher")
+    
+    assert discarded == ["login"]
+    assert not first.winfo_exists()
+    screens.show(manager, "login")
+    assert screens.calls[-1] == ("build", "login")
+    assert discarded == ["login", "student"]
+
+
+def test_clear_discards_every_screen(tk_root):
+    screens = Screens()
+    discarded = []
+    manager = ScreenManager(tk_root, on_discard=discarded.append)
+    screens.show(manager, "login")
+    screens.show(manager, "admin")
+    
+    manager.clear()
+    
+    assert sorted(discarded) == ["admin", "login"]
+    assert manager.current is None
+    screens.show(manager, "admin")
+    assert screens.calls[-1] == ("build", "admin")
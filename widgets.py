@@ -0,0 +1,405 @@
+"""Reusable Tk widgets
+
+VirtualTreeview shows tables too long to load into a Treeview at once. It
+keeps a sliding window of at most max_pages pages of rows: scrolling near
+either edge fetches the next page through keyset pagination (the sort key of
+the edge row, never an OFFSET) and drops a page from the far end, so memory
+and item count stay flat however many rows the table has. The scrollbar
+therefore spans the loaded window, not the whole table.
+
+TreeRows refreshes a Treeview from a fresh query result by row id: only the
+rows that changed are updated, inserted or deleted, so selection and scroll
+position survive and a single-row edit costs a few widget calls.
+
+Debouncer delays a callback until the user pauses typing (search boxes).
+
+LazyNotebook builds each tab the first time it is shown. The tab to the
+right of the shown one is built a little later, once that has been drawn:
+a deferred build on the Tk thread, which blocks the window while it runs.
+
+ScreenManager keeps whole screens (login, dashboards) alive as hidden frames
+so switching back to one refreshes it instead of rebuilding it.
+"""
+from collections import OrderedDict
+
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import BOTH
+
+# Rows fetched per page and pages kept loaded at most
+PAGE_SIZE = 100
+MAX_PAGES = 5
+
+# Fraction of the loaded rows from either edge at which the next page is fetched
+LOAD_MARGIN = 0.1
+
+# Pause in typing after which a search box runs its query
+SEARCH_DELAY_MS = 250
+
+# Delay after a tab is shown before the tab to its right is built
+DEFERRED_BUILD_DELAY_MS = 300
+
+# Widgets plus Treeview rows that hidden screens may keep alive in total
+MAX_RETAINED_ITEMS = 20000
+
+# LazyNotebook tab states
+_NEW, _CURRENT, _STALE = "new", "current", "stale"
+
+
+class Debouncer:
+    """Call func only once calls have stopped coming for delay ms
+    
+    Bind an instance to <KeyRelease> to search as the user types without
+    running a query per keystroke.
+    """
+    
+    def __init__(self, widget, func, delay=SEARCH_DELAY_MS):
+        self.widget = widget
+        self.func = func
+        self.delay = delay
+        self._pending = None
+    
+    def __call__(self, event=None):
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+        self._pending = self.widget.after(self.delay, self._fire)
+    
+    def _fire(self):
+        self._pending = None
+        if self.widget.winfo_exists():
+            self.func()
+
+
+class LazyNotebook(ttk.Notebook):
+    """Notebook whose tabs are built the first time they are selected
+    
+    add_tab(name, text, build, refresh) adds an empty frame that build(frame)
+    fills when needed. Call show() once the tabs are added to build the
+    selected one. build_delay ms after a tab is shown, the tab to its right
+    is built too, so the usual next click is instant. That deferred build
+    runs on the Tk thread like any other, so builders should stay quick and
+    leave slow queries to the executor.
+    
+    invalidate() marks the built tabs stale: each is brought up to date with
+    refresh(frame) when next shown, or emptied and built again if it has no
+    refresh.
+    """
+    
+    def __init__(self, master, build_delay=DEFERRED_BUILD_DELAY_MS, **kw):
+        super().__init__(master, **kw)
+        self.build_delay = build_delay
+        self._pages = []            # [name, frame, build, refresh, state]
+        self._deferred = None       # after() id of the pending deferred build
+        self.bind("<<NotebookTabChanged>>", self._on_tab_changed, add="+")
+    
+    def add_tab(self, name, text, build, refresh=None):
+        """Add a tab that build(frame) fills on first use and return its frame"""
+        frame = ttk.Frame(self)
+        self.add(frame, text=text)
+        self._pages.append([name, frame, build, refresh, _NEW])
+        return frame
+    
+    def built(self, name):
+        """Return True once the tab called name has widgets"""
+        return any(page[0] == name and page[4] != _NEW for page in self._pages)
+    
+    def show(self):
+        """Build or refresh the selected tab now and schedule the deferred build"""
+        self._on_tab_changed()
+    
+    def invalidate(self):
+        """Mark every built tab stale and bring the selected one up to date"""
+        for page in self._pages:
+            if page[4] == _CURRENT:
+                page[4] = _STALE
+        self.show()
+    
+    def _update(self, index):
+        page = self._pages[index]
+        name, frame, build, refresh, state = page
+        page[4] = _CURRENT
+        if state == _NEW:
+            build(frame)
+        elif state == _STALE:
+            if refresh is not None:
+                refresh(frame)
+            else:
+                for child in frame.winfo_children():
+                    child.destroy()
+                build(frame)
+    
+    def _on_tab_changed(self, event=None):
+        if not self._pages:
+            return
+        index = self.index("current")
+        self._update(index)
+        
+        if self._deferred is not None:
+            self.after_cancel(self._deferred)
+            self._deferred = None
+        following = index + 1
+        if following < len(self._pages) and self._pages[following][4] == _NEW:
+            self._deferred = self.after(self.build_delay, self._build_deferred, following)
+    
+    def _build_deferred(self, index):
+        self._deferred = None
+        if self.winfo_exists() and self._pages[index][4] == _NEW:
+            self._update(index)
+
+
+def retained_items(widget):
+    """Return the number of widgets and Treeview rows under widget, itself included"""
+    count = 1
+    if isinstance(widget, ttk.Treeview):
+        count += len(widget.get_children())
+    for child in widget.winfo_children():
+        count += retained_items(child)
+    return count
+
+
+class ScreenManager:
+    """Switches the window between screens kept alive as hidden frames
+    
+    show(key, build, refresh) displays the screen stored under key: the first
+    time, build(frame) fills a new frame; later, refresh(frame) updates the
+    existing widgets instead of building them again. Hidden screens are
+    destroyed, least recently shown first, while their widgets and Treeview
+    rows add up to more than max_items; on_discard(key) is told.
+    """
+    
+    def __init__(self, root, max_items=MAX_RETAINED_ITEMS, on_discard=None):
+        self.root = root
+        self.max_items = max_items
+        self.on_discard = on_discard
+        self._screens = OrderedDict()   # key -> frame, least recently shown first
+        self.current = None
+    
+    def show(self, key, build, refresh=None):
+        """Show the screen stored under key, building it if needed"""
+        # Anything else in the window (dialogs) belongs to the screen being left
+        frames = list(self._screens.values())
+        for widget in self.root.winfo_children():
+            if widget not in frames:
+                widget.destroy()
+        for frame in frames:
+            frame.pack_forget()
+        
+        frame = self._screens.pop(key, None)
+        self.current = key
+        if frame is not None and frame.winfo_exists():
+            self._screens[key] = frame
+            if refresh is not None:
+                refresh(frame)
+        else:
+            frame = ttk.Frame(self.root)
+            self._screens[key] = frame
+            build(frame)
+        frame.pack(fill=BOTH, expand=True)
+        self._trim()
+        return frame
+    
+    def clear(self):
+        """Destroy every kept screen, e.g. when the data behind them is replaced"""
+        for key in list(self._screens):
+            self._discard(key)
+        self.current = None
+    
+    def _trim(self):
+        hidden = [key for key in self._screens if key != self.current]
+        sizes = {key: retained_items(self._screens[key]) for key in hidden}
+        total = sum(sizes.values())
+        for key in hidden:
+            if total <= self.max_items:
+                break
+            total -= sizes[key]
+            self._discard(key)
+    
+    def _discard(self, key):
+        self._screens.pop(key).destroy()
+        if self.on_discard is not None:
+            self.on_discard(key)
+
+
+class TreeRows:
+    """The rows shown in a Treeview, keyed by row id
+    
+    key(row) gives the item id (default row[0], the table id); values(row)
+    and tags(row) give what the item displays.
+    """
+    
+    def __init__(self, tree, key=None, values=None, tags=None):
+        self.tree = tree
+        self.key = key or (lambda row: row[0])
+        self.values = values or (lambda row: row)
+        self.tags = tags or (lambda row: ())
+        self._rows = {}             # item id -> row as last shown
+    
+    def __getitem__(self, iid):
+        return self._rows[iid]
+    
+    def insert(self, rows, index="end"):
+        """Insert new rows at index, in order"""
+        for offset, row in enumerate(rows):
+            iid = str(self.key(row))
+            self._rows[iid] = row
+            self.tree.insert("", index if index == "end" else index + offset, iid=iid,
+                             values=self.values(row), tags=self.tags(row))
+    
+    def remove(self, iids):
+        """Delete items by id"""
+        if iids:
+            self.tree.delete(*iids)
+        for iid in iids:
+            self._rows.pop(iid, None)
+    
+    def sync(self, rows):
+        """Make the tree show rows, in order, and return (inserted, updated, deleted)
+        
+        Rows whose id is already shown are updated in place only if they
+        changed and moved only if their position changed; items not in rows
+        are deleted.
+        """
+        wanted = {}
+        for row in rows:
+            wanted[str(self.key(row))] = row
+        
+        current = self.tree.get_children()
+        removed = [iid for iid in current if iid not in wanted]
+        self.remove(removed)
+        order = [iid for iid in current if iid in wanted]
+        
+        inserted = updated = 0
+        for index, (iid, row) in enumerate(wanted.items()):
+            if iid not in self._rows:
+                self.insert([row], index)
+                order.insert(index, iid)
+                inserted += 1
+                continue
+            if self._rows[iid] != row:
+                self._rows[iid] = row
+                self.tree.item(iid, values=self.values(row), tags=self.tags(row))
+                updated += 1
+            if order[index] != iid:
+                self.tree.move(iid, "", index)
+                order.remove(iid)
+                order.insert(index, iid)
+        return inserted, updated, len(removed)
+    
+    def clear(self):
+        """Delete every item"""
+        self.remove(self.tree.get_children())
+
+
+class VirtualTreeview(ttk.Treeview):
+    """Treeview that pages its rows in from fetch() as the user scrolls
+    
+    fetch(after=None, before=None, limit=n) returns up to n rows in display
+    order: the first rows, the rows following the key `after`, or the rows
+    preceding the key `before`. key(row) gives a row's sort key. Rows use
+    str(row[0]) as their item id, so row[0] must be unique (the table id).
+    """
+    
+    def __init__(self, master, fetch, key, page_size=PAGE_SIZE, max_pages=MAX_PAGES, **kw):
+        self._yscrollcommand = kw.pop("yscrollcommand", None)
+        super().__init__(master, yscrollcommand=self._on_scroll, **kw)
+        self.fetch = fetch
+        self.key = key
+        self.page_size = page_size
+        self.max_rows = page_size * max_pages
+        self.rows = TreeRows(self)
+        self._search = None
+        self._more_above = False
+        self._more_below = False
+        self._loading = False
+    
+    def show_matches(self, search):
+        """Show the rows returned by search() instead of pages of the whole table
+        
+        Used for search results: paging stops and refresh() re-runs search.
+        """
+        self._search = search
+        self.rows.sync(search())
+        self._more_above = self._more_below = False
+        self.yview_moveto(0)
+    
+    def reload(self):
+        """Drop the loaded rows (or search results) and show the first page"""
+        self._search = None
+        self.rows.clear()
+        rows = self.fetch(limit=self.page_size)
+        self.rows.insert(rows)
+        self._more_above = False
+        self._more_below = len(rows) == self.page_size
+        self.yview_moveto(0)
+    
+    def refresh(self):
+        """Re-read the loaded window after an edit, updating only the rows that changed"""
+        if self._search is not None:
+            self.rows.sync(self._search())
+            return
+        children = self.get_children()
+        if not children:
+            self.reload()
+            return
+        after = None
+        if self._more_above:
+            # Restart just past the row preceding the window, since the
+            # first loaded row may itself be gone
+            previous = self.fetch(before=self.key(self.rows[children[0]]), limit=1)
+            after = self.key(previous[0]) if previous else None
+            self._more_above = bool(previous)
+        limit = max(len(children), self.page_size)
+        rows = self.fetch(after=after, limit=limit)
+        self.rows.sync(rows)
+        self._more_below = len(rows) == limit
+    
+    def _on_scroll(self, first, last):
+        if self._yscrollcommand is not None:
+            self._yscrollcommand(first, last)
+        if self._loading:
+            return
+        first, last = float(first), float(last)
+        if (last >= 1 - LOAD_MARGIN and self._more_below) or (first <= LOAD_MARGIN and self._more_above):
+            # Fetch once Tk has finished the scroll that got us here
+            self._loading = True
+            self.after_idle(self._load_more)
+    
+    def _load_more(self):
+        """Fetch the page beyond the edge being approached and trim the far end"""
+        try:
+            if not self.winfo_exists():
+                return
+            first, last = self.yview()
+            children = self.get_children()
+            if not children:
+                return
+            top = round(first * len(children))
+            
+            if last >= 1 - LOAD_MARGIN and self._more_below:
+                rows = self.fetch(after=self.key(self.rows[children[-1]]), limit=self.page_size)
+                self._more_below = len(rows) == self.page_size
+                self.rows.insert(rows)
+                children = self.get_children()
+                excess = len(children) - self.max_rows
+                if excess > 0:
+                    self.rows.remove(children[:excess])
+                    self._more_above = True
+                    top -= excess
+            elif first <= LOAD_MARGIN and self._more_above:
+                rows = self.fetch(before=self.key(self.rows[children[0]]), limit=self.page_size)
+                self._more_above = len(rows) == self.page_size
+                self.rows.insert(rows, 0)
+                top += len(rows)
+                children = self.get_children()
+                excess = len(children) - self.max_rows
+                if excess > 0:
+                    self.rows.remove(children[-excess:])
+                    self._more_below = True
+            else:
+                return
+            
+            # Keep the rows the user was looking at in place
+            total = len(self.get_children())
+            if total:
+                self.yview_moveto(max(top, 0) / total)
+        finally:
+            self._loading = False